@@ -1,8 +1,16 @@
+import os
+import sys
+
+#cligen_cli.py is one directory up, at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
 def analyze_cli(obs_dir, wshed, cli_dir, clim_mod, loc):
     import pandas as pd
     from scipy import stats
     import statistics
     import hydroeval as he
+    from cligen_cli import read_cli_df
 
     #load in observed daily precipitation data
     daily_inputs = str(obs_dir + '{}_daily_MnDNR.xlsx'.format(wshed))
@@ -88,11 +96,9 @@ def analyze_cli(obs_dir, wshed, cli_dir, clim_mod, loc):
 
     
     #Read in and prep cligen data
-    cli_data = pd.read_csv(str(cli_dir + '/{}_{}_{}_19.cli'.format(wshed,clim_mod,loc)), skiprows = 13, sep = '\s+| ', engine = 'python')
-    cli_data.drop([0,], axis = 0, inplace = True)
-    cli_data['Pr'] = cli_data['prcp'].astype(float)
-    cli_data['Month'] = cli_data['mo'].astype(int)
-    cli_data['year'] = cli_data['year'].astype(int)
+    cli_data = read_cli_df(str(cli_dir + '/{}_{}_{}_19.cli'.format(wshed,clim_mod,loc)))
+    cli_data['Pr'] = cli_data['prcp']
+    cli_data['Month'] = cli_data['mo']
     cli_data['Tmax'] = cli_data['tmax'].astype(int)
     cli_data['Tmin'] = cli_data['tmin'].astype(int)
 
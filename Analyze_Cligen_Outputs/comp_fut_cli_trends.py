@@ -1,7 +1,13 @@
 #Read in and prep cligen data
+import os
+import sys
 import pandas as pd 
 import numpy as np
 
+#the .cli parser is kept at the repository root, one level up from this script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cligen_cli import read_cli_df
+
 def comp_trends(wshed, method, clim_mod, loc, obs_mod, obs_loc):
 
     uncal_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/Uncalibrated/PAR/'.format(wshed)
@@ -13,14 +19,11 @@ def comp_trends(wshed, method, clim_mod, loc, obs_mod, obs_loc):
 
     def extract_cli_vars(cli_dir,period,cal_uncal,mod,loc_ID, years):
 
-        cli_data = pd.read_csv(str(cli_dir + '/{}_{}_{}_{}.cli'.format(wshed,mod,loc_ID,period)), skiprows = 13, sep = '\s+| ', engine = 'python')
-        cli_data.drop([0,], axis = 0, inplace = True)
-        cli_data['Pr'] = cli_data['prcp'].astype(float)
-        cli_data['Month'] = cli_data['mo'].astype(int)
-        cli_data['year'] = cli_data['year'].astype(int)
-        cli_data['Tmax'] = cli_data['tmax'].astype(float)
-        cli_data['Tmin'] = cli_data['tmin'].astype(float)
-        cli_data['dur'] = cli_data['dur'].astype(float)
+        cli_data = read_cli_df(str(cli_dir + '/{}_{}_{}_{}.cli'.format(wshed,mod,loc_ID,period)))
+        cli_data['Pr'] = cli_data['prcp']
+        cli_data['Month'] = cli_data['mo']
+        cli_data['Tmax'] = cli_data['tmax']
+        cli_data['Tmin'] = cli_data['tmin']
         cli_data['int'] = cli_data ['Pr'] / cli_data['dur']
 
 
@@ -0,0 +1,199 @@
+import os
+import time
+import pandas as pd
+from repo_root import add_repo_root
+from wepp_outputs import EBE_COLS, read_ebe, read_loss_geometry
+
+#stub_wepp.py and cligen_cli.py are imported from the repository root
+add_repo_root()
+
+
+def make_bench_outputs(wepp_out_dir, n_hills, years = 55, seed = 0):
+    '''
+    Writes n_hills synthetic .ebe.dat/.loss.dat pairs to wepp_out_dir with the
+    stub WEPP executable's event model (see stub_wepp.py). Every hillslope
+    uses the same climate with its own runoff/erosion factor.
+
+    wepp_out_dir = output directory to fill
+
+    n_hills = number of hillslopes
+
+    years = number of climate years
+
+    seed = random seed for the climate and hillslope geometry
+    '''
+
+    import random
+    import stub_wepp
+
+    rand = random.Random(seed)
+
+    os.makedirs(wepp_out_dir, exist_ok = True)
+
+    cli_file = os.path.join(wepp_out_dir, 'bench.cli')
+    stub_wepp.write_stub_cli(cli_file, years, seed)
+    days = stub_wepp.read_cli_days(cli_file)
+    os.remove(cli_file)
+
+    for n in range(1, n_hills + 1):
+        rows = stub_wepp.simulate_events(days, rand.uniform(0.5, 1.5))
+
+        stub_wepp.write_ebe(str(wepp_out_dir + 'H{}.ebe.dat'.format(n)), rows)
+        stub_wepp.write_loss(str(wepp_out_dir + 'H{}.loss.dat'.format(n)), rows, years,\
+                             rand.randint(1, 3), rand.uniform(20, 200), rand.uniform(50, 400))
+
+
+def read_legacy(wepp_out_dir, hills):
+    '''
+    Reads .loss/.ebe pairs the way the analysis scripts did before
+    wepp_outputs.py (full .loss scan with try/except float conversion and
+    pd.read_csv for .ebe). Kept as the benchmark baseline.
+    '''
+
+    for hill in hills:
+
+        with open(str(wepp_out_dir + hill + '.loss.dat'), 'r') as loss_data:
+
+            for line in loss_data:
+
+                if 'kg (based on profile width of' in line:
+                    nums = []
+                    for n in line.split():
+                        try:
+                            nums.append(float(n))
+                        except ValueError:
+                            pass
+                    width = nums[1]
+
+                if 't/ha (assuming contributions from' in line:
+                    nums = []
+                    for n in line.split():
+                        try:
+                            nums.append(float(n))
+                        except ValueError:
+                            pass
+                    area = nums[1]
+
+        all_data = pd.read_csv(str(wepp_out_dir + hill + '.ebe.dat'), skiprows = 3,\
+                               names = EBE_COLS, sep = r'\s+', header = None)
+
+
+def read_new(wepp_out_dir, hills):
+    '''
+    Reads .loss/.ebe pairs with read_loss_geometry and read_ebe
+    '''
+
+    for hill in hills:
+        width, area = read_loss_geometry(str(wepp_out_dir + hill + '.loss.dat'))
+        ebe = read_ebe(str(wepp_out_dir + hill + '.ebe.dat'))
+
+
+def bench_parsers(wepp_out_dir, n_files = None):
+    '''
+    Times the legacy and wepp_outputs readers on every hillslope in a WEPP
+    output directory (or the first n_files) and prints throughput in
+    hillslopes (one .ebe.dat + one .loss.dat) per second.
+
+    wepp_out_dir = WEPP output directory
+
+    n_files = number of hillslopes to read (None = all)
+
+    Returns a dictionary of hillslopes per second keyed by reader name
+    '''
+
+    hills = sorted([x[:-len('.ebe.dat')] for x in os.listdir(wepp_out_dir) if x.endswith('.ebe.dat')])
+
+    if n_files is not None:
+        hills = hills[:n_files]
+
+    rates = {}
+
+    for name, reader in [('legacy', read_legacy), ('wepp_outputs', read_new)]:
+        start = time.perf_counter()
+        reader(wepp_out_dir, hills)
+        elapsed = time.perf_counter() - start
+
+        rates[name] = len(hills) / elapsed
+
+        print('{:>12}: {} hillslopes in {:.1f} s ({:.0f} hillslopes/s)'.format(name, len(hills), elapsed, rates[name]))
+
+    print('{:>12}: {:.1f}x'.format('speedup', rates['wepp_outputs'] / rates['legacy']))
+
+    return rates
+
+
+def read_cli_legacy(cli_file):
+    '''
+    Reads a .cli file the way the analysis scripts did before cligen_cli.py
+    (regex separated read_csv on the python engine, dropping the units row
+    and casting every column). Kept as the benchmark baseline.
+    '''
+
+    cli_df = pd.read_csv(cli_file, skiprows = 13, sep = '\s+| ', engine = 'python')
+    cli_df.drop([0,], axis = 0, inplace = True)
+
+    for col in cli_df.columns:
+        if col in ['da', 'mo', 'year']:
+            cli_df[col] = cli_df[col].astype(int)
+
+        else:
+            cli_df[col] = cli_df[col].astype(float)
+
+    return cli_df
+
+
+def bench_cli_reader(cli_file, repeats = 10):
+    '''
+    Times the legacy and cligen_cli .cli readers on one file and prints the
+    average time per read
+
+    cli_file = path to .cli file
+
+    repeats = number of reads to average
+
+    Returns a dictionary of seconds per read keyed by reader name
+    '''
+
+    from cligen_cli import read_cli_df
+
+    times = {}
+
+    for name, reader in [('legacy', read_cli_legacy), ('cligen_cli', read_cli_df)]:
+        start = time.perf_counter()
+
+        for n in range(repeats):
+            reader(cli_file)
+
+        times[name] = (time.perf_counter() - start) / repeats
+
+        print('{:>12}: {:.1f} ms per .cli file'.format(name, times[name] * 1000))
+
+    print('{:>12}: {:.1f}x'.format('speedup', times['legacy'] / times['cligen_cli']))
+
+    return times
+
+
+if __name__ == '__main__':
+
+    import tempfile
+
+    #define directory of synthetic outputs (built on the first run)
+    bench_dir = os.path.join(tempfile.gettempdir(), 'wepp_bench_outputs/')
+
+    #number of hillslopes in the benchmark directory
+    n_hills = 10000
+
+    if not os.path.isdir(bench_dir) or len(os.listdir(bench_dir)) < 2 * n_hills:
+        make_bench_outputs(bench_dir, n_hills)
+
+    bench_parsers(bench_dir)
+
+    import stub_wepp
+
+    #55 year climate file like the observed period .cli files
+    bench_cli = os.path.join(tempfile.gettempdir(), 'wepp_bench_55yr.cli')
+
+    if not os.path.isfile(bench_cli):
+        stub_wepp.write_stub_cli(bench_cli, 55, 0)
+
+    bench_cli_reader(bench_cli)
@@ -1,4 +1,13 @@
-def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
+from repo_root import add_repo_root
+from wepp_cache import disk_cache
+from wepp_store import event_sources
+
+#cligen_cli.py is imported from the repository root
+add_repo_root()
+
+
+@disk_cache(depends = event_sources)
+def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end, store_dir = None):
     '''
     Loads in wepp output data from .ebe and .loss files. Extracts Sediment
     delivery and runoff values from .ebe and then converts sed-del values to 
@@ -16,10 +25,17 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
     month_start = integer value of month at beginning of season selection
 
     month_start = integer value of month at end of season selection
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files in wepp_out_dir)
     '''
 
     import pandas as pd
     import os
+    from wepp_outputs import load_geometry_index
+    from wepp_store import load_season_events
+    from wepp_seasons import season_months
+    from cligen_cli import read_cli_df, cli_day_index, day_ordinals, take_days
 
     ######## Load in .cli files and prep precip data #########
 
@@ -29,24 +45,26 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
     cli_file = str(cli_dir + cli_files[1])
 
     #read in first cligen file. The .cli files are constant across hillslopes
-    cli_df = pd.read_csv(cli_file, skiprows = 13, sep = '\s+| ', engine = 'python')
-    cli_df.drop([0,], axis = 0, inplace = True)
-    cli_df.reset_index(inplace = True)
-
-    #convert columns to floats
-    cli_df['Year'] = cli_df['year'].astype(int)
-    cli_df['Day'] = cli_df['da'].astype(int)
-    cli_df['Month'] = cli_df['mo'].astype(int)
-    cli_df['cli_pr'] = cli_df['prcp'].astype(float)
-    cli_df['st_dur'] = cli_df['dur'].astype(float)
-    cli_df['cli_tmax'] = cli_df['tmax'].astype(float)
-    cli_df['cli_tmin'] = cli_df['tmin'].astype(float)
+    cli_df = read_cli_df(cli_file)
+
+    #daily columns are already typed by read_cli_df
+    cli_df['Year'] = cli_df['year']
+    cli_df['Day'] = cli_df['da']
+    cli_df['Month'] = cli_df['mo']
+    cli_df['cli_pr'] = cli_df['prcp']
+    cli_df['st_dur'] = cli_df['dur']
+    cli_df['cli_tmax'] = cli_df['tmax']
+    cli_df['cli_tmin'] = cli_df['tmin']
     cli_df['cli_tavg'] = (cli_df['cli_tmax'] + cli_df['cli_tmin']) / 2
 
     #Find average precip intensity
     cli_df['pri'] = (cli_df['cli_pr']) / cli_df['st_dur']
     cli_df['pri'] = cli_df['pri'].fillna(0)
 
+    #index climate days by date once, so events pick up their precip intensity
+    #with an array take instead of a merge per hillslope
+    day_index = cli_day_index(cli_df['year'], cli_df['mo'], cli_df['da'])
+
     #obs and future periods have different year lengths
     if mod == 'Obs':
         years = 55
@@ -56,8 +74,7 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
 
 
     #select months in season
-    seasonal_cli = cli_df[cli_df['mo'].astype(int) >= month_start] 
-    seasonal_cli = seasonal_cli[seasonal_cli['mo'].astype(int) <= month_end]
+    seasonal_cli = cli_df[cli_df['mo'].astype(int).isin(season_months(month_start, month_end))]
 
 
     #Find number of days where precip > 25mm (seasonal and growing season)
@@ -86,18 +103,13 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
 
     ##### Load in .ebe and .loss files ######
 
-    #get ebe files from output directory
-    hillslopes = [x for x in os.listdir(wepp_out_dir) if x.endswith('.ebe.dat')]
-
-    #define column names for ebe file load in
-    ebe_col_list = ['Day', 'Month', 'Year', 'Precip', 'RO', 'IR-det',\
-                    'Av-det', 'Mx-det', 'Point', 'Av-dep', 'Mx-dep',\
-                    'Point_2', 'Sed-Del', 'ER']
-
-
+    #get hillslope IDs and their events in the season, from the results store
+    #when store_dir is given or from the .ebe files
+    hillslopes, season_events = load_season_events(wepp_out_dir, month_start, month_end, store_dir)
 
-    #get loss files from output directory
-    loss_files = [x for x in os.listdir(wepp_out_dir) if x.endswith('.loss.dat')]
+    #profile width, area and OFE count of each hillslope (read from the .loss
+    #files only the first time a watershed is analyzed)
+    geometry = load_geometry_index(wepp_out_dir, hillslopes)
 
 
     #output list that will hold all soil loss and runoff values for each hillslope
@@ -109,52 +121,14 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
     ##### Prep data for graphing ######
 
     #loop through all .loss and .ebe files (i.e. loop through hillslopes in watershed)
-    for file, hill in zip(loss_files,hillslopes):
-
-        #open .loss for reading
-        with open(str(wepp_out_dir + file), 'r') as loss_data:
-
-            #loop through lines
-            for line in loss_data:
-
-                #select line if it contains this key phrase:
-                if 'kg (based on profile width of' in line:
-
-                    #extract numbers from line
-                    nums = []
-                    for n in line.split():
-                        try:
-                            nums.append(float(n))
-                        except ValueError:
-                            pass
-                    
-                    #get hillslope profile width in meters
-                    width = nums[1]
-
-                #select line if it contains this key phrase:
-                if 't/ha (assuming contributions from' in line:
-
-                    #extract numbers from line
-                    nums = []
-                    for n in line.split():
-                        try:
-                            nums.append(float(n))
-                        except ValueError:
-                            pass
-                    
-                    #get hillslope area in hectares
-                    area = nums[1]
-                    
-        
-        #read in ebe file to dataframe
-        all_data = pd.read_csv(str(wepp_out_dir+hill), skiprows = 3,\
-                                names = ebe_col_list, sep = '\s+', header=None)
+    for hill in hillslopes:
 
-        ### select data by season ###
+        #get hillslope profile width (m) and area (ha) from the watershed geometry index
+        width = geometry.at[hill, 'width']
+        area = geometry.at[hill, 'area']
 
-        #select months in season
-        season_df = all_data[all_data['Month'] >= month_start] 
-        season_df = season_df[season_df['Month'] <= month_end]
+        #events of hillslope in selected months
+        season_df = season_events[hill]
 
         #extract individual hill loss data
         #multiply sed delivery value (in kg/m) by profile width to get kg,
@@ -182,13 +156,112 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
         #extend individual precipitation depths associated with runoff events to list
         PR_R_lst.extend(season_df['Precip'].to_list())
 
-        merged_df = pd.merge(seasonal_cli, season_df, how = 'right', on = ['Day', 'Month','Year'])
+        #simulation day of each runoff event in the climate table
+        event_days = day_ordinals(day_index, season_df['Year'], season_df['Month'], season_df['Day'])
 
         #extend individual precipitation intensities associated with runoff events to list
-        PRi_R_lst.extend(merged_df['pri'].tolist())
+        PRi_R_lst.extend(take_days(cli_df['pri'], event_days).tolist())
 
     #get average total soil loss and runoff for the entire watershed during the selected season
     SL = sum(SL_lst) / len(hillslopes)
     RO = sum(RO_lst) / len(hillslopes)
 
-    return SL_lst, RO_lst, PR_R_lst, PRi_R_lst, cli_df['cli_pr'], cli_df['pri'], RO, SL, avg_pr, avg_pri, pr_25, avg_dur, avg_tmax, avg_tmin
\ No newline at end of file
+    return SL_lst, RO_lst, PR_R_lst, PRi_R_lst, cli_df['cli_pr'], cli_df['pri'], RO, SL, avg_pr, avg_pri, pr_25, avg_dur, avg_tmax, avg_tmin
+
+
+@disk_cache(depends = event_sources, ignore = ['memory_budget'])
+def prep_ecdfs(cli_dir, wepp_out_dir, mod, month_start, month_end, x_limits, memory_budget, store_dir = None, n_bins = 2000):
+    '''
+    Chunked version of prep_data for ECDFs. Events are read one chunk at a
+    time within a memory budget (see wepp_chunks.py) and added to streaming
+    ECDFs (see wepp_ecdf.py) instead of being extended into lists, so the
+    ECDFs are the same as those built from the prep_data lists.
+
+    cli_dir = directory with cli file (wepp input directory - only one file is loaded in)
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    mod = climate model scenario
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection
+
+    x_limits = ECDF grid ranges of SL, RO, PR and PRi
+
+    memory_budget = memory budget of one chunk of events (MB)
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files in wepp_out_dir)
+
+    n_bins = number of ECDF bins between 0 and each x limit
+
+    Returns a dictionary of ECDFs of hillslope soil loss (SL) and runoff (RO)
+    and of precip depth (PR) and intensity (PRi) of runoff events
+    '''
+
+    import numpy as np
+    import pandas as pd
+    import os
+    from wepp_outputs import load_geometry_index
+    from wepp_chunks import list_hillslopes, iter_event_chunks
+    from wepp_ecdf import new_ecdf, update_ecdf
+    from cligen_cli import read_cli, cli_day_index, day_ordinals, take_days
+
+    #get cli files from input/cli directory, but only select one
+    cli_files = [x for x in os.listdir(cli_dir) if x.endswith('.cli')]
+    header, daily = read_cli(str(cli_dir + cli_files[1]))
+
+    #average precip intensity of each climate day
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        pri = daily['prcp'] / daily['dur']
+
+    pri[np.isnan(pri)] = 0
+
+    day_index = cli_day_index(daily['year'], daily['mo'], daily['da'])
+
+    #obs and future periods have different year lengths
+    if mod == 'Obs':
+        years = 55
+
+    else:
+        years = 40
+
+    hillslopes = list_hillslopes(wepp_out_dir, store_dir)
+    hill_index = pd.Index(hillslopes)
+
+    geometry = load_geometry_index(wepp_out_dir, hillslopes)
+
+    ecdfs = {var:new_ecdf(xlimit, n_bins) for var, xlimit in zip(['SL', 'RO', 'PR', 'PRi'], x_limits)}
+
+    #hillslope sums are added up across chunks, event values go straight into the ECDFs
+    sed_del = np.zeros(len(hillslopes))
+    runoff = np.zeros(len(hillslopes))
+
+    for chunk in iter_event_chunks(wepp_out_dir, memory_budget, store_dir, (month_start, month_end)):
+
+        hill_idx = hill_index.get_indexer(chunk['hill'])
+
+        sed_del += np.bincount(hill_idx, weights = chunk['Sed-Del'].to_numpy(), minlength = len(hillslopes))
+
+        #remove snowmelt runoff events
+        chunk = chunk[chunk['Precip'] > chunk['RO']]
+        hill_idx = hill_index.get_indexer(chunk['hill'])
+
+        runoff += np.bincount(hill_idx, weights = chunk['RO'].to_numpy(), minlength = len(hillslopes))
+
+        update_ecdf(ecdfs['PR'], chunk['Precip'])
+
+        event_days = day_ordinals(day_index, chunk['Year'], chunk['Month'], chunk['Day'])
+        update_ecdf(ecdfs['PRi'], take_days(pri, event_days))
+
+    #average total soil loss (t/ha) of hillslopes with area, runoff (mm) of every hillslope
+    width = geometry['width'].reindex(hillslopes).to_numpy()
+    area = geometry['area'].reindex(hillslopes).to_numpy()
+
+    has_area = area > 0
+
+    update_ecdf(ecdfs['SL'], ((sed_del[has_area] * width[has_area]) * 0.00110231) / area[has_area] / years)
+    update_ecdf(ecdfs['RO'], runoff / years)
+
+    return ecdfs
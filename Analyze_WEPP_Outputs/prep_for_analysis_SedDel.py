@@ -1,4 +1,9 @@
-def prep_data(wepp_out_dir, mod, month_start, month_end, SDR, TMDL_SD, TMDL_RO):
+from wepp_cache import disk_cache
+from wepp_store import event_sources
+
+
+@disk_cache(depends = event_sources, ignore = ['memory_budget'])
+def prep_data(wepp_out_dir, mod, month_start, month_end, SDR, TMDL_SD, TMDL_RO, store_dir = None, memory_budget = None):
     '''
     Loads in wepp output data from .ebe and .loss files. Extracts Sediment
     delivery and runoff values from .ebe and then converts sed-del values to 
@@ -16,10 +21,19 @@ def prep_data(wepp_out_dir, mod, month_start, month_end, SDR, TMDL_SD, TMDL_RO):
     month_start = integer value of month at beginning of season selection
 
     month_start = integer value of month at end of season selection
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files in wepp_out_dir)
+
+    memory_budget = memory budget (MB) of one chunk of events. Events are
+    summed one chunk at a time when given (see wepp_chunks.py), otherwise all
+    events of the season are loaded at once
     '''
 
     import pandas as pd
     import os
+    from wepp_outputs import load_geometry_index
+    from wepp_store import load_season_events
 
 
     #obs and future periods have different year lengths
@@ -30,20 +44,38 @@ def prep_data(wepp_out_dir, mod, month_start, month_end, SDR, TMDL_SD, TMDL_RO):
         years = 40
 
 
-    ##### Load in .ebe and .loss files ######
+    if memory_budget is not None:
+        import numpy as np
+        from wepp_chunks import list_hillslopes, hill_event_sums
 
-    #get ebe files from output directory
-    hillslopes = [x for x in os.listdir(wepp_out_dir) if x.endswith('.ebe.dat')]
+        #sum the events of every hillslope one chunk at a time
+        hillslopes = list_hillslopes(wepp_out_dir, store_dir)
+        geometry = load_geometry_index(wepp_out_dir, hillslopes)
+        hill_sums = hill_event_sums(wepp_out_dir, hillslopes, memory_budget, store_dir, (month_start, month_end))
 
-    #define column names for ebe file load in
-    ebe_col_list = ['Day', 'Month', 'Year', 'Precip', 'RO', 'IR-det',\
-                    'Av-det', 'Mx-det', 'Point', 'Av-dep', 'Mx-dep',\
-                    'Point_2', 'Sed-Del', 'ER']
+        width = geometry['width'].reindex(hillslopes).to_numpy()
+        area = geometry['area'].reindex(hillslopes).to_numpy()
 
+        #sediment delivery of hillslopes with area, runoff of every hillslope
+        has_area = area > 0
+        SD = ((((hill_sums['Sed-Del'][has_area]) * width[has_area]) * 0.00110231) / area[has_area]) * SDR / years
+        RO = hill_sums['runoff_rain'] / years
 
+        total_TMDL_SD = (np.count_nonzero(SD > TMDL_SD) / len(hillslopes)) * 100
+        total_TMDL_RO = (np.count_nonzero(RO > TMDL_RO) / len(hillslopes)) * 100
 
-    #get loss files from output directory
-    loss_files = [x for x in os.listdir(wepp_out_dir) if x.endswith('.loss.dat')]
+        return SD.tolist(), RO.tolist(), SD.sum() / len(hillslopes), RO.sum() / len(hillslopes), total_TMDL_SD, total_TMDL_RO
+
+
+    ##### Load in .ebe and .loss files ######
+
+    #get hillslope IDs and their events in the season, from the results store
+    #when store_dir is given or from the .ebe files
+    hillslopes, season_events = load_season_events(wepp_out_dir, month_start, month_end, store_dir)
+
+    #profile width, area and OFE count of each hillslope (read from the .loss
+    #files only the first time a watershed is analyzed)
+    geometry = load_geometry_index(wepp_out_dir, hillslopes)
 
 
     #output list that will hold all soil loss and runoff values for each hillslope
@@ -56,52 +88,14 @@ def prep_data(wepp_out_dir, mod, month_start, month_end, SDR, TMDL_SD, TMDL_RO):
     ##### Prep data for graphing ######
 
     #loop through all .loss and .ebe files (i.e. loop through hillslopes in watershed)
-    for file, hill in zip(loss_files,hillslopes):
-
-        #open .loss for reading
-        with open(str(wepp_out_dir + file), 'r') as loss_data:
-
-            #loop through lines
-            for line in loss_data:
-
-                #select line if it contains this key phrase:
-                if 'kg (based on profile width of' in line:
-
-                    #extract numbers from line
-                    nums = []
-                    for n in line.split():
-                        try:
-                            nums.append(float(n))
-                        except ValueError:
-                            pass
-                    
-                    #get hillslope profile width in meters
-                    width = nums[1]
-
-                #select line if it contains this key phrase:
-                if 't/ha (assuming contributions from' in line:
-
-                    #extract numbers from line
-                    nums = []
-                    for n in line.split():
-                        try:
-                            nums.append(float(n))
-                        except ValueError:
-                            pass
-                    
-                    #get hillslope area in hectares
-                    area = nums[1]
-                    
-        
-        #read in ebe file to dataframe
-        all_data = pd.read_csv(str(wepp_out_dir+hill), skiprows = 3,\
-                                names = ebe_col_list, sep = '\s+', header=None)
+    for hill in hillslopes:
 
-        ### select data by season ###
+        #get hillslope profile width (m) and area (ha) from the watershed geometry index
+        width = geometry.at[hill, 'width']
+        area = geometry.at[hill, 'area']
 
-        #select months in season
-        season_df = all_data[all_data['Month'] >= month_start] 
-        season_df = season_df[season_df['Month'] <= month_end]
+        #events of hillslope in selected months
+        season_df = season_events[hill]
 
         #extract individual hill loss data
         #multiply sed delivery value (in kg/m) by profile width to get kg,
@@ -1,4 +1,13 @@
-def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
+from repo_root import add_repo_root
+from wepp_cache import disk_cache
+from wepp_store import event_sources
+
+#cligen_cli.py is imported from the repository root
+add_repo_root()
+
+
+@disk_cache(depends = event_sources, ignore = ['memory_budget'])
+def prep_season_data(cli_dir, wepp_out_dir, mod, seasons, store_dir = None, memory_budget = None):
     '''
     Loads in wepp output data from .ebe and .loss files. Extracts Sediment
     delivery and runoff values from .ebe and then converts sed-del values to 
@@ -13,13 +22,30 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
 
     mod = climate model scenario
 
-    month_start = integer value of month at beginning of season selection
+    seasons = dictionary of (month_start, month_end) keyed by season name.
+    Every season is prepared from one read of the .cli and event data.
 
-    month_start = integer value of month at end of season selection
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files in wepp_out_dir)
+
+    memory_budget = memory budget (MB) of one chunk of events. Events are
+    read one chunk at a time when given (see wepp_chunks.py), otherwise all
+    events are loaded at once. Scatter plots keep every runoff event, so the
+    budget only bounds the event reads: each chunk is reduced to float32
+    arrays of its runoff events and the returned arrays still grow with the
+    number of runoff events of the selected seasons
+
+    Returns a dictionary of (soil loss, runoff, precip depth, precip
+    intensity) float32 event arrays keyed by season name
     '''
 
+    import numpy as np
     import pandas as pd
     import os
+    from wepp_outputs import load_geometry_index
+    from wepp_store import load_events
+    from wepp_seasons import season_events
+    from cligen_cli import read_cli_df, cli_day_index, day_ordinals, take_days
 
     ######## Load in .cli files and prep precip data #########
 
@@ -29,18 +55,16 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
     cli_file = str(cli_dir + cli_files[1])
 
     #read in first cligen file. The .cli files are constant across hillslopes
-    cli_df = pd.read_csv(cli_file, skiprows = 13, sep = '\s+| ', engine = 'python')
-    cli_df.drop([0,], axis = 0, inplace = True)
-    cli_df.reset_index(inplace = True)
-
-    #convert columns to floats
-    cli_df['Day'] = cli_df['da'].astype(int)
-    cli_df['Month'] = cli_df['mo'].astype(int)
-    cli_df['Year'] = cli_df['year'].astype(int)
-    cli_df['cli_pr'] = cli_df['prcp'].astype(float)
-    cli_df['st_dur'] = cli_df['dur'].astype(float)
-    cli_df['cli_tmax'] = cli_df['tmax'].astype(float)
-    cli_df['cli_tmin'] = cli_df['tmin'].astype(float)
+    cli_df = read_cli_df(cli_file)
+
+    #daily columns are already typed by read_cli_df
+    cli_df['Day'] = cli_df['da']
+    cli_df['Month'] = cli_df['mo']
+    cli_df['Year'] = cli_df['year']
+    cli_df['cli_pr'] = cli_df['prcp']
+    cli_df['st_dur'] = cli_df['dur']
+    cli_df['cli_tmax'] = cli_df['tmax']
+    cli_df['cli_tmin'] = cli_df['tmin']
     cli_df['cli_tavg'] = (cli_df['cli_tmax'] + cli_df['cli_tmin']) / 2
 
     #Find average precip intensity
@@ -51,118 +75,77 @@ def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end):
         cli_df = cli_df[cli_df['Year'] <= 40]
 
 
-    #select months in season
-    seasonal_cli = cli_df[cli_df['mo'].astype(int) >= month_start] 
-    seasonal_cli = seasonal_cli[seasonal_cli['mo'].astype(int) <= month_end]
+    ##### Load in .ebe and .loss files ######
 
+    if memory_budget is None:
+        #get hillslope IDs and all of their events once, from the results store
+        #when store_dir is given or from the .ebe files
+        hillslopes, events = load_events(wepp_out_dir, store_dir)
+        event_chunks = [events]
 
-    ##### Load in .ebe and .loss files ######
+    else:
+        from wepp_chunks import list_hillslopes, iter_event_chunks
 
-    #get ebe files from output directory
-    hillslopes = [x for x in os.listdir(wepp_out_dir) if x.endswith('.ebe.dat')]
+        #read events one chunk at a time within the memory budget
+        hillslopes = list_hillslopes(wepp_out_dir, store_dir)
+        event_chunks = iter_event_chunks(wepp_out_dir, memory_budget, store_dir)
 
-    #define column names for ebe file load in
-    ebe_col_list = ['Day', 'Month', 'Year', 'Precip', 'RO', 'IR-det',\
-                    'Av-det', 'Mx-det', 'Point', 'Av-dep', 'Mx-dep',\
-                    'Point_2', 'Sed-Del', 'ER']
+    #profile width, area and OFE count of each hillslope (read from the .loss
+    #files only the first time a watershed is analyzed)
+    geometry = load_geometry_index(wepp_out_dir, hillslopes)
 
+    #index climate days once per .cli file
+    day_index = cli_day_index(cli_df['Year'], cli_df['Month'], cli_df['Day'])
 
-    #get loss files from output directory
-    loss_files = [x for x in os.listdir(wepp_out_dir) if x.endswith('.loss.dat')]
 
-    #output list that will hold all soil loss and runoff values for each hillslope
-    SL_lst = []
-    RO_lst = []
-    PR_lst = []
-    PRi_lst = []
+    ##### Prep data for graphing ######
 
+    #soil loss, runoff, precip depth and precip intensity arrays of each
+    #chunk and season
+    season_data = {season_name:([], [], [], []) for season_name in seasons}
 
+    for events in event_chunks:
 
-    ##### Prep data for graphing ######
+        #hillslope profile width (m) and area (ha) of every event
+        events['width'] = events['hill'].map(geometry['width'])
+        events['area'] = events['hill'].map(geometry['area'])
 
-    #loop through all .loss and .ebe files
-    for file, hill in zip(loss_files,hillslopes):
-
-        #open .loss for reading
-        with open(str(wepp_out_dir + file), 'r') as loss_data:
-
-            #loop through lines
-            for line in loss_data:
-
-                #select line if it contains this key phrase:
-                if 'kg (based on profile width of' in line:
-
-                    #extract numbers from line
-                    nums = []
-                    for n in line.split():
-                        try:
-                            nums.append(float(n))
-                        except ValueError:
-                            pass
-                    
-                    #get hillslope profile width in meters
-                    width = nums[1]
-
-                #select line if it contains this key phrase:
-                if 't/ha (assuming contributions from' in line:
-
-                    #extract numbers from line
-                    nums = []
-                    for n in line.split():
-                        try:
-                            nums.append(float(n))
-                        except ValueError:
-                            pass
-                    
-                    #get hillslope area in hectares
-                    area = nums[1]
-                    
-        
-        #read in ebe file to dataframe
-        all_data = pd.read_csv(str(wepp_out_dir+hill), skiprows = 3,\
-                                names = ebe_col_list, sep = '\s+', header=None)
-
-        #convert month, day, year values to integers
-        all_data['Month'] = all_data['Month'].astype(int)
-        all_data['Day'] = all_data['Day'].astype(int)
-        all_data['Year'] = all_data['Year'].astype(int)
-
-        ### select data by season ###
-
-        #select months in season
-        season_df = all_data[all_data['Month'] >= month_start] 
-        season_df = season_df[season_df['Month'] <= month_end]
+        #attach precip intensity of each event from its simulation day in the climate
+        #table (NaN for days not in cli_df)
+        event_days = day_ordinals(day_index, events['Year'], events['Month'], events['Day'])
+        events['pri'] = take_days(cli_df['pri'], event_days)
 
         #remove snowmelt runoff events
-        season_df = season_df[season_df['Precip'] > season_df['RO']]
+        events = events[events['Precip'] > events['RO']]
 
-        #extract individual hill loss data
+        #extract individual event loss data
         #multiply sed delivery value (in kg/m) by profile width to get kg,
         #convert from kg to tons,
-        #divide by area to get avg soil loss in tons/ha
-
-        if area > 0:
-            event_losses = (((season_df['Sed-Del']) * width) * 0.00110231) / area
+        #divide by area to get soil loss in tons/ha (0 for hillslopes without area)
+        event_losses = ((events['Sed-Del'] * events['width']) * 0.00110231) / events['area']
+        event_losses = event_losses.where(events['area'] > 0, 0)
 
-            #extend dataframe column to SL_lst as individual values
-            SL_lst.extend(event_losses.tolist())
+        #soil loss, runoff, precip depth and precip intensity of each runoff event
+        event_values = [values.to_numpy(dtype = np.float32) for values in [event_losses, events['RO'],\
+                                                                          events['Precip'], events['pri']]]
 
-        if area == 0:
-            event_losses = (((season_df['Sed-Del']) * 0))
-            #extend dataframe column to SL_lst as individual values
-            SL_lst.extend(event_losses.tolist())
-        
+        #split the runoff events of the chunk into every season at once
+        for season_name, in_season in season_events(events, seasons).items():
+            for season_lst, values in zip(season_data[season_name], event_values):
+                season_lst.append(values[in_season])
 
-        #append runoff column to RO_lst as individual events
-        RO_lst.extend(season_df['RO'].to_list())
+    return {season_name:tuple(np.concatenate(season_lst) if season_lst else np.array([], dtype = np.float32)\
+                              for season_lst in season_lsts) for season_name, season_lsts in season_data.items()}
 
-        merged_df = pd.merge(seasonal_cli, season_df, how = 'right', on = ['Day', 'Month','Year'])
 
-        #extend precip intensities for each runoff event to list
-        PRi_lst.extend(merged_df['pri'].tolist())
+def prep_data(cli_dir, wepp_out_dir, mod, month_start, month_end, store_dir = None, memory_budget = None):
+    '''
+    Prepares event-by-event soil loss, runoff, precip depth and precip
+    intensity arrays for one season (see prep_season_data)
 
-        #extend precip depths for each runoff event to list
-        PR_lst.extend(season_df['Precip'].tolist())
+    month_start = integer value of month at beginning of season selection
 
+    month_end = integer value of month at end of season selection
+    '''
 
-    return SL_lst, RO_lst, PR_lst, PRi_lst
\ No newline at end of file
+    return prep_season_data(cli_dir, wepp_out_dir, mod, {'season':(month_start, month_end)}, store_dir, memory_budget)['season']
@@ -0,0 +1,15 @@
+import os
+import sys
+
+#repository root, where cligen_cli.py and stub_wepp.py are kept
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def add_repo_root():
+    '''
+    Makes the modules kept at the repository root (cligen_cli, stub_wepp)
+    importable when the analysis scripts are run from this directory
+    '''
+
+    if REPO_ROOT not in sys.path:
+        sys.path.append(REPO_ROOT)
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+#what bootstrap replicates resample
+RESAMPLE_MODES = ['hillslopes', 'years', 'both']
+
+
+def resample_counts(n_hills, n_years, n_boot = 2000, resample = 'both', seed = 0):
+    '''
+    Draws the bootstrap resamples of a hillslope x year matrix as counts:
+    how many times each hillslope and each year is drawn in every replicate
+    (rows). Dimensions that are not resampled get a count of 1 for every
+    hillslope/year.
+
+    n_hills, n_years = size of the hillslope x year matrix
+
+    n_boot = number of bootstrap replicates
+
+    resample = 'hillslopes', 'years' or 'both' (see RESAMPLE_MODES)
+
+    seed = seed of the random generator (the same seed gives the same
+    resamples, so scenarios of the same size are compared on the same draws)
+
+    Returns n_boot x n_hills and n_boot x n_years count arrays
+    '''
+
+    if resample not in RESAMPLE_MODES:
+        raise ValueError('resample must be one of {}'.format(RESAMPLE_MODES))
+
+    rng = np.random.default_rng(seed)
+
+    if resample in ['hillslopes', 'both']:
+        hill_counts = rng.multinomial(n_hills, np.full(n_hills, 1 / n_hills), size = n_boot)
+    else:
+        hill_counts = np.ones((n_boot, n_hills), dtype = np.int64)
+
+    if resample in ['years', 'both']:
+        year_counts = rng.multinomial(n_years, np.full(n_years, 1 / n_years), size = n_boot)
+    else:
+        year_counts = np.ones((n_boot, n_years), dtype = np.int64)
+
+    return hill_counts, year_counts
+
+
+def bootstrap_means(matrix, hill_counts, year_counts):
+    '''
+    Computes the watershed average annual total (mean over hillslopes and
+    years) of every bootstrap replicate of a hillslope x year matrix in one
+    array operation: replicate b is
+    hill_counts[b] @ matrix @ year_counts[b] / (n_hills * n_years)
+
+    matrix = hillslope x year array of annual (season) totals
+
+    hill_counts, year_counts = resample counts (see resample_counts)
+
+    Returns an array of n_boot replicate means
+    '''
+
+    n_hills, n_years = matrix.shape
+
+    #weighted year sums of every hillslope, then weighted hillslope sums
+    hill_sums = year_counts @ matrix.T
+
+    return np.einsum('bh,bh->b', hill_sums, hill_counts) / (n_hills * n_years)
+
+
+def bootstrap_ci(matrix, n_boot = 2000, resample = 'both', ci = 95, seed = 0):
+    '''
+    Bootstraps the watershed average annual total of a hillslope x year
+    matrix by resampling hillslopes and/or simulation years with replacement
+
+    matrix = hillslope x year array of annual (season) totals
+
+    n_boot = number of bootstrap replicates
+
+    resample = 'hillslopes', 'years' or 'both' (see RESAMPLE_MODES)
+
+    ci = width of the percentile confidence interval (%)
+
+    seed = seed of the random generator
+
+    Returns the mean, lower and upper bound of the confidence interval
+    '''
+
+    matrix = np.asarray(matrix, dtype = float)
+
+    hill_counts, year_counts = resample_counts(matrix.shape[0], matrix.shape[1], n_boot, resample, seed)
+
+    means = bootstrap_means(matrix, hill_counts, year_counts)
+
+    lower, upper = np.percentile(means, [(100 - ci) / 2, 100 - (100 - ci) / 2])
+
+    return matrix.mean(), lower, upper
+
+
+def annual_matrix(cube, var, wshed, mod, scen, month_start, month_end):
+    '''
+    Gets the hillslope x year matrix of annual season totals of one
+    watershed/climate model/scenario from the WEPP output cube (see
+    wepp_cube.py). Hillslopes that are not in the watershed and years past
+    the end of the climate period are dropped. Hillslopes with zero area
+    count as 0 soil loss, as in watershed averages.
+
+    cube = cube dataset (see wepp_cube.build_cube/open_cube)
+
+    var = cube variable (see wepp_cube.CUBE_VARS)
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection
+    '''
+
+    from wepp_seasons import season_months
+
+    totals = cube[var].sel(wshed = wshed, mod = mod, scen = scen, month = season_months(month_start, month_end))
+    totals = totals.sum('month', min_count = 1)
+
+    in_wshed = cube['area'].sel(wshed = wshed).notnull().to_numpy()
+
+    matrix = totals.to_numpy()[in_wshed]
+
+    #years past the end of the climate period are NaN for every hillslope
+    in_period = ~np.isnan(matrix).all(axis = 0)
+
+    return np.nan_to_num(matrix[:, in_period], nan = 0)
+
+
+def bootstrap_metrics(cube, wshed, mods, scens, month_start = 4, month_end = 11, var_lst = None,\
+                      n_boot = 2000, resample = 'both', ci = 95, seed = 0):
+    '''
+    Bootstraps confidence intervals of the watershed average annual season
+    totals of every climate model/scenario from the per-hillslope annual
+    matrices of the WEPP output cube (see annual_matrix and bootstrap_ci).
+    Scenarios with the same number of hillslopes and years are resampled
+    with the same draws.
+
+    cube = cube dataset (see wepp_cube.build_cube/open_cube)
+
+    wshed = watershed ID
+
+    mods = list of climate model IDs
+
+    scens = list of management scenario IDs
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection
+
+    var_lst = cube variables to bootstrap (see wepp_cube.CUBE_VARS, None =
+    soil_loss and RO)
+
+    n_boot = number of bootstrap replicates
+
+    resample = 'hillslopes', 'years' or 'both' (see RESAMPLE_MODES)
+
+    ci = width of the percentile confidence interval (%)
+
+    seed = seed of the random generator
+
+    Returns a tidy dataframe with wshed, mod, scen, metric, value, lower and
+    upper columns
+    '''
+
+    if var_lst is None:
+        var_lst = ['soil_loss', 'RO']
+
+    rows = []
+
+    for mod in mods:
+        for scen in scens:
+            for var in var_lst:
+
+                matrix = annual_matrix(cube, var, wshed, mod, scen, month_start, month_end)
+
+                value, lower, upper = bootstrap_ci(matrix, n_boot, resample, ci, seed)
+
+                rows.append({'wshed':wshed, 'mod':mod, 'scen':scen, 'metric':var,\
+                             'value':value, 'lower':lower, 'upper':upper})
+
+    return pd.DataFrame(rows, columns = ['wshed', 'mod', 'scen', 'metric', 'value', 'lower', 'upper'])
@@ -0,0 +1,279 @@
+import os
+import contextlib
+from repo_root import REPO_ROOT
+
+#directory that holds cached results (set WEPP_CACHE_DIR to move it, or
+#WEPP_CACHE=0 to turn caching off)
+CACHE_DIR = os.environ.get('WEPP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.wepp_analysis_cache'))
+
+#modules whose functions the cached prep functions call to read and reduce
+#WEPP outputs. Editing any of them invalidates every cached result
+HELPER_MODULES = ['wepp_outputs', 'wepp_store', 'wepp_seasons', 'wepp_chunks', 'wepp_ecdf', 'cligen_cli']
+
+#lists collecting the cache keys of cached calls (see record_keys)
+KEY_RECORDS = []
+
+
+def temp_path(path):
+    '''
+    Returns a temporary file name next to path that is unique to the
+    calling process and call, so concurrent writers of the same file never
+    write into one temporary file. Write to it, then os.replace it to path.
+    '''
+
+    import uuid
+
+    return '{}.{}-{}.tmp'.format(path, os.getpid(), uuid.uuid4().hex[:12])
+
+
+def dir_fingerprint(path):
+    '''
+    Returns a sorted list of (relative path, size, mtime) of every file under
+    a directory. Any rerun WEPP output, .cli file or store partition changes
+    the fingerprint.
+    '''
+
+    files = []
+
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            files.append((os.path.relpath(os.path.join(root, name), path), stat.st_size, stat.st_mtime_ns))
+
+    return sorted(files)
+
+
+def path_fingerprint(path):
+    '''
+    Returns the fingerprint of a source file or directory: (size, mtime) of
+    a file, the dir_fingerprint of a directory, None if it does not exist
+    '''
+
+    if os.path.isdir(path):
+        return dir_fingerprint(path)
+
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    return None
+
+
+def code_files(func):
+    '''
+    Returns the source files of the code a cached function runs: the file of
+    the function's own module and the files of HELPER_MODULES, looked up in
+    this directory and the repository root (None for those that are not
+    found)
+    '''
+
+    import importlib.machinery
+    import inspect
+
+    files = [inspect.getsourcefile(func)]
+
+    for name in HELPER_MODULES:
+        spec = importlib.machinery.PathFinder.find_spec(name, [os.path.dirname(os.path.abspath(__file__)), REPO_ROOT])
+
+        files.append(None if spec is None else spec.origin)
+
+    return files
+
+
+def call_key(func, args, kwargs, ignore = ()):
+    '''
+    Builds the key of a function call from its arguments only (defaults
+    filled in, arguments named in ignore left out). Cached results of the
+    same call share it, whatever their source files and code, so a new
+    result replaces the results it supersedes.
+    '''
+
+    import hashlib
+    import inspect
+
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+
+    sha = hashlib.sha256()
+
+    for name, value in bound.arguments.items():
+        if name not in ignore:
+            sha.update(repr((name, value)).encode())
+
+    return sha.hexdigest()[:16]
+
+
+def cache_key(func, args, kwargs, depends = None, ignore = ()):
+    '''
+    Builds the cache key of a function call from the source code of its
+    module and of HELPER_MODULES, its arguments (defaults filled in) and the
+    fingerprint of its source files. Sources are the paths returned by
+    depends (called with a dictionary of the arguments), or every argument
+    that is a directory when depends is None. Arguments named in ignore
+    (e.g. memory budgets that do not change the result) are left out of the
+    key.
+    '''
+
+    import hashlib
+    import inspect
+
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+
+    sha = hashlib.sha256()
+
+    for path in code_files(func):
+        if path is None:
+            sha.update(b'None')
+
+        else:
+            with open(path, 'rb') as code:
+                sha.update(code.read())
+
+    for name, value in bound.arguments.items():
+        if name not in ignore:
+            sha.update(repr((name, value)).encode())
+
+    if depends is None:
+        sources = [value for value in bound.arguments.values() if isinstance(value, str) and os.path.isdir(value)]
+
+    else:
+        sources = depends(dict(bound.arguments))
+
+    for path in sources:
+        sha.update(repr((path, path_fingerprint(path))).encode())
+
+    return sha.hexdigest()
+
+
+def disk_cache(func = None, depends = None, ignore = ()):
+    '''
+    Decorator that saves the results of a prep function to CACHE_DIR and
+    returns them again for calls with the same arguments. A cached result is
+    only used while its source files are unchanged, so rerunning a scenario
+    only recomputes the results that depend on it.
+
+    depends = function that returns the source files/directories of a call
+    from a dictionary of its arguments (e.g. wepp_store.event_sources).
+    Every directory argument is a source when None. Use as
+    @disk_cache(depends = ...)
+
+    ignore = names of arguments that do not change the result (left out of
+    the cache key)
+
+    Results are also recomputed when the decorated function's module or any
+    of HELPER_MODULES is edited (see cache_key).
+
+    Cache files are named {module}.{function}-{call_key}-{cache_key}.pkl.
+    Saving a result deletes the other results of the same call, so results
+    of changed source files or code do not pile up in CACHE_DIR.
+
+    The decorated function gets a lookup method with the same arguments that
+    returns (True, result) for a cached call and (False, None) otherwise,
+    without computing anything.
+    '''
+
+    import functools
+    import pickle
+
+    if func is None:
+        return functools.partial(disk_cache, depends = depends, ignore = ignore)
+
+    def call_prefix(args, kwargs):
+        return '{}.{}-{}-'.format(func.__module__, func.__name__, call_key(func, args, kwargs, ignore))
+
+    def cache_file(args, kwargs):
+        return os.path.join(CACHE_DIR, '{}{}.pkl'.format(call_prefix(args, kwargs),\
+                                                         cache_key(func, args, kwargs, depends, ignore)))
+
+    def lookup(*args, **kwargs):
+
+        if os.environ.get('WEPP_CACHE', '1') == '0':
+            return False, None
+
+        path = cache_file(args, kwargs)
+
+        if not os.path.isfile(path):
+            return False, None
+
+        with open(path, 'rb') as cache_data:
+            return True, pickle.load(cache_data)
+
+    @functools.wraps(func)
+    def cached(*args, **kwargs):
+
+        if os.environ.get('WEPP_CACHE', '1') == '0':
+            return func(*args, **kwargs)
+
+        path = cache_file(args, kwargs)
+
+        for keys in KEY_RECORDS:
+            keys.append(os.path.basename(path))
+
+        if os.path.isfile(path):
+            with open(path, 'rb') as cache_data:
+                return pickle.load(cache_data)
+
+        result = func(*args, **kwargs)
+
+        os.makedirs(CACHE_DIR, exist_ok = True)
+
+        tmp_path = temp_path(path)
+
+        with open(tmp_path, 'wb') as cache_data:
+            pickle.dump(result, cache_data, protocol = pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp_path, path)
+
+        #drop the results this one supersedes (other writers may remove them first)
+        prefix = call_prefix(args, kwargs)
+
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith(prefix) and name.endswith('.pkl') and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, name))
+                except FileNotFoundError:
+                    pass
+
+        return result
+
+    cached.lookup = lookup
+
+    return cached
+
+
+@contextlib.contextmanager
+def record_keys():
+    '''
+    Context manager that collects the cache keys (cache file names) of every
+    cached call made inside it, in call order. The keys identify the
+    precomputed data a figure is drawn from without hashing the data itself
+    (see wepp_render.render_figures). Nothing is recorded when WEPP_CACHE is
+    0.
+
+    with record_keys() as keys:
+        curves = prep_ecdf_curves(...)
+    '''
+
+    keys = []
+    KEY_RECORDS.append(keys)
+
+    try:
+        yield keys
+
+    finally:
+        KEY_RECORDS.remove(keys)
+
+
+def clear_cache():
+    '''
+    Deletes every cached result in CACHE_DIR, and temporary files left by
+    interrupted writes
+    '''
+
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.pkl') or name.endswith('.tmp'):
+            os.remove(os.path.join(CACHE_DIR, name))
@@ -0,0 +1,148 @@
+import os
+import numpy as np
+import pandas as pd
+from wepp_outputs import EBE_COLS, read_ebe
+from wepp_seasons import season_months
+
+#estimated bytes per event row held while a chunk is processed: the hill
+#column and the columns in EBE_COLS, doubled for the columns and masks
+#derived from them
+EVENT_ROW_BYTES = 8 * (len(EBE_COLS) + 1) * 2
+
+
+def chunk_rows(memory_budget):
+    '''
+    Returns the number of event rows in a chunk that fits in a memory budget
+
+    memory_budget = memory budget of one chunk (MB)
+    '''
+
+    if memory_budget <= 0:
+        raise ValueError('memory_budget must be larger than 0 MB')
+
+    return max(1, int(memory_budget * 2**20 // EVENT_ROW_BYTES))
+
+
+def list_hillslopes(wepp_out_dir, store_dir = None):
+    '''
+    Returns the sorted list of hillslope IDs of a WEPP output directory,
+    from the results store when store_dir is given, otherwise from the
+    .ebe.dat file names (no events are read)
+    '''
+
+    if store_dir is None:
+        return sorted([x[:-len('.ebe.dat')] for x in os.listdir(wepp_out_dir) if x.endswith('.ebe.dat')])
+
+    from wepp_store import scenario_keys, read_hillslopes
+
+    return read_hillslopes(store_dir, *scenario_keys(wepp_out_dir))
+
+
+def iter_event_chunks(wepp_out_dir, memory_budget, store_dir = None, months = None):
+    '''
+    Iterates over the events of a WEPP output directory one chunk at a time,
+    so event-level analyses of any number of watersheds/climate
+    models/scenarios only hold one chunk of events in memory. Chunks hold
+    about chunk_rows(memory_budget) events.
+
+    .ebe.dat files are read one hillslope at a time and a chunk is yielded
+    once it is full, so all events of a hillslope are in the same chunk.
+    Results store partitions are scanned in record batches with the month
+    range pushed down to pyarrow, so events of a hillslope may be split
+    across chunks.
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    memory_budget = memory budget of one chunk (MB)
+
+    store_dir = directory of the results store (None = read .ebe.dat files)
+
+    months = (month_start, month_end) to select a season (wrapping through
+    December when month_start > month_end, see wepp_seasons.season_months),
+    None for all months
+
+    Yields dataframes with a hill column and the columns in EBE_COLS
+    '''
+
+    max_rows = chunk_rows(memory_budget)
+
+    if months is not None:
+        month_lst = season_months(*months)
+
+    if store_dir is None:
+
+        tables = []
+        n_rows = 0
+
+        for hill in list_hillslopes(wepp_out_dir):
+
+            table = read_ebe(str(wepp_out_dir + hill + '.ebe.dat'))
+
+            if months is not None:
+                in_months = np.isin(table['Month'], month_lst)
+                table = {col:table[col][in_months] for col in EBE_COLS}
+
+            table['hill'] = np.repeat(np.array([hill], dtype = object), len(table['Day']))
+
+            tables.append(table)
+            n_rows += len(table['Day'])
+
+            if n_rows >= max_rows:
+                yield pd.DataFrame({col:np.concatenate([table[col] for table in tables]) for col in ['hill'] + EBE_COLS})
+
+                tables = []
+                n_rows = 0
+
+        if n_rows > 0:
+            yield pd.DataFrame({col:np.concatenate([table[col] for table in tables]) for col in ['hill'] + EBE_COLS})
+
+        return
+
+    import pyarrow.dataset as ds
+    from wepp_store import scenario_keys, partition_file
+
+    path = partition_file(store_dir, 'events', *scenario_keys(wepp_out_dir))
+
+    if not os.path.isfile(path):
+        raise FileNotFoundError('{} is not in the results store at {}'.format(wepp_out_dir, store_dir))
+
+    month_filter = None
+
+    if months is not None:
+        month_filter = ds.field('Month').isin(month_lst)
+
+    dataset = ds.dataset(path, format = 'parquet')
+
+    for batch in dataset.to_batches(columns = ['hill'] + EBE_COLS, filter = month_filter, batch_size = max_rows):
+        if batch.num_rows > 0:
+            yield batch.to_pandas()
+
+
+def hill_event_sums(wepp_out_dir, hillslopes, memory_budget, store_dir = None, months = None):
+    '''
+    Sums sediment delivery (kg/m) and runoff without snowmelt events (mm,
+    events with precip > runoff) of every hillslope one chunk of events at a
+    time (see iter_event_chunks)
+
+    hillslopes = list of all hillslope IDs in the watershed/scenario
+
+    Returns a dictionary of Sed-Del and runoff_rain arrays in hillslopes order
+    '''
+
+    hill_index = pd.Index(hillslopes)
+
+    sums = {'Sed-Del':np.zeros(len(hillslopes)), 'runoff_rain':np.zeros(len(hillslopes))}
+
+    for chunk in iter_event_chunks(wepp_out_dir, memory_budget, store_dir, months):
+
+        hill_idx = hill_index.get_indexer(chunk['hill'])
+
+        if (hill_idx < 0).any():
+            raise ValueError('events include hillslopes that are not in hillslopes')
+
+        rain = chunk['Precip'].to_numpy() > chunk['RO'].to_numpy()
+
+        sums['Sed-Del'] += np.bincount(hill_idx, weights = chunk['Sed-Del'].to_numpy(), minlength = len(hillslopes))
+        sums['runoff_rain'] += np.bincount(hill_idx[rain], weights = chunk['RO'].to_numpy()[rain], minlength = len(hillslopes))
+
+    return sums
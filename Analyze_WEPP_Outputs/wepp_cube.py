@@ -0,0 +1,338 @@
+import os
+import numpy as np
+import pandas as pd
+from wepp_cache import disk_cache
+from wepp_store import event_sources
+
+#monthly totals kept for every watershed/climate model/scenario/hillslope/year
+#RO = runoff (mm)
+#RO_rain = runoff without snowmelt events (mm, events with precip > runoff)
+#soil_loss = soil loss from Sed-Del (t/ha, NaN for hillslopes with zero area)
+#Precip = precipitation of runoff events (mm)
+#events = number of runoff events
+CUBE_VARS = ['RO', 'RO_rain', 'soil_loss', 'Precip', 'events']
+
+#simulation years of the longest (observed) climate period
+CUBE_YEARS = 55
+
+
+@disk_cache(depends = event_sources)
+def scenario_cube(wepp_out_dir, years, store_dir = None):
+    '''
+    Reduces the events of one WEPP output directory to monthly totals of
+    every hillslope and year (see CUBE_VARS) in one pass over the events
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    years = number of years in climate period
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files in wepp_out_dir)
+
+    Returns the list of hillslope IDs and a dictionary of hillslope x year x
+    month float32 arrays keyed by the names in CUBE_VARS
+    '''
+
+    from wepp_outputs import load_geometry_index
+    from wepp_store import load_events
+
+    hillslopes, events = load_events(wepp_out_dir, store_dir)
+    geometry = load_geometry_index(wepp_out_dir, hillslopes)
+
+    n_bins = len(hillslopes) * years * 12
+
+    hill_idx = pd.Index(hillslopes).get_indexer(events['hill'])
+    year_idx = events['Year'].to_numpy().astype(int) - 1
+
+    if (year_idx < 0).any() or (year_idx >= years).any():
+        raise ValueError('{} has events outside of simulation years 1-{}'.format(wepp_out_dir, years))
+
+    #flat hillslope x year x month bin of every event
+    bins = (hill_idx * years + year_idx) * 12 + events['Month'].to_numpy().astype(int) - 1
+
+    precip = events['Precip'].to_numpy()
+    runoff = events['RO'].to_numpy()
+
+    #multiply sed delivery value (in kg/m) by profile width to get kg,
+    #convert from kg to tons, divide by area to get soil loss in tons/ha
+    width = geometry['width'].reindex(hillslopes).to_numpy()
+    area = geometry['area'].reindex(hillslopes).to_numpy()
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        to_t_ha = np.where(area > 0, width * 0.00110231 / area, np.nan)
+
+    totals = {'RO':np.bincount(bins, weights = runoff, minlength = n_bins),\
+              'RO_rain':np.bincount(bins, weights = np.where(precip > runoff, runoff, 0), minlength = n_bins),\
+              'soil_loss':np.bincount(bins, weights = events['Sed-Del'].to_numpy(), minlength = n_bins),\
+              'Precip':np.bincount(bins, weights = precip, minlength = n_bins),\
+              'events':np.bincount(bins, minlength = n_bins).astype(float)}
+
+    totals = {var:totals[var].reshape(len(hillslopes), years, 12) for var in CUBE_VARS}
+    totals['soil_loss'] = totals['soil_loss'] * to_t_ha[:, None, None]
+
+    return hillslopes, {var:totals[var].astype(np.float32) for var in CUBE_VARS}
+
+
+def create_cube_file(cube_file, coords):
+    '''
+    Creates an empty cube file with every variable in CUBE_VARS (chunked by
+    watershed/climate model/scenario, all NaN) and the area variable, so
+    build_cube can write one scenario block at a time without holding the
+    cube in memory
+
+    cube_file = .nc (netCDF, written to cube_file + '.tmp' until
+    finish_cube_file) or .zarr path
+
+    coords = dictionary of wshed, mod, scen, hillslope, year and month
+    coordinate lists
+
+    Returns the open netCDF4 dataset or zarr group. Variables are written
+    with cube[var][w, m, s] = block for either file type.
+    '''
+
+    dims = ['wshed', 'mod', 'scen', 'hillslope', 'year', 'month']
+    shape = tuple(len(coords[dim]) for dim in dims)
+    chunks = (1, 1, 1, shape[3], CUBE_YEARS, 12)
+
+    if cube_file.endswith('.zarr'):
+        import shutil
+        import xarray as xr
+        import zarr
+
+        if os.path.isdir(cube_file):
+            shutil.rmtree(cube_file)
+
+        #write the coordinates with xarray, then add the empty variables
+        xr.Dataset(coords = coords).to_zarr(cube_file, mode = 'w', consolidated = False)
+
+        cube = zarr.open_group(cube_file, mode = 'r+')
+
+        for var in CUBE_VARS:
+            cube.create_array(var, shape = shape, chunks = chunks, dtype = 'float32',\
+                              fill_value = np.nan, dimension_names = dims)
+
+        cube.create_array('area', shape = shape[:1] + shape[3:4], dtype = 'float64',\
+                          fill_value = np.nan, dimension_names = ['wshed', 'hillslope'])
+
+        return cube
+
+    import netCDF4
+
+    cube = netCDF4.Dataset(str(cube_file + '.tmp'), 'w')
+
+    for dim in dims:
+        cube.createDimension(dim, len(coords[dim]))
+
+        if dim in ['year', 'month']:
+            cube.createVariable(dim, 'i8', (dim,))[:] = np.asarray(coords[dim])
+
+        else:
+            cube.createVariable(dim, str, (dim,))[:] = np.array(coords[dim], dtype = object)
+
+    for var in CUBE_VARS:
+        cube.createVariable(var, 'f4', dims, zlib = True, complevel = 4, chunksizes = chunks, fill_value = np.nan)
+
+    cube.createVariable('area', 'f8', ('wshed', 'hillslope'), fill_value = np.nan)
+
+    return cube
+
+
+def finish_cube_file(cube, cube_file):
+    '''
+    Closes a cube file created by create_cube_file (moves a netCDF file
+    into place, consolidates zarr metadata)
+    '''
+
+    if cube_file.endswith('.zarr'):
+        import zarr
+
+        zarr.consolidate_metadata(cube_file)
+
+    else:
+        cube.close()
+        os.replace(str(cube_file + '.tmp'), cube_file)
+
+
+def build_cube(prw_dir, wshed_lst, mod_lst, scen_lst, cube_file, store_dir = None, max_workers = None):
+    '''
+    Builds the WEPP output cube: a .zarr store or netCDF file of the monthly
+    totals in CUBE_VARS with dims wshed x mod x scen x hillslope x year x
+    month, so season and period aggregates (see season_cube) are reductions
+    of the cube instead of new passes over the output files. Scenarios are
+    reduced across a pool of worker processes (see scenario_cube, cached per
+    scenario) and each scenario block is written to the cube file as soon as
+    its worker finishes, so only a few scenario blocks are held in memory.
+
+    Years past the end of a climate period (41-55 of future periods) and
+    hillslopes that are not in a watershed are NaN. The area variable (wshed
+    x hillslope, ha) is NaN for hillslopes that are not in a watershed.
+
+    prw_dir = directory holding all watershed project directories
+
+    wshed_lst = list of watershed IDs
+
+    mod_lst = list of climate model IDs
+
+    scen_lst = list of management scenario IDs
+
+    cube_file = .nc (netCDF) or .zarr path the cube is written to
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    max_workers = maximum number of worker processes. Uses all cores when None
+
+    Returns the cube dataset, opened lazily (see open_cube)
+    '''
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from wepp_outputs import load_geometry_index
+    from wepp_chunks import list_hillslopes
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    tasks = [(wshed, mod, scen) for wshed in wshed_lst for mod in mod_lst for scen in scen_lst]
+
+    #define wepp output directory where data is stored
+    out_dirs = {task:str(prw_dir + '{}/New_Runs/{}/{}/wepp/output/'.format(*task)) for task in tasks}
+
+    #every hillslope ID of any watershed, in hillslope number order (IDs are
+    #listed without reading any events)
+    hill_ids = sorted(set(hill for task in tasks for hill in list_hillslopes(out_dirs[task], store_dir)),\
+                      key = lambda hill: (len(hill), hill))
+    hill_index = pd.Index(hill_ids)
+
+    cube = create_cube_file(cube_file, {'wshed':list(wshed_lst), 'mod':list(mod_lst), 'scen':list(scen_lst),\
+                                        'hillslope':hill_ids, 'year':np.arange(1, CUBE_YEARS + 1),\
+                                        'month':np.arange(1, 13)})
+
+    area = np.full((len(wshed_lst), len(hill_ids)), np.nan)
+
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+
+        futures = {}
+
+        for wshed, mod, scen in tasks:
+
+            #obs and future periods have different year lengths
+            if mod == 'Obs':
+                years = 55
+
+            else:
+                years = 40
+
+            futures[pool.submit(scenario_cube, out_dirs[(wshed, mod, scen)], years, store_dir)] = (wshed, mod, scen)
+
+        for future in as_completed(futures):
+
+            wshed, mod, scen = futures.pop(future)
+            hillslopes, totals = future.result()
+
+            w, m, s = wshed_lst.index(wshed), mod_lst.index(mod), scen_lst.index(scen)
+            h = hill_index.get_indexer(hillslopes)
+
+            for var in CUBE_VARS:
+                block = np.full((len(hill_ids), CUBE_YEARS, 12), np.nan, dtype = np.float32)
+                block[h, :totals[var].shape[1]] = totals[var]
+
+                cube[var][w, m, s] = block
+
+            if np.isnan(area[w, h]).any():
+                area[w, h] = load_geometry_index(out_dirs[(wshed, mod, scen)], hillslopes)['area'].reindex(hillslopes).to_numpy()
+
+    cube['area'][:] = area
+
+    finish_cube_file(cube, cube_file)
+
+    return open_cube(cube_file)
+
+
+def open_cube(cube_file, load = False):
+    '''
+    Opens a cube saved by build_cube. Variables are read lazily, so
+    selections (e.g. one watershed or season) only read their own chunks
+
+    load = load the whole cube into memory, so aggregates are in-memory
+    reductions
+    '''
+
+    import xarray as xr
+
+    if cube_file.endswith('.zarr'):
+        engine = 'zarr'
+
+    else:
+        engine = None
+
+    ds = xr.open_dataset(cube_file, engine = engine)
+
+    if not load:
+        return ds
+
+    with ds:
+        return ds.load()
+
+
+def season_cube(cube, month_start, month_end, year_start = None, year_end = None):
+    '''
+    Aggregates a cube to average annual season totals of every hillslope,
+    and watershed averages over all hillslopes of each watershed (hillslopes
+    with zero area add no soil loss, as in wepp_seasons.season_totals)
+
+    cube = cube dataset (see build_cube/open_cube)
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection (seasons
+    with month_start after month_end wrap through December)
+
+    year_start, year_end = simulation years of the period (None = every
+    year of each climate period)
+
+    Returns two datasets:
+    1.) hillslope totals (wshed x mod x scen x hillslope)
+    2.) watershed averages (wshed x mod x scen)
+    '''
+
+    from wepp_seasons import season_months
+
+    ds = cube[CUBE_VARS].sel(month = season_months(month_start, month_end),\
+                             year = slice(year_start, year_end))
+
+    #years past the end of a climate period stay NaN
+    hill_totals = ds.sum('month', min_count = 1).mean('year')
+
+    #average over every hillslope in the watershed
+    n_hills = cube['area'].notnull().sum('hillslope')
+
+    wshed_totals = hill_totals.sum('hillslope') / n_hills
+
+    return hill_totals, wshed_totals
+
+
+if __name__ == '__main__':
+
+    #define directory holding all watershed project directories
+    prw_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/'
+
+    #define directory of the parquet results store built by wepp_store.py
+    #(None = read the .ebe files of each scenario, set it to the store directory
+    #once wepp_store.py has built the store)
+    store_dir = None
+
+    #define file the cube is saved to (.nc or .zarr)
+    cube_file = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/wepp_cube.nc'
+
+    wshed_lst = ['DO1', 'GO1', 'ST1']
+
+    mod_lst = ['Obs','L3_59','L3_99','L4_59','L4_99',\
+               'B3_59','B3_99','B4_59','B4_99']
+
+    scen_lst = ['Per_0', 'Per_m20', 'Per_B', 'Per_p20',\
+                'Per_0_100', 'Per_m20_100', 'Per_B_100', 'Per_p20_100',\
+                'CC_10', 'CC_20', 'CT_50', 'CT_100']
+
+    #reduce every scenario once. Rebuild after rerunning WEPP for a scenario
+    #(unchanged scenarios come from the cache)
+    build_cube(prw_dir, wshed_lst, mod_lst, scen_lst, cube_file, store_dir)
@@ -0,0 +1,146 @@
+import numpy as np
+
+#ECDF types used by the ECDF scripts (freq_total_input)
+ECDF_MODES = ['Frequency', 'Total Sum']
+
+
+def new_ecdf(x_max, n_bins = 2000, x_min = 0):
+    '''
+    Creates an empty streaming ECDF: a fixed grid of n_bins bins between
+    x_min and x_max holding the count and sum of the values in each bin, plus
+    one bin for values below x_min and one for values above x_max. Values
+    are added in chunks with update_ecdf, so the full list of values is never
+    kept or sorted. ECDFs with the same grid can be merged.
+
+    Error bound: the cumulative frequency and cumulative total of every curve
+    point (see ecdf_curve) are exact; the x position of a point is at most one
+    bin width ((x_max - x_min) / n_bins, see ecdf_error) above the largest
+    value it counts. Use the plot's x-axis limit as x_max to keep the error
+    below one pixel.
+
+    x_max = upper end of the grid (e.g. x-axis limit)
+
+    n_bins = number of bins between x_min and x_max
+
+    x_min = lower end of the grid
+    '''
+
+    if x_max <= x_min:
+        raise ValueError('x_max must be larger than x_min')
+
+    return {'x_min':float(x_min),\
+            'x_max':float(x_max),\
+            'n_bins':int(n_bins),\
+            'counts':np.zeros(n_bins + 2, dtype = np.int64),\
+            'sums':np.zeros(n_bins + 2),\
+            'max':-np.inf}
+
+
+def ecdf_error(ecdf):
+    '''
+    Returns the largest x error of an ECDF's curve points (one bin width)
+    '''
+
+    return (ecdf['x_max'] - ecdf['x_min']) / ecdf['n_bins']
+
+
+def update_ecdf(ecdf, values):
+    '''
+    Adds a chunk of values (list, series or array) to an ECDF. NaN values
+    are skipped. Returns the updated ECDF.
+    '''
+
+    values = np.asarray(values, dtype = float).ravel()
+    values = values[~np.isnan(values)]
+
+    if values.size == 0:
+        return ecdf
+
+    n_bins = ecdf['n_bins']
+
+    #bin 0 holds values below x_min and bin n_bins + 1 values above x_max
+    bins = np.floor((values - ecdf['x_min']) / ecdf_error(ecdf)) + 1
+    bins = np.clip(bins, 0, n_bins + 1).astype(np.int64)
+
+    ecdf['counts'] += np.bincount(bins, minlength = n_bins + 2)
+    ecdf['sums'] += np.bincount(bins, weights = values, minlength = n_bins + 2)
+    ecdf['max'] = max(ecdf['max'], values.max())
+
+    return ecdf
+
+
+def merge_ecdfs(ecdfs):
+    '''
+    Merges ECDFs built on the same grid (e.g. one per hillslope, climate
+    model or worker process) into a new ECDF
+    '''
+
+    merged = None
+
+    for ecdf in ecdfs:
+
+        if merged is None:
+            merged = new_ecdf(ecdf['x_max'], ecdf['n_bins'], ecdf['x_min'])
+
+        elif (ecdf['x_min'], ecdf['x_max'], ecdf['n_bins']) != (merged['x_min'], merged['x_max'], merged['n_bins']):
+            raise ValueError('ECDFs with different grids can not be merged')
+
+        merged['counts'] += ecdf['counts']
+        merged['sums'] += ecdf['sums']
+        merged['max'] = max(merged['max'], ecdf['max'])
+
+    if merged is None:
+        raise ValueError('no ECDFs to merge')
+
+    return merged
+
+
+def ecdf_curve(ecdf, freq_total_input = 'Frequency'):
+    '''
+    Gets the plot-ready curve of an ECDF: one point at the upper edge of each
+    bin where the ECDF rises, so there are at most n_bins + 2 points however
+    many values were added. Values below x_min are placed at x_min and the
+    last point is at the largest value (100%).
+
+    freq_total_input = 'Frequency' for cumulative frequency (%) of values,
+    'Total Sum' for cumulative total (%) of values
+
+    Returns x and y arrays
+    '''
+
+    if freq_total_input == 'Frequency':
+        weights = ecdf['counts']
+
+    elif freq_total_input == 'Total Sum':
+        weights = ecdf['sums']
+
+    else:
+        raise ValueError('freq_total_input must be one of {}'.format(ECDF_MODES))
+
+    n_bins = ecdf['n_bins']
+
+    x = np.concatenate([[ecdf['x_min']],\
+                        ecdf['x_min'] + np.arange(1, n_bins + 1) * ecdf_error(ecdf),\
+                        [ecdf['max']]])
+
+    #upper edge of the last filled bin can not be past the largest value
+    x = np.minimum(x, ecdf['max'])
+
+    cum = np.cumsum(weights)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        y = (cum / cum[-1]) * 100
+
+    #only keep bins where the curve rises
+    keep = weights != 0
+
+    return x[keep], y[keep]
+
+
+def list_ecdf_curve(values, x_max, freq_total_input = 'Frequency', n_bins = 2000):
+    '''
+    Builds an ECDF from one list of values and returns its curve (see
+    new_ecdf and ecdf_curve)
+    '''
+
+    return ecdf_curve(update_ecdf(new_ecdf(x_max, n_bins), values), freq_total_input)
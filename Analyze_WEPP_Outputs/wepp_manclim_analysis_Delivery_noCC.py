@@ -6,148 +6,21 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from wepp_metrics import compute_metrics
 
-def analyze_sed_del(wshed,SDR,TMDL_SD,TMDL_RO,mod_lst,ymin,ymax,per_adopt_lst,wshed_name):
+def analyze_sed_del(wshed,SDR,TMDL_SD,TMDL_RO,mod_lst,ymin,ymax,per_adopt_lst,wshed_name, store_dir = None):
     '''
     Analyze sediment delivery and runoff outputs for all watersheds, management scenarios, and climate 
-    models. Data is loaded and prepped in with prep_SL_RO_data function. The
+    models. Data is loaded and prepped in with compute_metrics (wepp_metrics.py). The
     prepped data is then visualized with the graph_soil_del function.
 
     wshed_lst = list of watershed names 
     scen_lst = list of future management scenario IDs
     mod_lst = list of future climate model IDs
+    store_dir = directory of the parquet results store (None = read .ebe files)
     '''
 
 
-    def prep_SL_RO_data(wepp_out_dir,years):
-        '''
-        Loads in wepp output data from .ebe and .loss files. Extracts soil loss
-        values from .ebe, averages them by hillslope over entire period,
-        and then converts the average to a mass/area sediment delivery value using
-        profile width and area values extracted from the .loss files and the calculated
-        sediment delivery ratio (SDR).
-
-        wepp_out_dir = WEPP watershed/scenario/clim model output directory 
-
-        years = total number of years in climate period
-
-        output_lst = output list that will hold average sediment delivery value for each hillslope
-        '''
-
-
-        ##### Load in .ebe and .loss files ######
-
-        #get ebe files from output directory
-        hillslopes = [x for x in os.listdir(wepp_out_dir) if x.endswith('.ebe.dat')]
-
-        #define column names for ebe file load in
-        ebe_col_list = ['Day', 'Month', 'Year', 'Precip', 'RO', 'IR-det',\
-                        'Av-det', 'Mx-det', 'Point', 'Av-dep', 'Mx-dep',\
-                        'Point_2', 'Sed-Del', 'ER']
-
-
-
-        #get loss files from output directory
-        loss_files = [x for x in os.listdir(wepp_out_dir) if x.endswith('.loss.dat')]
-
-
-        #output list that will hold average sediment delivery values for each hillslope
-        SD_lst = []
-        TMDL_SD_lst = []
-        RO_lst = []
-        TMDL_RO_lst = []
-
-        ##### Prep data for graphing ######
-
-        #loop through all .loss and .ebe files
-        for file, hill in zip(loss_files,hillslopes):
-
-            #open .loss for reading
-            with open(str(wepp_out_dir + file), 'r') as loss_data:
-
-                #loop through lines
-                for line in loss_data:
-
-                    #select line if it contains this key phrase:
-                    if 'kg (based on profile width of' in line:
-
-                        #extract numbers from line
-                        nums = []
-                        for n in line.split():
-                            try:
-                                nums.append(float(n))
-                            except ValueError:
-                                pass
-                        
-                        #get hillslope profile width in meters
-                        width = nums[1]
-
-                    #select line if it contains this key phrase:
-                    if 't/ha (assuming contributions from' in line:
-
-                        #extract numbers from line
-                        nums = []
-                        for n in line.split():
-                            try:
-                                nums.append(float(n))
-                            except ValueError:
-                                pass
-                        
-                        #get hillslope area in hectares
-                        area = nums[1]
-                        
-            
-            #read in ebe file to dataframe
-            all_data = pd.read_csv(str(wepp_out_dir+hill), skiprows = 3,\
-                                    names = ebe_col_list, sep = '\s+', header=None)
-
-            season_data = all_data[all_data['Month'] > 3]
-            season_data = season_data[season_data['Month'] < 12]
-
-
-            #get average sediment delivery for entire period
-            #divide sum by total number of years,
-            #multiple by sed delivery value (in kg/m) by profile width to get kg,
-            #convert from kg to tons,
-            #divide by area to get avg sediment delivery in tons/ha
-
-            if area > 0:
-                #calculate average sediment delivery during the growing season or spring/fall/summer
-                avg_SD= ((((season_data['Sed-Del'].sum() / years) * width) * 0.00110231) / area) * SDR
-                #append to hillslope
-                SD_lst.append(avg_SD)
-
-
-                if avg_SD > TMDL_SD:
-                    TMDL_SD_lst.append(avg_SD)
-
-
-            if area == 0:
-                pass
-            
-            #calculate average runoff during the growing season or spring/fall/summer
-            avg_RO = season_data['RO'].sum() / years
-            RO_lst.append(avg_RO)
-
-            if avg_RO > TMDL_RO:
-                TMDL_RO_lst.append(avg_RO)
-
-
-        #Get average total sediment delivery for entire watershed
-        total_SD= sum(SD_lst) / len(hillslopes)
-
-        #Get the percentage of hillslopes in a watershed above TMDL field sediment delivery
-        total_TMDL_SD = (len(TMDL_SD_lst) / len(hillslopes)) * 100
-
-        #Get average total runoff for entire watershed
-        total_RO = sum(RO_lst) / len(hillslopes)
-
-        #Get the percentage of hillslopes in a watershed abvove TMDL runoff
-        total_TMDL_RO = (len(TMDL_RO_lst) / len(hillslopes)) * 100
-
-        return total_SD, total_TMDL_SD, total_RO, total_TMDL_RO
-
-
     #set up groups of scenarios. Each group will be plotted into an ecdf
     #for each climate model. Climate models will be combined onto each
     #management scenario plot
@@ -179,10 +52,20 @@ def analyze_sed_del(wshed,SDR,TMDL_SD,TMDL_RO,mod_lst,ymin,ymax,per_adopt_lst,ws
 
     axes[1,1].axis('off')
 
+    #compute every metric for all climate models and scenarios once, across a
+    #pool of worker processes, then look up graphed values in the metrics table
+    prw_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs_Final/'
+    all_scens = [scen for scen_lst in scen_types for scen in scen_lst]
+
+    thresholds = {'unsustain':12.5, 'TMDL_SD':TMDL_SD, 'TMDL_RO':TMDL_RO}
+
+    metrics = compute_metrics(wshed, mod_lst, all_scens, 'Growing Season', SDR, thresholds,\
+                              prw_dir = prw_dir, store_dir = store_dir).set_index(['mod', 'scen', 'metric'])['value']
+
     def graph_prepped_data(graphed_var, TMDL_val, y_lab):
 
         '''
-        Run prep_SL_RO_data function for all climate scenarios for
+        Get compute_metrics outputs of all climate scenarios for
         sediment delivery or runoff (determined via graphed_var input)
 
         Then set up dataframe with all values for each climate mod, plot data points,
@@ -218,33 +101,11 @@ def analyze_sed_del(wshed,SDR,TMDL_SD,TMDL_RO,mod_lst,ymin,ymax,per_adopt_lst,ws
             for mod, mod_out_lst in zip(mod_lst, mod_out_lsts):
 
                 for scen in scen_lst:
-                    
-                    #define number of years in model period
-                    if mod == 'Obs':
-                        years = 55
-
-                    if mod != 'Obs':
-                        years = 40
-                    
-                    #define wepp output directory where data is stored
-                    wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs_Final/{}/New_Runs/{}/{}/wepp/output/'.format(wshed,mod,scen))
-
-                    #run prep_SL_RO_data using defined number of years and wepp output directory
-                    sed_del, TMDL_SD, runoff, TMDL_RO = prep_SL_RO_data(wepp_out_dir, years)
-                    
-                    #append output value to list depending on function input
-                    if graphed_var == 'sed_del':
-                        mod_out_lst.append(sed_del)
-
-                    if graphed_var == 'runoff':
-                        mod_out_lst.append(runoff)
-
-                    if graphed_var == 'TMDL_SD':
-                        mod_out_lst.append(TMDL_SD)
-
-                    if graphed_var == 'TMDL_RO': 
-                        mod_out_lst.append(TMDL_RO)
-                        
+
+                    #get output value of climate model/scenario from the metrics table
+                    value = metrics.at[(mod, scen, graphed_var)]
+
+                    mod_out_lst.append(value)
 
             #Set up dataframe with model names as column heads
             output_df = pd.DataFrame({'GFDL-ESM2G 4.5 2020-59':B3_59,\
@@ -326,23 +187,32 @@ def analyze_sed_del(wshed,SDR,TMDL_SD,TMDL_RO,mod_lst,ymin,ymax,per_adopt_lst,ws
 
 
 
-mod_lst = ['B3_59', 'B3_99', 'B4_59', 'B4_99',\
-           'L3_59', 'L3_99', 'L4_59', 'L4_99',\
-           'Obs']    
+#worker processes re-import this script on Windows, so the sweep is only
+#started from the main process
+if __name__ == '__main__':
+
+    mod_lst = ['B3_59', 'B3_99', 'B4_59', 'B4_99',\
+               'L3_59', 'L3_99', 'L4_59', 'L4_99',\
+               'Obs']    
+
+    S_ymin = 0 #ST1
+    S_ymax = 40 #ST1
+    ST1_per_adopt = [0, 30, 50, 66]
 
-S_ymin = 0 #ST1
-S_ymax = 40 #ST1
-ST1_per_adopt = [0, 30, 50, 66]
+    G_ymin = 0 #GO1
+    G_ymax = 40 #GO1
+    GO1_per_adopt = [0, 42, 62, 79.1]
 
-G_ymin = 0 #GO1
-G_ymax = 40 #GO1
-GO1_per_adopt = [0, 42, 62, 79.1]
+    D_ymin = 0 #DO1
+    D_ymax = 40 #DO1
+    DO1_per_adopt = [0, 25, 45, 72]
 
-D_ymin = 0 #DO1
-D_ymax = 40 #DO1
-DO1_per_adopt = [0, 25, 45, 72]
+    #define directory of the parquet results store built by wepp_store.py
+    #(None = read the .ebe files of each scenario, set it to the store directory
+    #once wepp_store.py has built the store)
+    store_dir = None
 
-#Run function for each watershed
-analyze_sed_del('DO1', 0.0645, 0.129, 15.8, mod_lst, D_ymin, D_ymax, DO1_per_adopt, 'Dodge')
-analyze_sed_del('GO1', 0.0643, 0.131, 10.7, mod_lst, G_ymin, G_ymax, GO1_per_adopt, 'Goodhue')
-analyze_sed_del('ST1', 0.0296, 0.013, 13.8, mod_lst, S_ymin, S_ymax, ST1_per_adopt, 'Stearns')
+    #Run function for each watershed
+    analyze_sed_del('DO1', 0.0645, 0.129, 15.8, mod_lst, D_ymin, D_ymax, DO1_per_adopt, 'Dodge', store_dir)
+    analyze_sed_del('GO1', 0.0643, 0.131, 10.7, mod_lst, G_ymin, G_ymax, GO1_per_adopt, 'Goodhue', store_dir)
+    analyze_sed_del('ST1', 0.0296, 0.013, 13.8, mod_lst, S_ymin, S_ymax, ST1_per_adopt, 'Stearns', store_dir)
@@ -0,0 +1,193 @@
+import os
+import numpy as np
+import pandas as pd
+from wepp_cache import disk_cache
+from wepp_store import event_sources
+
+#watershed metrics computed for every climate model/management scenario
+#soil_loss = average total hillslope soil loss (t/ha)
+#unsustain = hillslopes with unsustainable soil loss (%)
+#runoff = average total hillslope runoff (mm)
+#sed_del = average total hillslope sediment delivery (t/ha)
+#TMDL_SD = hillslopes with sediment delivery above the TMDL goal (%)
+#TMDL_RO = hillslopes with runoff above the TMDL goal (%)
+METRIC_COLS = ['soil_loss', 'unsustain', 'runoff', 'sed_del', 'TMDL_SD', 'TMDL_RO']
+
+#hillslope total each threshold metric is tested against
+THRESHOLD_VARS = {'unsustain':'soil_loss', 'TMDL_SD':'sed_del', 'TMDL_RO':'runoff'}
+
+#soil loss (t/ha) above which a hillslope is unsustainable
+UNSUSTAIN_LOSS = 12.5
+
+
+@disk_cache(depends = event_sources)
+def hill_metric_totals(wepp_out_dir, years, month_start = 4, month_end = 11, store_dir = None):
+    '''
+    Computes the average annual soil loss (t/ha) and runoff (mm) of every
+    hillslope of one WEPP output directory for one season from a single read
+    of its events. Totals do not depend on the SDR or TMDL goals, so they are
+    only recomputed when the WEPP outputs change.
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    years = total number of years in climate period
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files in wepp_out_dir)
+
+    Returns a dataframe with hill, soil_loss and runoff columns (soil loss is
+    NaN for hillslopes with zero area)
+    '''
+
+    from wepp_outputs import load_geometry_index
+    from wepp_store import load_events
+    from wepp_seasons import season_totals
+
+    hillslopes, events = load_events(wepp_out_dir, store_dir, (month_start, month_end))
+    geometry = load_geometry_index(wepp_out_dir, hillslopes)
+
+    hill_totals, wshed_totals = season_totals(events, hillslopes, geometry, years,\
+                                              {'season':(month_start, month_end)})
+
+    return hill_totals[['hill', 'soil_loss', 'runoff']].reset_index(drop = True)
+
+
+def compute_metrics(wshed, mods, scens, season = 'Growing Season', sdr = None, thresholds = None,\
+                    prw_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/', store_dir = None,\
+                    max_workers = None):
+    '''
+    Computes every watershed metric in METRIC_COLS for all climate
+    models/management scenarios of a watershed. The outputs of each scenario
+    are parsed once into cached hillslope totals (see hill_metric_totals).
+    Only scenarios whose source files changed since they were cached are
+    parsed again, across a pool of worker processes. SDR scaling and
+    threshold tests are then applied to the hillslope totals of every
+    scenario at once, so changing the SDR or a TMDL goal does not re-read
+    any outputs. Averages and percentages are
+    taken over all hillslopes in the watershed (hillslopes with zero area
+    add no soil loss or sediment delivery).
+
+    wshed = watershed ID
+
+    mods = list of climate model IDs
+
+    scens = list of management scenario IDs (duplicates are computed once)
+
+    season = season name in wepp_seasons.SEASONS or (month_start, month_end)
+
+    sdr = watershed sediment delivery ratio (sed_del and TMDL_SD are NaN when None)
+
+    thresholds = dictionary of thresholds keyed by metric name (see
+    THRESHOLD_VARS): unsustain = unsustainable soil loss (t/ha), TMDL_SD =
+    TMDL goal for hillslope sediment delivery (t/ha), TMDL_RO = TMDL goal for
+    hillslope runoff (mm). Metrics without a threshold are NaN. None =
+    {'unsustain':UNSUSTAIN_LOSS}
+
+    prw_dir = directory holding all watershed project directories
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    max_workers = maximum number of worker processes. Uses all cores when None
+
+    Returns a tidy dataframe with one row per climate model/scenario/metric
+    (wshed, mod, scen, season, metric and value columns) in mods/scens order
+    '''
+
+    from concurrent.futures import ProcessPoolExecutor
+    from wepp_seasons import SEASONS
+
+    if isinstance(season, str):
+        month_start, month_end = SEASONS[season]
+
+    else:
+        month_start, month_end = season
+        season = '{}-{}'.format(month_start, month_end)
+
+    if thresholds is None:
+        thresholds = {'unsustain':UNSUSTAIN_LOSS}
+
+    unknown = set(thresholds) - set(THRESHOLD_VARS)
+
+    if unknown:
+        raise ValueError('thresholds must be keyed by {}, got {}'.format(list(THRESHOLD_VARS), sorted(unknown)))
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    tasks = [(mod, scen) for mod in dict.fromkeys(mods) for scen in dict.fromkeys(scens)]
+
+    partials = {}
+    stale = {}
+
+    for mod, scen in tasks:
+
+        #obs and future periods have different year lengths
+        if mod == 'Obs':
+            years = 55
+
+        else:
+            years = 40
+
+        #define wepp output directory where data is stored
+        wepp_out_dir = str(prw_dir + '{}/New_Runs/{}/{}/wepp/output/'.format(wshed, mod, scen))
+
+        args = (wepp_out_dir, years, month_start, month_end, store_dir)
+
+        #hillslope totals of scenarios whose sources are unchanged come from the cache
+        cached, totals = hill_metric_totals.lookup(*args)
+
+        if cached:
+            partials[(mod, scen)] = totals
+
+        else:
+            stale[(mod, scen)] = args
+
+    if len(stale) > 0:
+        with ProcessPoolExecutor(max_workers = min(max_workers, len(stale))) as pool:
+
+            futures = {task:pool.submit(hill_metric_totals, *args) for task, args in stale.items()}
+
+            for (mod, scen), future in futures.items():
+                partials[(mod, scen)] = future.result()
+
+                print('{} {} {}: hillslope totals recomputed'.format(wshed, mod, scen))
+
+    hills = pd.concat([partials[task] for task in tasks], keys = tasks, names = ['mod', 'scen'])
+
+    #post-hoc vector ops over the hillslopes of every scenario
+    if sdr is None:
+        hills['sed_del'] = np.nan
+
+    else:
+        hills['sed_del'] = hills['soil_loss'] * sdr
+
+    group = hills.groupby(level = ['mod', 'scen'], sort = False)
+    n_hills = group.size()
+
+    wide = pd.DataFrame(index = n_hills.index, columns = METRIC_COLS, dtype = float)
+
+    for var in ['soil_loss', 'runoff', 'sed_del']:
+        wide[var] = group[var].sum() / n_hills
+
+    if sdr is None:
+        wide['sed_del'] = np.nan
+
+    for metric, threshold in thresholds.items():
+        exceeds = hills[THRESHOLD_VARS[metric]] > threshold
+        wide[metric] = exceeds.groupby(level = ['mod', 'scen'], sort = False).sum() / n_hills * 100
+
+    if sdr is None:
+        wide['TMDL_SD'] = np.nan
+
+    tidy = wide.reset_index().melt(id_vars = ['mod', 'scen'], value_vars = METRIC_COLS,\
+                                   var_name = 'metric', value_name = 'value')
+
+    tidy.insert(0, 'wshed', wshed)
+    tidy.insert(3, 'season', season)
+
+    return tidy
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+#column names of the .ebe.dat event table
+EBE_COLS = ['Day', 'Month', 'Year', 'Precip', 'RO', 'IR-det',\
+            'Av-det', 'Mx-det', 'Point', 'Av-dep', 'Mx-dep',\
+            'Point_2', 'Sed-Del', 'ER']
+
+#date columns are read as integers, every other column as floats
+EBE_DATE_COLS = ['Day', 'Month', 'Year']
+
+
+def read_ebe(ebe_file):
+    '''
+    Reads the event table of a WEPP hillslope .ebe.dat file into typed
+    NumPy arrays (int32 for Day/Month/Year, float64 for the rest).
+
+    ebe_file = path to .ebe.dat file
+
+    Returns a dictionary of arrays keyed by the column names in EBE_COLS.
+    Hillslopes without runoff events get empty arrays.
+    '''
+
+    import warnings
+
+    #loadtxt warns when a hillslope has no events
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        table = np.loadtxt(ebe_file, skiprows = 3, ndmin = 2)
+
+    if table.size == 0:
+        table = table.reshape(0, len(EBE_COLS))
+
+    ebe = {}
+
+    for n, col in enumerate(EBE_COLS):
+        if col in EBE_DATE_COLS:
+            ebe[col] = table[:, n].astype(np.int32)
+
+        else:
+            ebe[col] = table[:, n]
+
+    return ebe
+
+
+def read_ebe_df(ebe_file):
+    '''
+    Reads a WEPP hillslope .ebe.dat file into a dataframe with the columns
+    in EBE_COLS (see read_ebe)
+
+    ebe_file = path to .ebe.dat file
+    '''
+
+    return pd.DataFrame(read_ebe(ebe_file), columns = EBE_COLS)
+
+
+def line_numbers(line):
+    '''
+    Returns a list of every number in a line of text
+    '''
+
+    nums = []
+
+    for n in line.split():
+        try:
+            nums.append(float(n))
+        except ValueError:
+            pass
+
+    return nums
+
+
+def read_loss_geometry(loss_file):
+    '''
+    Gets the hillslope profile width (m) and area (ha) from a WEPP .loss.dat
+    file. Reading stops as soon as both lines are found.
+
+    loss_file = path to .loss.dat file
+
+    Returns width, area
+    '''
+
+    width = None
+    area = None
+
+    with open(loss_file, 'r') as loss_data:
+
+        for line in loss_data:
+
+            if 'kg (based on profile width of' in line:
+                width = line_numbers(line)[1]
+
+            elif 't/ha (assuming contributions from' in line:
+                area = line_numbers(line)[1]
+
+            if width is not None and area is not None:
+                return width, area
+
+    raise ValueError('profile width or area not found in {}'.format(loss_file))
+
+
+def read_man_ofes(man_file):
+    '''
+    Gets the number of overland flow elements (OFEs) of a hillslope from
+    line 7 of its .man file. Returns 0 if the file is missing or the line
+    can not be read.
+
+    man_file = path to hillslope .man file
+    '''
+
+    import os
+
+    if not os.path.isfile(man_file):
+        return 0
+
+    with open(man_file, 'r') as man_data:
+        lines = man_data.readlines()
+
+    try:
+        return int(lines[6].split()[0])
+    except (IndexError, ValueError):
+        return 0
+
+
+def geometry_index_file(wepp_out_dir):
+    '''
+    Returns the path of the hillslope geometry index of the watershed that a
+    {wshed}/New_Runs/{mod}/{scen}/wepp/output/ directory belongs to
+    ({wshed}/hillslope_geometry.csv)
+    '''
+
+    import os
+
+    wshed_dir = os.path.normpath(wepp_out_dir)
+
+    for n in range(5):
+        wshed_dir = os.path.dirname(wshed_dir)
+
+    return os.path.join(wshed_dir, 'hillslope_geometry.csv')
+
+
+def load_geometry_index(wepp_out_dir, hillslopes):
+    '''
+    Gets the profile width (m), area (ha) and number of OFEs of hillslopes
+    from the geometry index of their watershed. Hillslope geometry is the same
+    in every climate model/scenario of a watershed, so each hillslope's .loss
+    and .man files are read once (from the first output directory that needs
+    it) and saved to the index. Delete the index file if the watershed is
+    delineated again.
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    hillslopes = list of hillslope IDs (e.g. H12)
+
+    Returns a dataframe with width, area and ofes columns indexed by
+    hillslope ID
+    '''
+
+    import os
+
+    index_file = geometry_index_file(wepp_out_dir)
+
+    if os.path.isfile(index_file):
+        geometry = pd.read_csv(index_file, index_col = 'hill', dtype = {'hill':str})
+    else:
+        geometry = pd.DataFrame({'width':[], 'area':[], 'ofes':[]}, index = pd.Index([], name = 'hill', dtype = str))
+
+    missing = [hill for hill in hillslopes if hill not in geometry.index]
+
+    if len(missing) > 0:
+        rows = []
+
+        for hill in missing:
+            width, area = read_loss_geometry(str(wepp_out_dir + hill + '.loss.dat'))
+
+            #hillslope H{n} is run from p{n}.man
+            ofes = read_man_ofes(os.path.join(os.path.dirname(os.path.normpath(wepp_out_dir)), 'runs',\
+                                              'p{}.man'.format(hill[1:])))
+
+            rows.append((hill, width, area, ofes))
+
+        new = pd.DataFrame(rows, columns = ['hill', 'width', 'area', 'ofes']).set_index('hill')
+        geometry = pd.concat([geometry, new])
+        geometry['ofes'] = geometry['ofes'].astype(int)
+
+        from wepp_cache import temp_path
+
+        #cube workers of the same watershed may write the index at the same time
+        tmp_file = temp_path(index_file)
+
+        geometry.sort_index().to_csv(tmp_file)
+        os.replace(tmp_file, index_file)
+
+    return geometry
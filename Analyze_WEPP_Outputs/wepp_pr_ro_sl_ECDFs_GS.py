@@ -5,13 +5,88 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.ticker import ScalarFormatter
 from matplotlib.axis import Axis 
-from prep_for_analysis import prep_data
+from wepp_ecdf import list_ecdf_curve, ecdf_curve
+from wepp_render import render_figures
+from wepp_cache import record_keys
+from prep_for_analysis import prep_data, prep_ecdfs
 
+#variables with an ECDF subplot for each climate model set
+#(hillslope soil loss, hillslope runoff, event precip depth, event precip intensity)
+ECDF_VARS = ['SL', 'RO', 'PR', 'PRi']
 
-def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_end, freq_total_input,x_limits):
+
+def prep_ecdf_curves(wshed, mod_sets, month_start, month_end, freq_total_input, x_limits, store_dir = None, memory_budget = None):
     '''
-    Analyze wepp soil loss and runoff trends as well as
-    cligen precipitation trends using ECDFs 
+    Prepares the ECDF curves of hillslope soil loss and runoff and of event
+    precipitation depth and intensity for every climate model (see
+    wepp_ecdf.py)
+
+    wshed = watershed ID
+
+    mod_sets = list of future and observed climate model IDs
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection
+
+    freq_total_input = 'Frequency' or 'Total Sum' ECDFs
+
+    x_limits = x-axis limit for variable/watershed combination (ECDF grid range)
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    memory_budget = memory budget (MB) of one chunk of events (None = load
+    all events of a scenario at once, see wepp_chunks.py)
+
+    Returns a dataframe of curve points with mod, var (SL, RO, PR, PRi), x
+    and y columns
+    '''
+
+    curve_dfs = []
+
+    for mod in dict.fromkeys([mod for mod_set in mod_sets for mod in mod_set]):
+
+        if mod == 'Obs':
+            #define wepp output directory where data is stored
+            wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
+            wepp_cli_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/runs/'.format(wshed,mod))
+
+        else:
+            #define wepp output directory where data is stored
+            wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_0/wepp/output/'.format(wshed,mod))
+            wepp_cli_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_0/wepp/runs/'.format(wshed,mod))
+
+        if memory_budget is not None:
+            #add events to the ECDFs one chunk at a time
+            ecdfs = prep_ecdfs(wepp_cli_dir, wepp_out_dir, mod, month_start, month_end, x_limits, memory_budget, store_dir = store_dir)
+
+            for var in ECDF_VARS:
+                x, y = ecdf_curve(ecdfs[var], freq_total_input)
+
+                curve_dfs.append(pd.DataFrame({'mod':mod, 'var':var, 'x':x, 'y':y}))
+
+            continue
+
+        #run prep_data for months provided in function input
+        SL_lst, RO_lst, PR_lst, PRi_lst, PR, PRi, RO,SL, avg_pr, avg_pri, pr_25, avg_dur,avg_tmax,avg_tmin = prep_data(wepp_cli_dir,wepp_out_dir,mod,month_start,month_end, store_dir = store_dir)
+
+        for var, var_lst, xlimit in zip(ECDF_VARS, [SL_lst, RO_lst, PR_lst, PRi_lst], x_limits):
+
+            #add values to a streaming ECDF on a 2000 bin grid up to the x-axis
+            #limit and keep its downsampled curve (each point is exact in y and
+            #at most xlimit / 2000 off in x)
+            x, y = list_ecdf_curve(var_lst, xlimit, freq_total_input)
+
+            curve_dfs.append(pd.DataFrame({'mod':mod, 'var':var, 'x':x, 'y':y}))
+
+    return pd.concat(curve_dfs, ignore_index = True)
+
+
+def plot_ecdfs(wshed,wshed_name,mod_sets,mod_names,freq_total_input,x_limits,curves,fig_dir):
+    '''
+    Plots ECDFs of every climate model from prepped curves and saves the
+    figure as a .png file. Scatter layers are rasterized.
 
     wshed = watershed ID
 
@@ -26,9 +101,11 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_
 
     x_limits = x-axis limit for variable/watershed combination
 
-    month_start = integer value of month at beginning of season selection
+    curves = prep_ecdf_curves output
 
-    month_start = integer value of month at end of season selection
+    fig_dir = directory figures are saved to
+
+    Returns the path of the saved figure
     '''
 
 
@@ -68,54 +145,36 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_
 
         for mod,color,point_shape,line_lab in zip(mod_set,color_set,shape_set,lab_set):
 
-            if mod == 'Obs':
-                #define wepp output directory where data is stored
-                wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
-                wepp_cli_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/runs/'.format(wshed,mod))
-
-            else:
-                #define wepp output directory where data is stored
-                wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_0/wepp/output/'.format(wshed,mod))
-                wepp_cli_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_0/wepp/runs/'.format(wshed,mod))
-
-            #run prep_data for months provided in function input
-            SL_lst, RO_lst, PR_lst, PRi_lst, PR, PRi, RO,SL, avg_pr, avg_pri, pr_25, avg_dur,avg_tmax,avg_tmin = prep_data(wepp_cli_dir,wepp_out_dir,mod,month_start,month_end)
-
-            #set up values and labels for plotting ecdfs
-            var_lsts = [SL_lst, RO_lst, PR_lst, PRi_lst]
+            #set up labels for plotting ecdfs
             var_xlabs = ['Avg Total Soil Loss from Field (tons/ha)',\
                          'Avg Total Runoff from Field (mm)',\
                          'Precipitation Depths by Event (mm)',\
                          'Storm Intensities by Event (mm/hr)']
 
 
-            for subx,var_lst,xlab,xlimit in zip(subx_pair,var_lsts,var_xlabs,x_limits):
-
-                data = pd.Series(var_lst)
-
-                data = data.astype(float)
+            for subx,var,xlab,xlimit in zip(subx_pair,ECDF_VARS,var_xlabs,x_limits):
 
-                x = np.sort(data)
+                #get prepped ECDF curve of climate model and variable
+                curve = curves[(curves['mod'] == mod) & (curves['var'] == var)]
+                x = curve['x']
+                y = curve['y']
 
                 #if input for freq_total_input == freq, plot ecdf for event frequency
                 if freq_total_input == 'Frequency':
-                    n = x.size
-                    y = (np.arange(1, n+1) / n) * 100
                     ylab = 'ECDF = Cumulative Frequency (%)'
 
                 #if input for freq_total_input == Total Sum, plot ecdf for total (loss)/(mm)/(mm/hr)
                 if freq_total_input == 'Total Sum':
-                    y = (np.cumsum(x) / sum(x)) * 100
                     ylab = 'ECDF = Cumulative Total (%)'
 
-                subx.scatter(x, y, marker = point_shape, s=35, color = color, label = line_lab)
+                subx.scatter(x, y, marker = point_shape, s=35, color = color, label = line_lab, rasterized = True)
 
                 #set axis labels
                 subx.set_xlabel(xlab, fontsize = 25)
 
                 subx.set_ylabel(ylab, fontsize = 25)
 
-                if var_lst == SL_lst:
+                if var == 'SL':
                     subx.axvline(x=12.5, color='dimgrey')
                 
                 #increase size of tick labels
@@ -140,35 +199,107 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_
     
 
 
-    fig.savefig('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/ECDFs/{}_{}_ECDF.png'.format(wshed,freq_total_input), bbox_inches = "tight")
+    fig_file = str(fig_dir + '{}_{}_ECDF.png'.format(wshed,freq_total_input))
+
+    fig.savefig(fig_file, bbox_inches = "tight")
+
+    plt.close(fig)
+
+    return fig_file
+
+
+def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_end, freq_total_input,x_limits, store_dir = None, memory_budget = None,\
+                         fig_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/ECDFs/'):
+    '''
+    Analyze wepp soil loss and runoff trends as well as
+    cligen precipitation trends using ECDFs 
+
+    wshed = watershed ID
+
+    wshed_name = name of watershed
+
+    mod_sets = list of future and observed climate model IDs
+
+    mod_names = names of CMIP5 climate models
+
+    freq_total_input = string input to define whether frequency or total sum
+    ECDFs should be created
+
+    x_limits = x-axis limit for variable/watershed combination
+
+    month_start = integer value of month at beginning of season selection
+
+    month_start = integer value of month at end of season selection
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    memory_budget = memory budget (MB) of one chunk of events (None = load
+    all events of a scenario at once, see wepp_chunks.py)
+
+    fig_dir = directory figures are saved to
+    '''
+
+    curves = prep_ecdf_curves(wshed, mod_sets, month_start, month_end, freq_total_input, x_limits, store_dir, memory_budget)
+
+    return plot_ecdfs(wshed, wshed_name, mod_sets, mod_names, freq_total_input, x_limits, curves, fig_dir)
+
+
+#worker processes re-import this script on Windows, so figures are only
+#rendered from the main process
+if __name__ == '__main__':
+
+    #define watershed list
+    wshed_lst = ['DO1', 'GO1', 'ST1']
+
+    #define watershed names
+    wshed_names = ['Dodge', 'Goodhue', 'Stearns']
+
+    #define climate model IDs
+    mod_sets = [['Obs','L3_59','L3_99','L4_59','L4_99'],\
+                ['Obs','B3_59','B3_99','B4_59','B4_99']]
+
+    #define climate model names
+    mod_names = ['HadGEM2-CC',\
+                 'GFDL-ESM2G']
+
+    #set x-axis limit for each watershed and variable
+    DO1_limits = [50,60,150,60]
+    GO1_limits = [25,40,200,100]
+    ST1_limits = [15,50,100,80]
+
+    #get list of lists for x-axis limits
+    wshed_xlimits = [DO1_limits, GO1_limits, ST1_limits]
 
-#define watershed list
-wshed_lst = ['DO1', 'GO1', 'ST1']
 
-#define watershed names
-wshed_names = ['Dodge', 'Goodhue', 'Stearns']
+    #define directory of the parquet results store built by wepp_store.py
+    #(None = read the .ebe files of each scenario, set it to the store directory
+    #once wepp_store.py has built the store)
+    store_dir = None
 
-#define climate model IDs
-mod_sets = [['Obs','L3_59','L3_99','L4_59','L4_99'],\
-            ['Obs','B3_59','B3_99','B4_59','B4_99']]
+    #define memory budget (MB) of one chunk of events, so event data is
+    #processed one chunk at a time (None = load all events of a scenario at once)
+    memory_budget = 512
 
-#define climate model names
-mod_names = ['HadGEM2-CC',\
-             'GFDL-ESM2G']
+    #define directory figures are saved to
+    fig_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/ECDFs/'
 
-#set x-axis limit for each watershed and variable
-DO1_limits = [50,60,150,60]
-GO1_limits = [25,40,200,100]
-ST1_limits = [15,50,100,80]
+    #Example run using frequency ECDFs and baseline management for the entire growing season
+    #month_start and month_end can be switched to run for different seasons.
 
-#get list of lists for x-axis limits
-wshed_xlimits = [DO1_limits, GO1_limits, ST1_limits]
 
 
-#Example run using frequency ECDFs and baseline management for the entire growing season
-#month_start and month_end can be switched to run for different seasons.
+    #prep ECDF curves of every watershed, then render all figures in parallel
+    #(figures are identified by the cache keys of the prep results they show)
+    jobs = []
+    data_keys = []
 
+    for wshed, wshed_name, wshed_xlim in zip(wshed_lst, wshed_names, wshed_xlimits):
+        with record_keys() as keys:
+            curves = prep_ecdf_curves(wshed, mod_sets, 4, 11, 'Total Sum', wshed_xlim, store_dir, memory_budget)
 
+        jobs.append({'wshed':wshed, 'wshed_name':wshed_name, 'mod_sets':mod_sets, 'mod_names':mod_names,\
+                     'freq_total_input':'Total Sum', 'x_limits':wshed_xlim, 'curves':curves, 'fig_dir':fig_dir})
+        data_keys.append({'curves':keys})
 
-for wshed, wshed_name, wshed_xlim in zip(wshed_lst, wshed_names, wshed_xlimits):
-    analyze_wepp_outputs(wshed, wshed_name, mod_sets, mod_names, 4, 11, 'Total Sum', wshed_xlim)
\ No newline at end of file
+    render_figures(plot_ecdfs, jobs, data_keys = data_keys)
@@ -6,30 +6,82 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.ticker import ScalarFormatter
 from matplotlib.axis import Axis 
-from prep_for_analysis_scatter import prep_data
+from prep_for_analysis_scatter import prep_season_data
+from wepp_render import render_figures
+from wepp_cache import record_keys
 
 
-def analyze_wepp_outputs(wshed,wshed_name,mod_pair,mod_name,period_names):
+def prep_scatter_data(wshed, mod_pair, store_dir = None, memory_budget = None):
     '''
-    Analyze wepp soil loss and runoff trends as well as
-    cligen precipitation trends using scatterplots with 
-    event-by-event data
+    Prepares event-by-event soil loss, runoff, precip depth and precip
+    intensity of every season for each climate model (see prep_season_data)
+
+    wshed = watershed ID
+
+    mod_pair = list of future and observed climate model IDs
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    memory_budget = memory budget (MB) of one chunk of events (None = load
+    all events of a scenario at once, see wepp_chunks.py). Only bounds the
+    event reads: every runoff event is kept for the scatter plots
+
+    Returns a dataframe with mod, season, SL, RO, PR and PRi columns (one row
+    per runoff event)
+    '''
+
+    #use to loop through months used for selecting the months corresponding to each season
+    season_start_months = [4,6,9,4]
+    season_end_months = [5,8,11,11]
+    season_names = ['Spring','Summer', 'Fall', 'Growing Season']
+
+    #prep event data for every season with one read of each climate model's outputs
+    seasons = {season_name:(season_start, season_end) for season_start, season_end, season_name in\
+               zip(season_start_months, season_end_months, season_names)}
+
+    season_dfs = []
+
+    for mod in mod_pair:
+
+        #define wepp output directory where data is stored
+        wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
+        wepp_cli_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/runs/'.format(wshed,mod))
+
+        season_data = prep_season_data(wepp_cli_dir, wepp_out_dir, mod, seasons, store_dir, memory_budget)
+
+        for season_name, (SL, RO, PR, PRi) in season_data.items():
+            season_dfs.append(pd.DataFrame({'mod':mod, 'season':season_name, 'SL':SL, 'RO':RO, 'PR':PR, 'PRi':PRi}))
+
+    return pd.concat(season_dfs, ignore_index = True)
+
+
+def plot_scatter_figures(wshed,wshed_name,mod_pair,mod_name,period_names,scatter_data,fig_dir):
+    '''
+    Plots seasonal and growing season scatterplots of runoff event soil loss
+    and runoff vs precipitation depth and saves them as .png files. Scatter
+    layers are rasterized so figures with many events save quickly.
 
     wshed = watershed ID
 
+    wshed_name = name of watershed
+
     mod_pair = list of future and observed climate model IDs
 
     mod_name = name of CMIP5 climate model
 
     period_names = time periods (ex: 1965-2019)
+
+    scatter_data = prep_scatter_data output
+
+    fig_dir = directory figures are saved to
+
+    Returns the paths of the seasonal and growing season figures
     '''
 
 
     ####### GET SEASONAL FIGURES #########
 
-    #use to loop through months used for selecting the months corresponding to each season
-    season_start_months = [4,6,9,4]
-    season_end_months = [5,8,11,11]
     season_names = ['Spring','Summer', 'Fall', 'Growing Season']
 
     #Set up a subplot to hold seasonal data
@@ -43,7 +95,7 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_pair,mod_name,period_names):
 
     color_lst = ['skyblue', 'dodgerblue', 'darkblue']
 
-    for season_start,season_end,season_name in zip(season_start_months, season_end_months, season_names):
+    for season_name in season_names:
 
         #chose subplot x coordinate if loop is in a season, do not chose one if in growing season
         if season_name == 'Spring':
@@ -67,23 +119,19 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_pair,mod_name,period_names):
 
         for mod,period,color in zip(mod_pair,period_names,color_lst):
 
-            #define wepp output directory where data is stored
-            wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
-            wepp_cli_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/runs/'.format(wshed,mod))
-
-            #run prep_data
-            SL, RO, PR, PRi = prep_data(wepp_cli_dir,wepp_out_dir,mod,season_start,season_end)
+            #get prepped data for season
+            season_df = scatter_data[(scatter_data['mod'] == mod) & (scatter_data['season'] == season_name)]
 
 
             #set up values and labels for plotting
             var_ylabs = ['Soil Loss Events (tons/ha)',\
                         'Runoff Events (mm)']
 
-            yvars = [SL,RO]
+            yvars = [season_df['SL'],season_df['RO']]
 
             for suby,yvar,var_ylab in zip(suby_vals,yvars,var_ylabs):
 
-                x = PR
+                x = season_df['PR']
                 y = yvar
 
                 if dimensions == '2D':
@@ -92,7 +140,7 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_pair,mod_name,period_names):
                 if dimensions == '1D':
                     subplt = axes[suby]
 
-                subplt.scatter(x,y,color = color, s=11, label = period, alpha = 0.7)
+                subplt.scatter(x,y,color = color, s=11, label = period, alpha = 0.7, rasterized = True)
 
                 #set axis labels
                 subplt.set_ylabel(var_ylab, fontsize = 20)
@@ -124,24 +172,89 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_pair,mod_name,period_names):
     fig_gs.suptitle('WEPP Hillslope Events vs Precipitation Depths during Growing Season\n {} County HUC12 Watershed with Baseline and Future Climates ({})'.format(wshed_name,mod_name),\
                 fontsize = 25)
 
-    fig_s.savefig('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/{} {} seasons.png'.format(wshed,mod_name))
-    fig_gs.savefig('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/{} {} GS.png'.format(wshed,mod_name))
+    fig_files = [str(fig_dir + '{} {} seasons.png'.format(wshed,mod_name)),\
+                 str(fig_dir + '{} {} GS.png'.format(wshed,mod_name))]
+
+    fig_s.savefig(fig_files[0])
+    fig_gs.savefig(fig_files[1])
+
+    plt.close(fig_s)
+    plt.close(fig_gs)
+
+    return fig_files
+
+
+def analyze_wepp_outputs(wshed,wshed_name,mod_pair,mod_name,period_names, store_dir = None, memory_budget = None,\
+                         fig_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/'):
+    '''
+    Analyze wepp soil loss and runoff trends as well as
+    cligen precipitation trends using scatterplots with 
+    event-by-event data
+
+    wshed = watershed ID
+
+    mod_pair = list of future and observed climate model IDs
+
+    mod_name = name of CMIP5 climate model
+
+    period_names = time periods (ex: 1965-2019)
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    memory_budget = memory budget (MB) of one chunk of events (None = load
+    all events of a scenario at once, see wepp_chunks.py). Only bounds the
+    event reads: every runoff event is kept for the scatter plots
+
+    fig_dir = directory figures are saved to
+    '''
+
+    scatter_data = prep_scatter_data(wshed, mod_pair, store_dir, memory_budget)
 
+    return plot_scatter_figures(wshed, wshed_name, mod_pair, mod_name, period_names, scatter_data, fig_dir)
 
 
-lst_of_mods = [['Obs','B3_59','B3_99'],\
-                ['Obs','B4_59','B4_99'],\
-                ['Obs','L3_59','L3_99'],\
-                ['Obs','L4_59','L4_99']]
+#worker processes re-import this script on Windows, so figures are only
+#rendered from the main process
+if __name__ == '__main__':
 
-mod_names = ['gfdl RCP 4.5', 'gfdl RCP 6.0',\
-             'Hadgem2 RCP 4.5', 'Hadgem2 RCP 8.5']
+    lst_of_mods = [['Obs','B3_59','B3_99'],\
+                    ['Obs','B4_59','B4_99'],\
+                    ['Obs','L3_59','L3_99'],\
+                    ['Obs','L4_59','L4_99']]
 
-period_names = ['1965-2019', '2020-2059','2060-2099'] 
+    mod_names = ['gfdl RCP 4.5', 'gfdl RCP 6.0',\
+                 'Hadgem2 RCP 4.5', 'Hadgem2 RCP 8.5']
 
-#Example for Goodhue watershed 
+    period_names = ['1965-2019', '2020-2059','2060-2099'] 
 
-for mod_set, mod_name in zip(lst_of_mods, mod_names):
-    analyze_wepp_outputs('GO1', 'Goodhue', mod_set, mod_name, period_names)
+    #define directory of the parquet results store built by wepp_store.py
+    #(None = read the .ebe files of each scenario, set it to the store directory
+    #once wepp_store.py has built the store)
+    store_dir = None
 
-#%%
\ No newline at end of file
+    #define memory budget (MB) of one chunk of events, so event data is
+    #processed one chunk at a time (None = load all events of a scenario at once)
+    memory_budget = 512
+
+    #define directory figures are saved to
+    fig_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/'
+
+    #Example for Goodhue watershed 
+
+    #prep data of every climate model set, then render all figures in parallel
+    #(figures are identified by the cache keys of the prep results they show)
+    jobs = []
+    data_keys = []
+
+    for mod_set, mod_name in zip(lst_of_mods, mod_names):
+        with record_keys() as keys:
+            scatter_data = prep_scatter_data('GO1', mod_set, store_dir, memory_budget)
+
+        jobs.append({'wshed':'GO1', 'wshed_name':'Goodhue', 'mod_pair':mod_set, 'mod_name':mod_name,\
+                     'period_names':period_names, 'scatter_data':scatter_data, 'fig_dir':fig_dir})
+        data_keys.append({'scatter_data':keys})
+
+    render_figures(plot_scatter_figures, jobs, data_keys = data_keys)
+
+#%%
@@ -0,0 +1,164 @@
+import os
+
+
+def use_agg():
+    '''
+    Selects matplotlib's non-interactive Agg backend (worker process
+    initializer, figures are only saved to file)
+    '''
+
+    import matplotlib
+
+    matplotlib.use('Agg')
+
+
+def job_key(render_func, job, data_keys = None):
+    '''
+    Builds the key of a render job from the source code of render_func's
+    module, wepp_render and the helper modules of the prep cache (see
+    wepp_cache.code_files) and the job keyword arguments. Arguments in
+    data_keys are identified by their data key instead of their data, other
+    arguments are pickled.
+
+    data_keys = dictionary of data keys keyed by job argument name, e.g. the
+    prep cache keys the argument was computed from (see
+    wepp_cache.record_keys). None = pickle every argument
+    '''
+
+    import hashlib
+    import pickle
+    from wepp_cache import code_files
+
+    if data_keys is None:
+        data_keys = {}
+
+    sha = hashlib.sha256()
+
+    for path in code_files(render_func) + [os.path.abspath(__file__)]:
+        if path is None:
+            sha.update(b'None')
+
+        else:
+            with open(path, 'rb') as code:
+                sha.update(code.read())
+
+    sha.update(pickle.dumps(sorted((name, value) for name, value in job.items() if name not in data_keys), protocol = 4))
+    sha.update(repr(sorted(data_keys.items())).encode())
+
+    return sha.hexdigest()
+
+
+def output_files(outputs):
+    '''
+    Returns the list of file paths in a render_func output (a path or a
+    list/dictionary of paths)
+    '''
+
+    if isinstance(outputs, str):
+        return [outputs]
+
+    if isinstance(outputs, dict):
+        outputs = list(outputs.values())
+
+    return [path for output in outputs for path in output_files(output)]
+
+
+def render_manifest_file():
+    '''
+    Returns the path of the manifest of rendered figures, kept with the
+    cached prep results (see wepp_cache.py)
+    '''
+
+    from wepp_cache import CACHE_DIR
+
+    return os.path.join(CACHE_DIR, 'render_manifest.json')
+
+
+def render_figures(render_func, jobs, max_workers = None, skip_unchanged = True, data_keys = None):
+    '''
+    Renders figures from precomputed results in parallel worker processes
+    using the Agg backend, one job per worker at a time, so a full refresh of
+    the figures of every watershed/season/climate model scales with cores.
+    Data prep stays in the calling process (or its own sweep), workers only
+    draw and save.
+
+    Jobs whose data and code are unchanged since they were last rendered,
+    and whose figures still exist, are skipped, so rerunning one scenario
+    only redraws the figures that show it (see job_key).
+
+    render_func = module level function that draws and saves one set of
+    figures from keyword arguments and returns the saved file path(s). It
+    should close its figures before returning.
+
+    jobs = list of dictionaries of render_func keyword arguments
+
+    max_workers = maximum number of worker processes. Uses all cores (up to
+    the number of jobs) when None
+
+    skip_unchanged = skip jobs that are already rendered (always False when
+    the environment variable WEPP_CACHE is 0)
+
+    data_keys = list of dictionaries of data keys keyed by job argument name,
+    one per job (see job_key). Precomputed data passed with a data key is not
+    hashed. None = hash every argument
+
+    Returns a list of render_func outputs in job order
+    '''
+
+    import json
+    from concurrent.futures import ProcessPoolExecutor
+
+    if len(jobs) == 0:
+        return []
+
+    if os.environ.get('WEPP_CACHE', '1') == '0':
+        skip_unchanged = False
+
+    manifest_file = render_manifest_file()
+    manifest = {}
+
+    if skip_unchanged and os.path.isfile(manifest_file):
+        with open(manifest_file, 'r') as manifest_data:
+            manifest = json.load(manifest_data)
+
+    if data_keys is None:
+        data_keys = [None] * len(jobs)
+
+    keys = [job_key(render_func, job, job_data_keys) for job, job_data_keys in zip(jobs, data_keys)]
+    outputs = [None] * len(jobs)
+
+    todo = []
+
+    for n, key in enumerate(keys):
+        if skip_unchanged and key in manifest and all(os.path.isfile(path) for path in output_files(manifest[key])):
+            outputs[n] = manifest[key]
+
+        else:
+            todo.append(n)
+
+    if len(todo) == 0:
+        return outputs
+
+    if max_workers is None:
+        max_workers = min(os.cpu_count(), len(todo))
+
+    with ProcessPoolExecutor(max_workers = max_workers, initializer = use_agg) as pool:
+        futures = {n:pool.submit(render_func, **jobs[n]) for n in todo}
+
+        for n, future in futures.items():
+            outputs[n] = future.result()
+
+    if skip_unchanged:
+        from wepp_cache import CACHE_DIR
+
+        for n in todo:
+            manifest[keys[n]] = outputs[n]
+
+        os.makedirs(CACHE_DIR, exist_ok = True)
+
+        with open(str(manifest_file + '.tmp'), 'w') as manifest_data:
+            json.dump(manifest, manifest_data, indent = 1, sort_keys = True)
+
+        os.replace(str(manifest_file + '.tmp'), manifest_file)
+
+    return outputs
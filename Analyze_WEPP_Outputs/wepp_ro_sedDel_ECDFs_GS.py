@@ -5,13 +5,87 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.ticker import ScalarFormatter
 from matplotlib.axis import Axis 
+from wepp_ecdf import list_ecdf_curve
+from wepp_render import render_figures
+from wepp_cache import record_keys
 from prep_for_analysis_SedDel import prep_data
 
+#variables with an ECDF subplot for each climate model set (hillslope sediment
+#delivery and runoff, with perennials and with no perennials in future)
+ECDF_VARS = ['SD', 'SD_noPer', 'RO', 'RO_noPer']
 
-def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_end, SDR, TMDL_SD, TMDL_RO, freq_total_input,x_limits):
+
+def prep_ecdf_curves(wshed, mod_sets, month_start, month_end, SDR, TMDL_SD, TMDL_RO, freq_total_input, x_limits, store_dir = None,\
+                     memory_budget = None):
     '''
-    Analyze wepp soil loss and runoff trends as well as
-    cligen precipitation trends using ECDFs 
+    Prepares the ECDF curves of hillslope sediment delivery and runoff with
+    and without perennials for every climate model (see wepp_ecdf.py)
+
+    wshed = watershed ID
+
+    mod_sets = list of future and observed climate model IDs
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection
+
+    SDR = watershed sediment delivery ratio
+
+    TMDL_SD = TMDL goal for hillslope sediment delivery (t/ha)
+
+    TMDL_RO = TMDL goal for hillslope runoff (mm)
+
+    freq_total_input = 'Frequency' or 'Total Sum' ECDFs
+
+    x_limits = x-axis limit for variable/watershed combination (ECDF grid range)
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    memory_budget = memory budget (MB) of one chunk of events (None = load
+    all events of a scenario at once, see wepp_chunks.py)
+
+    Returns a dataframe of curve points with mod, var (SD, SD_noPer, RO,
+    RO_noPer), x and y columns
+    '''
+
+    curve_dfs = []
+
+    for mod in dict.fromkeys([mod for mod_set in mod_sets for mod in mod_set]):
+
+        if mod == 'Obs':
+            #define wepp output directory where data is stored for baseline and no perennial scens
+            wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
+            wepp_out_noPer_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
+
+
+        else:
+            #define wepp output directory where data is stored for baseline and no perennial scens
+            wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
+            wepp_out_noPer_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_0/wepp/output/'.format(wshed,mod))
+
+        #run prep_data for months provided in function input
+        SD_lst, RO_lst, SL, RO, TMDL_SL_percent, TMDL_RO_percent = prep_data(wepp_out_dir,mod,month_start,month_end,SDR, TMDL_SD, TMDL_RO, store_dir = store_dir, memory_budget = memory_budget)
+        SD_lst_noPer, RO_lst_noPer, SL_noPer, RO_noPer, TMDL_SL_percent_noPer, TMDL_RO_percent_noPer = prep_data(wepp_out_noPer_dir,mod,month_start,month_end,SDR, TMDL_SD, TMDL_RO, store_dir = store_dir, memory_budget = memory_budget)
+
+        var_lsts = [SD_lst, SD_lst_noPer, RO_lst, RO_lst_noPer]
+
+        for var, var_lst, xlimit in zip(ECDF_VARS, var_lsts, x_limits):
+
+            #add values to a streaming ECDF on a 2000 bin grid up to the x-axis
+            #limit and keep its downsampled curve (each point is exact in y and
+            #at most xlimit / 2000 off in x)
+            x, y = list_ecdf_curve(var_lst, xlimit, freq_total_input)
+
+            curve_dfs.append(pd.DataFrame({'mod':mod, 'var':var, 'x':x, 'y':y}))
+
+    return pd.concat(curve_dfs, ignore_index = True)
+
+
+def plot_ecdfs(wshed,wshed_name,mod_sets,mod_names,TMDL_SD,TMDL_RO,freq_total_input,x_limits,curves,fig_dir):
+    '''
+    Plots ECDFs of every climate model from prepped curves and saves the
+    figure as a .png file. Scatter layers are rasterized.
 
     wshed = watershed ID
 
@@ -21,14 +95,20 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_
 
     mod_names = names of CMIP5 climate models
 
+    TMDL_SD = TMDL goal for hillslope sediment delivery (t/ha)
+
+    TMDL_RO = TMDL goal for hillslope runoff (mm)
+
     freq_total_input = string input to define whether frequency or total sum
     ECDFs should be created
 
     x_limits = x-axis limit for variable/watershed combination
 
-    month_start = integer value of month at beginning of season selection
+    curves = prep_ecdf_curves output
 
-    month_start = integer value of month at end of season selection
+    fig_dir = directory figures are saved to
+
+    Returns the path of the saved figure
     '''
 
 
@@ -69,49 +149,29 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_
 
         for mod,color,point_shape,line_lab in zip(mod_set,color_set,shape_set,lab_set):
 
-            if mod == 'Obs':
-                #define wepp output directory where data is stored for baseline and no perennial scens
-                wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
-                wepp_out_noPer_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
-
-
-            else:
-                #define wepp output directory where data is stored for baseline and no perennial scens
-                wepp_out_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_B/wepp/output/'.format(wshed,mod))
-                wepp_out_noPer_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/Per_0/wepp/output/'.format(wshed,mod))
-
-            #run prep_data for months provided in function input
-            SD_lst, RO_lst, SL, RO, TMDL_SL_percent, TMDL_RO_percent = prep_data(wepp_out_dir,mod,month_start,month_end,SDR, TMDL_SD, TMDL_RO)
-            SD_lst_noPer, RO_lst_noPer, SL_noPer, RO_noPer, TMDL_SL_percent_noPer, TMDL_RO_percent_noPer = prep_data(wepp_out_noPer_dir,mod,month_start,month_end,SDR, TMDL_SD, TMDL_RO)
-
-            #set up values and labels for plotting ecdfs
-            var_lsts = [SD_lst, SD_lst_noPer, RO_lst, RO_lst_noPer]
+            #set up labels for plotting ecdfs
             var_xlabs = ['Hillslope Sediment Delivery (t/ha)',\
                          'Hillslope Sediment Delivery (t/ha)',\
                          'Hillslope Runoff (mm)',\
                          'Hillslope Runoff (mm)']
 
 
-            for subx,var_lst,xlab,xlimit in zip(subx_pair,var_lsts,var_xlabs,x_limits):
+            for subx,var,xlab,xlimit in zip(subx_pair,ECDF_VARS,var_xlabs,x_limits):
 
-                data = pd.Series(var_lst)
-
-                data = data.astype(float)
-
-                x = np.sort(data)
+                #get prepped ECDF curve of climate model and variable
+                curve = curves[(curves['mod'] == mod) & (curves['var'] == var)]
+                x = curve['x']
+                y = curve['y']
 
                 #if input for freq_total_input == freq, plot ecdf for event frequency
                 if freq_total_input == 'Frequency':
-                    n = x.size
-                    y = (np.arange(1, n+1) / n) * 100
                     ylab = 'ECDF = Cumulative Frequency (%)'
 
                 #if input for freq_total_input == Total Sum, plot ecdf for total (t/ha)/(mm)/(mm/hr)
                 if freq_total_input == 'Total Sum':
-                    y = (np.cumsum(x) / sum(x)) * 100
                     ylab = 'ECDF = Cumulative Total (%)'
 
-                subx.scatter(x,y, marker = point_shape, s=35, color = color, label = line_lab)
+                subx.scatter(x,y, marker = point_shape, s=35, color = color, label = line_lab, rasterized = True)
 
                 #set axis labels
                 subx.set_xlabel(xlab, fontsize = 25)
@@ -119,20 +179,20 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_
                 subx.set_ylabel(ylab, fontsize = 25)
 
                 #add in line showing TMDL goal
-                if var_lst == SD_lst or var_lst == SD_lst_noPer:
+                if var == 'SD' or var == 'SD_noPer':
                     subx.axvline(x=TMDL_SD, color='black',linewidth = 2)
 
-                if var_lst == RO_lst or var_lst == RO_lst_noPer:
+                if var == 'RO' or var == 'RO_noPer':
                     subx.axvline(x=TMDL_RO, color = 'black',linewidth = 2)
                 
                 #increase size of tick labels
                 subx.tick_params(labelsize = 20)
 
                 #add 'No Perennials in Future' to subplot title when var_lst has datasets from no perennial scenario
-                if var_lst == SD_lst_noPer or var_lst == RO_lst_noPer:
+                if var == 'SD_noPer' or var == 'RO_noPer':
                     subx.set_title(f'{mod_name}\nNo Perennials in Future', fontsize = 27)
 
-                if var_lst == SD_lst or var_lst == RO_lst:
+                if var == 'SD' or var == 'RO':
                     subx.set_title(f'{mod_name}\nPerennials Included', fontsize = 27)
 
                 subx.set_xlim(0,xlimit)
@@ -156,44 +216,117 @@ def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_
     
 
 
-    fig.savefig('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/ECDFs/{}_{}_ECDF.png'.format(wshed,freq_total_input), bbox_inches = "tight")
+    fig_file = str(fig_dir + '{}_{}_ECDF.png'.format(wshed,freq_total_input))
+
+    fig.savefig(fig_file, bbox_inches = "tight")
+
+    plt.close(fig)
+
+    return fig_file
+
+
+def analyze_wepp_outputs(wshed,wshed_name,mod_sets,mod_names,month_start, month_end, SDR, TMDL_SD, TMDL_RO, freq_total_input,x_limits, store_dir = None, memory_budget = None,\
+                         fig_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/ECDFs/'):
+    '''
+    Analyze wepp soil loss and runoff trends as well as
+    cligen precipitation trends using ECDFs 
+
+    wshed = watershed ID
+
+    wshed_name = name of watershed
+
+    mod_sets = list of future and observed climate model IDs
+
+    mod_names = names of CMIP5 climate models
+
+    freq_total_input = string input to define whether frequency or total sum
+    ECDFs should be created
+
+    x_limits = x-axis limit for variable/watershed combination
+
+    month_start = integer value of month at beginning of season selection
+
+    month_start = integer value of month at end of season selection
+
+    store_dir = directory of the parquet results store built by wepp_store.py
+    (None = read the .ebe files)
+
+    memory_budget = memory budget (MB) of one chunk of events (None = load
+    all events of a scenario at once, see wepp_chunks.py)
+
+    fig_dir = directory figures are saved to
+    '''
+
+    curves = prep_ecdf_curves(wshed, mod_sets, month_start, month_end, SDR, TMDL_SD, TMDL_RO, freq_total_input, x_limits, store_dir, memory_budget)
+
+    return plot_ecdfs(wshed, wshed_name, mod_sets, mod_names, TMDL_SD, TMDL_RO, freq_total_input, x_limits, curves, fig_dir)
+
+
+#worker processes re-import this script on Windows, so figures are only
+#rendered from the main process
+if __name__ == '__main__':
+
+    #define watershed list
+    wshed_lst = ['DO1', 'GO1', 'ST1']
+
+    #define watershed names
+    wshed_names = ['Dodge', 'Goodhue', 'Stearns']
+
+    #define climate model IDs
+    mod_sets = [['Obs','L3_59','L3_99','L4_59','L4_99'],\
+                ['Obs','B3_59','B3_99','B4_59','B4_99']]
+
+    #define climate model names
+    mod_names = ['HadGEM2-CC',\
+                 'GFDL-ESM2G']
+
+    #set x-axis limit for each watershed and variable
+    DO1_limits = [4,4,60,60]
+    GO1_limits = [2.5,2.5,40,40]
+    ST1_limits = [0.6,0.6,50,50]
+
+    #get list of lists for x-axis limits
+    wshed_xlimits = [DO1_limits, GO1_limits, ST1_limits]
 
-#define watershed list
-wshed_lst = ['DO1', 'GO1', 'ST1']
+    wshed_SDRs = [0.0645, 0.0643, 0.0296]
 
-#define watershed names
-wshed_names = ['Dodge', 'Goodhue', 'Stearns']
+    wshed_TMDL_ROs = [15.8, 10.7, 13.8]
 
-#define climate model IDs
-mod_sets = [['Obs','L3_59','L3_99','L4_59','L4_99'],\
-            ['Obs','B3_59','B3_99','B4_59','B4_99']]
+    wshed_TMDL_SDs = [0.129, 0.131, 0.013]
 
-#define climate model names
-mod_names = ['HadGEM2-CC',\
-             'GFDL-ESM2G']
 
-#set x-axis limit for each watershed and variable
-DO1_limits = [4,4,60,60]
-GO1_limits = [2.5,2.5,40,40]
-ST1_limits = [0.6,0.6,50,50]
+    #define directory of the parquet results store built by wepp_store.py
+    #(None = read the .ebe files of each scenario, set it to the store directory
+    #once wepp_store.py has built the store)
+    store_dir = None
 
-#get list of lists for x-axis limits
-wshed_xlimits = [DO1_limits, GO1_limits, ST1_limits]
+    #define memory budget (MB) of one chunk of events, so event data is
+    #processed one chunk at a time (None = load all events of a scenario at once)
+    memory_budget = 512
 
-wshed_SDRs = [0.0645, 0.0643, 0.0296]
+    #define directory figures are saved to
+    fig_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/Future_NoChange/ECDFs/'
 
-wshed_TMDL_ROs = [15.8, 10.7, 13.8]
+    #Example run using frequency ECDFs and baseline management for the entire growing season
+    #month_start and month_end can be switched to run for different seasons.
 
-wshed_TMDL_SDs = [0.129, 0.131, 0.013]
+    #prep ECDF curves of every watershed, then render all figures in parallel
+    #(figures are identified by the cache keys of the prep results they show)
+    jobs = []
+    data_keys = []
 
+    for wshed, wshed_name, SDR, TMDL_SD, TMDL_RO, wshed_xlim in zip(wshed_lst,\
+                                                                    wshed_names,\
+                                                                    wshed_SDRs,\
+                                                                    wshed_TMDL_SDs,\
+                                                                    wshed_TMDL_ROs,\
+                                                                    wshed_xlimits):
+        with record_keys() as keys:
+            curves = prep_ecdf_curves(wshed, mod_sets, 4, 11, SDR, TMDL_SD, TMDL_RO, 'Frequency', wshed_xlim, store_dir, memory_budget)
 
-#Example run using frequency ECDFs and baseline management for the entire growing season
-#month_start and month_end can be switched to run for different seasons.
+        jobs.append({'wshed':wshed, 'wshed_name':wshed_name, 'mod_sets':mod_sets, 'mod_names':mod_names,\
+                     'TMDL_SD':TMDL_SD, 'TMDL_RO':TMDL_RO, 'freq_total_input':'Frequency', 'x_limits':wshed_xlim,\
+                     'curves':curves, 'fig_dir':fig_dir})
+        data_keys.append({'curves':keys})
 
-for wshed, wshed_name, SDR, TMDL_SD, TMDL_RO, wshed_xlim in zip(wshed_lst,\
-                                                                wshed_names,\
-                                                                wshed_SDRs,\
-                                                                wshed_TMDL_SDs,\
-                                                                wshed_TMDL_ROs,\
-                                                                wshed_xlimits):
-    analyze_wepp_outputs(wshed, wshed_name, mod_sets, mod_names, 4, 11, SDR, TMDL_SD, TMDL_RO, 'Frequency', wshed_xlim)
\ No newline at end of file
+    render_figures(plot_ecdfs, jobs, data_keys = data_keys)
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+#seasons used by the analysis scripts as (month_start, month_end)
+SEASONS = {'Spring':(4, 5),\
+           'Summer':(6, 8),\
+           'Fall':(9, 11),\
+           'Growing Season':(4, 11)}
+
+#average annual totals computed for every hillslope and season
+TOTAL_VARS = ['soil_loss', 'runoff', 'runoff_rain', 'delivery']
+
+
+def season_months(month_start, month_end):
+    '''
+    Returns the list of months in a season. Seasons with month_start after
+    month_end wrap through December (e.g. 12, 2 = Dec, Jan, Feb).
+    '''
+
+    if month_start <= month_end:
+        return list(range(month_start, month_end + 1))
+
+    return list(range(month_start, 13)) + list(range(1, month_end + 1))
+
+
+def season_matrix(seasons):
+    '''
+    Builds a 12 x n_seasons matrix with a 1 where a month (row) is in a
+    season (column), so monthly totals of every season are summed with one
+    matrix product. Seasons may overlap.
+
+    seasons = dictionary of (month_start, month_end) keyed by season name
+    '''
+
+    matrix = np.zeros((12, len(seasons)))
+
+    for n, (month_start, month_end) in enumerate(seasons.values()):
+        matrix[np.array(season_months(month_start, month_end)) - 1, n] = 1
+
+    return matrix
+
+
+def season_events(events, seasons = SEASONS):
+    '''
+    Selects the events of every season with one lookup of each event's month
+    in the month x season matrix (see season_matrix), so seasons may overlap
+    or wrap through December like in season_totals
+
+    events = event dataframe with a Month column
+
+    seasons = dictionary of (month_start, month_end) keyed by season name
+
+    Returns a dictionary of boolean event masks keyed by season name
+    '''
+
+    in_season = season_matrix(seasons)[events['Month'].to_numpy().astype(int) - 1] > 0
+
+    return {season_name:in_season[:, n] for n, season_name in enumerate(seasons)}
+
+
+def season_totals(events, hillslopes, geometry, years, seasons = SEASONS, SDR = None):
+    '''
+    Computes average annual soil loss (t/ha), runoff (mm), runoff without
+    snowmelt events (mm, events with precip > runoff) and SDR-scaled sediment
+    delivery (t/ha) of every hillslope for every season in one pass over the
+    events. Events are summed by hillslope and month, then monthly sums are
+    added up for each season.
+
+    Soil loss and delivery are NaN for hillslopes with zero area. Watershed
+    totals are averages over all hillslopes, with zero area hillslopes
+    counted as in prep_data.
+
+    events = event dataframe with a hill column (see wepp_store.load_events)
+
+    hillslopes = list of all hillslope IDs in the watershed/scenario
+
+    geometry = hillslope geometry index (see wepp_outputs.load_geometry_index)
+
+    years = number of years in climate period
+
+    seasons = dictionary of (month_start, month_end) keyed by season name
+
+    SDR = watershed sediment delivery ratio (delivery is NaN when None)
+
+    Returns two dataframes:
+    1.) hillslope totals with season and hill columns
+    2.) watershed totals indexed by season
+    '''
+
+    n_hills = len(hillslopes)
+
+    hill_idx = pd.Index(hillslopes).get_indexer(events['hill'])
+
+    if (hill_idx < 0).any():
+        raise ValueError('events include hillslopes that are not in hillslopes')
+
+    #flat hillslope x month bin of every event
+    bins = hill_idx * 12 + events['Month'].to_numpy().astype(int) - 1
+
+    precip = events['Precip'].to_numpy()
+    runoff = events['RO'].to_numpy()
+
+    monthly = {}
+    monthly['Sed-Del'] = np.bincount(bins, weights = events['Sed-Del'].to_numpy(), minlength = n_hills * 12)
+    monthly['runoff'] = np.bincount(bins, weights = runoff, minlength = n_hills * 12)
+    monthly['runoff_rain'] = np.bincount(bins, weights = np.where(precip > runoff, runoff, 0), minlength = n_hills * 12)
+
+    matrix = season_matrix(seasons)
+
+    seasonal = {var:(monthly[var].reshape(n_hills, 12) @ matrix) / years for var in monthly}
+
+    #multiply sed delivery value (in kg/m) by profile width to get kg,
+    #convert from kg to tons, divide by area to get soil loss in tons/ha
+    width = geometry['width'].reindex(hillslopes).to_numpy()
+    area = geometry['area'].reindex(hillslopes).to_numpy()
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        to_t_ha = np.where(area > 0, width * 0.00110231 / area, np.nan)
+
+    seasonal['soil_loss'] = seasonal.pop('Sed-Del') * to_t_ha[:, None]
+
+    if SDR is None:
+        seasonal['delivery'] = np.full((n_hills, len(seasons)), np.nan)
+    else:
+        seasonal['delivery'] = seasonal['soil_loss'] * SDR
+
+    hill_totals = pd.DataFrame({'season':np.repeat(list(seasons.keys()), n_hills),\
+                                'hill':np.tile(np.array(hillslopes, dtype = object), len(seasons))})
+
+    for var in TOTAL_VARS:
+        hill_totals[var] = seasonal[var].T.ravel()
+
+    #average over every hillslope in the watershed
+    wshed_totals = pd.DataFrame({var:np.nansum(seasonal[var], axis = 0) / n_hills for var in TOTAL_VARS},\
+                                index = pd.Index(list(seasons.keys()), name = 'season'))
+
+    if SDR is None:
+        wshed_totals['delivery'] = np.nan
+
+    return hill_totals, wshed_totals
@@ -0,0 +1,308 @@
+import os
+import numpy as np
+import pandas as pd
+from wepp_outputs import EBE_COLS, read_ebe, load_geometry_index
+
+#partition columns of the results store, in directory order
+PARTITION_COLS = ['wshed', 'mod', 'scen']
+
+
+def scenario_keys(wepp_out_dir):
+    '''
+    Gets the watershed, climate model and scenario IDs from a
+    {wshed}/New_Runs/{mod}/{scen}/wepp/output/ directory path
+
+    Returns wshed, mod, scen
+    '''
+
+    parts = os.path.normpath(wepp_out_dir).replace('\\', '/').split('/')
+
+    return parts[-6], parts[-4], parts[-3]
+
+
+def partition_file(store_dir, table, wshed, mod, scen):
+    '''
+    Returns the path of the parquet file that holds one watershed/climate
+    model/scenario partition of a store table (events or hillslopes)
+    '''
+
+    return os.path.join(store_dir, table, 'wshed={}'.format(wshed), 'mod={}'.format(mod),\
+                        'scen={}'.format(scen), 'part-0.parquet')
+
+
+def scenario_sources(wepp_out_dir, store_dir = None):
+    '''
+    Returns the source paths of the events of one watershed/climate
+    model/scenario: its WEPP output directory, or its partition files when
+    events are read from the results store (so re-ingesting one scenario
+    leaves the cached results of every other scenario valid)
+    '''
+
+    if store_dir is None:
+        return [wepp_out_dir]
+
+    wshed, mod, scen = scenario_keys(wepp_out_dir)
+
+    return [partition_file(store_dir, table, wshed, mod, scen) for table in ['events', 'hillslopes']]
+
+
+def event_sources(args):
+    '''
+    disk_cache dependency function (see wepp_cache.py) of prep functions
+    with wepp_out_dir, store_dir and (optionally) cli_dir arguments
+    '''
+
+    sources = scenario_sources(args['wepp_out_dir'], args.get('store_dir'))
+
+    if 'cli_dir' in args:
+        sources.append(args['cli_dir'])
+
+    return sources
+
+
+def write_partition(df, path):
+    '''
+    Writes a dataframe to a parquet partition file. The file is replaced in
+    one step so readers never see a half written partition.
+    '''
+
+    from wepp_cache import temp_path
+
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+
+    tmp_path = temp_path(path)
+
+    df.to_parquet(tmp_path, engine = 'pyarrow', index = False, row_group_size = 65536)
+    os.replace(tmp_path, path)
+
+
+def ingest_scenario(wepp_out_dir, store_dir):
+    '''
+    Converts every .ebe.dat file of one WEPP output directory into the events
+    table of the results store, and the list of hillslopes into the
+    hillslopes table (hillslopes without events keep their place in
+    watershed averages). Hillslopes missing from the watershed geometry index
+    are added to it.
+
+    Events are sorted by month so season queries skip whole row groups.
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    store_dir = directory of the results store
+
+    Returns the number of hillslopes ingested
+    '''
+
+    wshed, mod, scen = scenario_keys(wepp_out_dir)
+
+    hills, events = load_events(wepp_out_dir)
+    n_events = events.groupby('hill').size().reindex(hills, fill_value = 0).tolist()
+
+    events = events.sort_values(['Month', 'hill', 'Year', 'Day'], kind = 'stable')
+
+    write_partition(events, partition_file(store_dir, 'events', wshed, mod, scen))
+    write_partition(pd.DataFrame({'hill':hills, 'n_events':n_events}),\
+                    partition_file(store_dir, 'hillslopes', wshed, mod, scen))
+
+    #add new hillslopes to the watershed geometry index while their .loss files are at hand
+    load_geometry_index(wepp_out_dir, hills)
+
+    return len(hills)
+
+
+def ingest_outputs(prw_dir, store_dir, wshed_lst, mod_lst, scen_lst):
+    '''
+    Ingests the WEPP outputs of every watershed/climate model/scenario into
+    the results store. Partitions that are already in the store are
+    replaced.
+
+    prw_dir = directory holding all watershed project directories
+
+    store_dir = directory of the results store
+    '''
+
+    for wshed in wshed_lst:
+        for mod in mod_lst:
+            for scen in scen_lst:
+
+                wepp_out_dir = str(prw_dir + '{}/New_Runs/{}/{}/wepp/output/'.format(wshed, mod, scen))
+
+                n_hills = ingest_scenario(wepp_out_dir, store_dir)
+
+                print('{} {} {}: {} hillslopes ingested'.format(wshed, mod, scen, n_hills))
+
+
+def key_filters(wshed, mod, scen):
+    '''
+    Builds pyarrow filters for the partition columns. Each key may be one ID
+    or a list of IDs.
+    '''
+
+    filters = []
+
+    for col, key in zip(PARTITION_COLS, [wshed, mod, scen]):
+        if isinstance(key, (list, tuple)):
+            filters.append((col, 'in', list(key)))
+
+        else:
+            filters.append((col, '=', key))
+
+    return filters
+
+
+def read_events(store_dir, wshed, mod, scen, months = None, columns = None):
+    '''
+    Queries the events table of the results store. Partition keys and the
+    month range are pushed down to pyarrow, so only the matching partitions
+    and row groups are read.
+
+    store_dir = directory of the results store
+
+    wshed, mod, scen = watershed, climate model and scenario IDs (single IDs
+    or lists)
+
+    months = (month_start, month_end) to select a season (wrapping through
+    December when month_start > month_end, see wepp_seasons.season_months),
+    None for all months
+
+    columns = columns to read (default hill and all ebe columns)
+
+    Returns a dataframe of events with the partition columns as strings
+    '''
+
+    events_dir = os.path.join(store_dir, 'events')
+
+    if not os.path.isdir(events_dir):
+        raise FileNotFoundError('no results store at {} (build it with ingest_outputs)'.format(store_dir))
+
+    filters = key_filters(wshed, mod, scen)
+
+    if months is not None:
+        from wepp_seasons import season_months
+
+        filters += [('Month', 'in', season_months(*months))]
+
+    if columns is None:
+        columns = ['hill'] + EBE_COLS
+
+    events = pd.read_parquet(events_dir, engine = 'pyarrow', filters = filters,\
+                             columns = PARTITION_COLS + list(columns))
+
+    for col in PARTITION_COLS:
+        events[col] = events[col].astype(str)
+
+    return events
+
+
+def read_hillslopes(store_dir, wshed, mod, scen):
+    '''
+    Returns the sorted list of hillslope IDs of one watershed/climate
+    model/scenario in the results store
+    '''
+
+    path = partition_file(store_dir, 'hillslopes', wshed, mod, scen)
+
+    if not os.path.isfile(path):
+        raise FileNotFoundError('{} {} {} is not in the results store at {}'.format(wshed, mod, scen, store_dir))
+
+    return pd.read_parquet(path, engine = 'pyarrow', columns = ['hill'])['hill'].tolist()
+
+
+def load_events(wepp_out_dir, store_dir = None, months = None):
+    '''
+    Gets the events of every hillslope in a WEPP output directory as one
+    dataframe. Events come from the results store when store_dir is given,
+    otherwise from the .ebe.dat files.
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    store_dir = directory of the results store (None = read .ebe.dat files)
+
+    months = (month_start, month_end) to select a season (wrapping through
+    December when month_start > month_end, see wepp_seasons.season_months),
+    None for all months
+
+    Returns the sorted list of hillslope IDs and a dataframe with a hill
+    column and the columns in EBE_COLS, sorted by hillslope and date
+    '''
+
+    if store_dir is None:
+        hillslopes = sorted([x[:-len('.ebe.dat')] for x in os.listdir(wepp_out_dir) if x.endswith('.ebe.dat')])
+
+        tables = [read_ebe(str(wepp_out_dir + hill + '.ebe.dat')) for hill in hillslopes]
+
+        events = {'hill':np.repeat(np.array(hillslopes, dtype = object), [len(table['Day']) for table in tables])}
+
+        for col in EBE_COLS:
+            if len(tables) > 0:
+                events[col] = np.concatenate([table[col] for table in tables])
+            else:
+                events[col] = np.array([])
+
+        events = pd.DataFrame(events)
+
+        if months is not None:
+            from wepp_seasons import season_months
+
+            events = events[events['Month'].isin(season_months(*months))].reset_index(drop = True)
+
+        return hillslopes, events
+
+    wshed, mod, scen = scenario_keys(wepp_out_dir)
+
+    hillslopes = read_hillslopes(store_dir, wshed, mod, scen)
+
+    events = read_events(store_dir, wshed, mod, scen, months)
+    events = events.sort_values(['hill', 'Year', 'Month', 'Day'], kind = 'stable')[['hill'] + EBE_COLS]
+
+    return hillslopes, events.reset_index(drop = True)
+
+
+def load_season_events(wepp_out_dir, month_start, month_end, store_dir = None):
+    '''
+    Gets the events of every hillslope in a WEPP output directory for the
+    months month_start to month_end (see load_events).
+
+    wepp_out_dir = WEPP watershed/scenario/clim model output directory
+
+    month_start = integer value of month at beginning of season selection
+
+    month_end = integer value of month at end of season selection
+
+    store_dir = directory of the results store (None = read .ebe.dat files)
+
+    Returns the list of hillslope IDs and a dictionary of event dataframes
+    (columns in EBE_COLS) keyed by hillslope ID
+    '''
+
+    hillslopes, events = load_events(wepp_out_dir, store_dir, (month_start, month_end))
+
+    season_events = {hill:df[EBE_COLS].reset_index(drop = True) for hill, df in events.groupby('hill', sort = False)}
+
+    #hillslopes without events in the season
+    for hill in hillslopes:
+        if hill not in season_events:
+            season_events[hill] = events[EBE_COLS].iloc[0:0]
+
+    return hillslopes, season_events
+
+
+if __name__ == '__main__':
+
+    #define directory holding all watershed project directories
+    prw_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/'
+
+    #define directory of the results store read by the analysis scripts
+    store_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/wepp_results_store/'
+
+    wshed_lst = ['DO1', 'GO1', 'ST1']
+
+    mod_lst = ['Obs','L3_59','L3_99','L4_59','L4_99',\
+               'B3_59','B3_99','B4_59','B4_99']
+
+    scen_lst = ['Per_0', 'Per_m20', 'Per_B', 'Per_p20',\
+                'Per_0_100', 'Per_m20_100', 'Per_B_100', 'Per_p20_100',\
+                'CC_10', 'CC_20', 'CT_50', 'CT_100']
+
+    #convert every ebe output once. Rerun after rerunning WEPP for a scenario
+    ingest_outputs(prw_dir, store_dir, wshed_lst, mod_lst, scen_lst)
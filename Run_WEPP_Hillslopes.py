@@ -1,41 +1,111 @@
-def run_wepp(wepppy_win_dir, mod_dir, scen_lst):
+from wepp_runner import find_wepp_exe, find_run_tasks, predict_runtimes, run_wepp_parallel
+from wepp_ledger import open_ledger, load_run_history, resource_report
+
+def run_wepp(wepp_exe, prw_dir, wshed_lst, mod_lst, scen_lst, ledger_file, max_workers = None,\
+             force = False, max_attempts = 3, scratch_dir = None, keep_outputs = None):
     '''
-    Runs wepp using the run_project.py script in rogderlew's wepppy 
-    repository. This allows all hillslopes within each scenario directory
-    to be run without need of the WEPP GUI.
+    Runs every hillslope .run file in every watershed/climate model/scenario
+    directory of the sweep without need of the WEPP GUI. Each .run file is fed
+    straight to the WEPP executable (Windows or Linux build), and WEPP's
+    stdout/stderr are kept as {hill}.out/{hill}.err in the runs directory.
+
+    Each hillslope is its own task. Tasks are ordered by predicted runtime
+    (past wall times in ledger_file, climate length and OFE count) and spread
+    across a pool of worker processes (max_workers caps the number of
+    processes, all cores are used when None).
+
+    The state, exit status and wall time of every hillslope is kept in the
+    SQLite ledger_file. Rerunning this script after a crash or reboot picks
+    the sweep up where it stopped: failed hillslopes are retried until they
+    have failed max_attempts times.
+
+    Hillslopes whose .run/.man/.slp/.sol/.cli files and WEPP executable are
+    unchanged since their last successful run (see wepp_manifest.json in each
+    wepp/output/ directory) are skipped. force = True starts a new campaign
+    and reruns every hillslope.
+
+    When scratch_dir is given (e.g. /dev/shm or a RAM disk), hillslopes are
+    run there and only the output types in keep_outputs are moved to each
+    scenario's wepp/output/ directory, in one batch per scenario.
     '''
 
-    import os
+    wepp_exe = find_wepp_exe(wepp_exe)
+
+    tasks = find_run_tasks(prw_dir, wshed_lst, mod_lst, scen_lst)
+
+    con = open_ledger(ledger_file)
+    tasks = predict_runtimes(tasks, load_run_history(con))
+    con.close()
+
+    results = run_wepp_parallel(wepp_exe, tasks, ledger_file, max_workers, force, max_attempts,\
+                                scratch_dir, keep_outputs)
+
+    return results
+
+
+def write_resource_report(ledger_file, report_file):
+    '''
+    Writes wall time, CPU time, peak RSS and bytes written per output type,
+    aggregated by wshed/mod/scen, to an excel file. A second sheet lists the
+    slowest hillslopes of the sweep.
+    '''
+
+    import pandas as pd
+
+    con = open_ledger(ledger_file)
+    summary, slowest = resource_report(con)
+    con.close()
+
+    with pd.ExcelWriter(report_file) as writer:
+        summary.to_excel(writer, sheet_name = 'By_Scenario')
+        slowest.to_excel(writer, sheet_name = 'Slowest_Hillslopes', index = False)
+
+
+#worker processes re-import this script on Windows, so the sweep is only
+#started from the main process
+if __name__ == '__main__':
+
+    #define path to WEPP executable. None uses the WEPP_EXE environment variable,
+    #or a 'wepp' executable on the PATH (e.g. on the Linux compute nodes)
+    wepp_exe = None
+
+    #define directory holding all watershed project directories
+    prw_dir = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/'
+
+    #define path to ledger that holds the state, exit status and wall time of each run
+    ledger_file = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/wepp_run_ledger.sqlite'
+
+    #define path to resource use report
+    report_file = 'C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/wepp_resource_report.xlsx'
+
+    #maximum number of worker processes (None = all cores)
+    max_workers = None
 
-    #change directory to wepppy_win_dir
-    os.chdir(wepppy_win_dir)
+    #rerun hillslopes even if they are done and their inputs have not changed
+    force = False
 
-    #Run for all management scenarios in a given climate model directory
-    for scen in scen_lst:
-        cli_scen_dir = str(mod_dir + scen)
-        os.system('python3 run_project.py {}'.format(cli_scen_dir))
+    #number of times a hillslope may fail before it is given up on
+    max_attempts = 3
 
+    #RAM-backed directory to run hillslopes in (None = run in wepp/runs/)
+    scratch_dir = None
 
-#define path to directory with wepppy windows bootstrap scripts
-wepppy_win_dir = 'C:/Users/Garner/Soil_Erosion_Project/wepppy-win-bootstrap-master/scripts'
+    #outputs read by the analysis scripts. Only these are copied back from scratch_dir
+    keep_outputs = ['ebe', 'loss']
 
-### Example for Stearns watershed
-wshed_lst = ['ST1']
+    ### Example for Stearns watershed
+    wshed_lst = ['ST1']
 
-#Run for all adoption rates in the perennial scenarios
-scen_lst = ['Per_0', 'Per_m20', 'Per_B', 'Per_p20']
+    #Run for all adoption rates in the perennial scenarios
+    scen_lst = ['Per_0', 'Per_m20', 'Per_B', 'Per_p20']
 
-#Run for all climate models
-mod_lst = ['Obs','L3_59','L3_99','L4_59','L4_99',\
-           'B3_59','B3_99','B4_59','B4_99']
+    #Run for all climate models
+    mod_lst = ['Obs','L3_59','L3_99','L4_59','L4_99',\
+               'B3_59','B3_99','B4_59','B4_99']
 
-#loop through watersheds in wshed_lst
-for wshed in wshed_lst:
-    #loop through climate models in mod_lst
-    for mod in mod_lst:
+    #run function defined above for the whole sweep at once
+    run_wepp(wepp_exe, prw_dir, wshed_lst, mod_lst, scen_lst, ledger_file, max_workers, force, max_attempts,\
+             scratch_dir, keep_outputs)
 
-        #define directory for specific watershed and climate model
-        mod_dir = str('C:/Users/Garner/Soil_Erosion_Project/WEPP_PRWs/{}/New_Runs/{}/'.format(wshed,mod))
-        
-        #run function defined above for all management scenarios in scen_lst
-        run_wepp(wepppy_win_dir, mod_dir, scen_lst)
\ No newline at end of file
+    #summarize runtime and disk use by watershed, climate model and scenario
+    write_resource_report(ledger_file, report_file)
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+#column names of the daily table of a cligen .cli file (single storm format)
+CLI_COLS = ['da', 'mo', 'year', 'prcp', 'dur', 'tp', 'ip', 'tmax',\
+            'tmin', 'rad', 'w-vl', 'w-dir', 'tdew']
+
+#date columns are read as integers, every other column as floats
+CLI_DATE_COLS = ['da', 'mo', 'year']
+
+#lines before the daily table (13 header lines, column names, units)
+CLI_HEADER_LINES = 15
+
+
+def read_cli_header(header_lines):
+    '''
+    Gets the station information from the header lines of a cligen .cli file
+
+    header_lines = list of the first CLI_HEADER_LINES lines of the file
+
+    Returns a dictionary with station, latitude, longitude, elevation (m),
+    obs_years, begin_year and years (number of years simulated)
+    '''
+
+    station = header_lines[2].split('Station:')[-1].split('CLIGEN')[0].strip()
+
+    #latitude, longitude, elevation, obs. years, beginning year, years simulated
+    nums = header_lines[4].split()
+
+    try:
+        return {'station':station,\
+                'latitude':float(nums[0]),\
+                'longitude':float(nums[1]),\
+                'elevation':float(nums[2]),\
+                'obs_years':int(nums[3]),\
+                'begin_year':int(nums[4]),\
+                'years':int(nums[5])}
+
+    except (IndexError, ValueError):
+        raise ValueError('station line of .cli header can not be read: {}'.format(header_lines[4].strip()))
+
+
+def read_cli(cli_file):
+    '''
+    Reads a cligen .cli file (single storm format) into its station header and
+    a daily table of typed NumPy arrays (int32 for da/mo/year, float64 for the
+    rest). The daily table is parsed in one np.loadtxt call instead of a
+    regex separated read_csv.
+
+    cli_file = path to .cli file
+
+    Returns two dictionaries:
+    1.) station header (see read_cli_header)
+    2.) daily arrays keyed by the column names in CLI_COLS
+    '''
+
+    with open(cli_file, 'r') as cli_data:
+        header_lines = [cli_data.readline() for n in range(CLI_HEADER_LINES)]
+        table = np.loadtxt(cli_data, ndmin = 2)
+
+    if table.shape[1] != len(CLI_COLS):
+        raise ValueError('{} has {} daily columns, expected {}'.format(cli_file, table.shape[1], len(CLI_COLS)))
+
+    daily = {}
+
+    for n, col in enumerate(CLI_COLS):
+        if col in CLI_DATE_COLS:
+            daily[col] = table[:, n].astype(np.int32)
+
+        else:
+            daily[col] = table[:, n]
+
+    return read_cli_header(header_lines), daily
+
+
+def read_cli_df(cli_file):
+    '''
+    Reads the daily table of a cligen .cli file into a dataframe with the
+    columns in CLI_COLS (see read_cli)
+
+    cli_file = path to .cli file
+    '''
+
+    header, daily = read_cli(cli_file)
+
+    return pd.DataFrame(daily, columns = CLI_COLS)
+
+
+def day_key(year, month, day):
+    '''
+    Returns the integer key of dates (year, month, day arrays) used to
+    index a .cli daily table. Every valid date has its own key.
+    '''
+
+    year = np.asarray(year, dtype = np.int64)
+    month = np.asarray(month, dtype = np.int64)
+    day = np.asarray(day, dtype = np.int64)
+
+    return (year * 12 + month - 1) * 31 + day - 1
+
+
+def cli_day_index(year, month, day):
+    '''
+    Indexes the days of a .cli daily table by date, once per climate file.
+    Position day_key(year, month, day) of the returned array holds the
+    simulation-day ordinal (row number) of that date, -1 for dates that are
+    not in the table. Events are matched to their climate day with
+    day_ordinals and take_days instead of a merge on Day/Month/Year.
+
+    year, month, day = date columns of the daily table (e.g. the year, mo
+    and da arrays of read_cli)
+    '''
+
+    keys = day_key(year, month, day)
+
+    if keys.size == 0:
+        return np.full(0, -1, dtype = np.int64)
+
+    day_index = np.full(keys.max() + 1, -1, dtype = np.int64)
+    day_index[keys] = np.arange(keys.size)
+
+    return day_index
+
+
+def day_ordinals(day_index, year, month, day):
+    '''
+    Gets the simulation-day ordinal of every date (year, month, day arrays,
+    e.g. the dates of .ebe events) from a cli_day_index. Dates that are not
+    in the climate table get -1.
+    '''
+
+    keys = day_key(year, month, day)
+
+    ordinals = np.full(keys.shape, -1, dtype = np.int64)
+
+    inside = (keys >= 0) & (keys < day_index.size)
+    ordinals[inside] = day_index[keys[inside]]
+
+    return ordinals
+
+
+def take_days(values, ordinals, fill = np.nan):
+    '''
+    Takes the daily values (e.g. pri or dur) at simulation-day ordinals in
+    one vectorized step. Ordinals of -1 get fill.
+    '''
+
+    values = np.asarray(values, dtype = float)
+
+    if values.size == 0:
+        return np.full(ordinals.shape, fill)
+
+    return np.where(ordinals >= 0, values[np.maximum(ordinals, 0)], fill)
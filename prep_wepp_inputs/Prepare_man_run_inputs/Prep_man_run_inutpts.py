@@ -1,4 +1,11 @@
-def prep_input_files(base_files, HUC12_ID, HUC12_xl_out):
+#Optional WEPP outputs requested in the .run files for each output profile.
+#The .loss.dat file is always written. The analysis scripts only read the
+#.ebe.dat and .loss.dat files.
+OUTPUT_PROFILES = {'full':['plant', 'soil', 'ebe', 'element', 'yield'],\
+                   'analysis-minimal':['ebe']}
+
+
+def prep_input_files(base_files, HUC12_ID, HUC12_xl_out, output_profile = 'full'):
     '''
     This function performs the following tasks:
 
@@ -19,12 +26,19 @@ def prep_input_files(base_files, HUC12_ID, HUC12_xl_out):
     an output file that contains information on hillslope rotation, slopes, and
     soil types
 
+    output_profile = name of output profile in OUTPUT_PROFILES that sets which
+    WEPP outputs are requested in the .run files ('full' or 'analysis-minimal')
+
     '''
     
     import os
     import pandas as pd
     import re
     from statistics import mean
+
+    if output_profile not in OUTPUT_PROFILES:
+        raise ValueError('Unknown output profile {}. Choose from {}'.format(output_profile,\
+                         list(OUTPUT_PROFILES.keys())))
     
     print('Renaming files to WEPP format...')
     
@@ -39,13 +53,14 @@ def prep_input_files(base_files, HUC12_ID, HUC12_xl_out):
 
 
 
-    def create_run_file(hill, p_hill, run_yrs):
+    def create_run_file(hill, p_hill, run_yrs, outputs):
         '''
         Creates .run files necessary for running hillslopes in WEPP model
         
         hill = hillslope ID for output files
         p_hill = hillslope ID for input files
         run_yrs = number of years to run WEPP
+        outputs = list of optional outputs to request (see OUTPUT_PROFILES)
         '''
         
         run_lst = []
@@ -56,14 +71,24 @@ def prep_input_files(base_files, HUC12_ID, HUC12_xl_out):
 
             input_lst will be written to a file in .run format
             '''
+            def request_output(out_type):
+                '''
+                Answers the WEPP prompt for an optional output. Requested
+                outputs are followed by their file name
+                '''
+                if out_type in outputs:
+                    return ['Yes', '../output/{}.{}.dat'.format(hill, out_type)]
+
+                return ['No']
+
             input_lst = ['m','Yes','1','1','No','2','No',\
-                '../output/{}.loss.dat'.format(hill), 'No',\
-                'Yes','../output/{}.plant.dat'.format(hill),\
-                'Yes','../output/{}.soil.dat'.format(hill), 'No', 'No',\
-                'Yes', '../output/{}.ebe.dat'.format(hill),\
-                'Yes', '../output/{}.element.dat'.format(hill),'No', 'No',\
-                'Yes', '../output/{}.yield.dat'.format(hill),\
-                '{}.man'.format(p_hill), '{}.slp'.format(p_hill),\
+                '../output/{}.loss.dat'.format(hill), 'No']\
+                + request_output('plant')\
+                + request_output('soil') + ['No', 'No']\
+                + request_output('ebe')\
+                + request_output('element') + ['No', 'No']\
+                + request_output('yield')\
+                + ['{}.man'.format(p_hill), '{}.slp'.format(p_hill),\
                 '{}.cli'.format(p_hill), '{}.sol'.format(p_hill),\
                 '0', run_yrs, '0']
 
@@ -90,7 +115,7 @@ def prep_input_files(base_files, HUC12_ID, HUC12_xl_out):
             output_file_name = str('H' + str(file[1:-4]))
             
             #run create_run_file for each hillslope in base_files
-            create_run_file(output_file_name, input_file_name, 60)
+            create_run_file(output_file_name, input_file_name, 60, OUTPUT_PROFILES[output_profile])
             
             
             
@@ -1,6 +1,11 @@
+import os
+import sys
 import pandas as pd
 import hydroeval as he
 
+#cligen_cli.py is two directories up, at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
 def NSE_PBIAS_Analysis(obs_dir, wshed, cli_dir, wepp_out_dir, hillID, mod_yrs, TSS_adjust, crop1_yrs, crop2_yrs, obs_rot):
     '''
     Loads in Precip, RO, and TSS data and preps for NSE and PBIAS analyses
@@ -20,6 +25,7 @@ def NSE_PBIAS_Analysis(obs_dir, wshed, cli_dir, wepp_out_dir, hillID, mod_yrs, T
     import numpy as np
     import os
     import hydroeval as he
+    from cligen_cli import read_cli_df
 
     ###### load in climate data and fill in missing obs values ######
 
@@ -29,12 +35,10 @@ def NSE_PBIAS_Analysis(obs_dir, wshed, cli_dir, wepp_out_dir, hillID, mod_yrs, T
     DF_df['DF_pr'] = (DF_df['Pr'].apply(pd.to_numeric, errors='coerce')) * 25.4
 
     #Read in and prep cligen data
-    cli_df = pd.read_csv(str(cli_dir + '/{}.cli'.format(hillID)), skiprows = 13, sep = '\s+| ', engine = 'python')
-    cli_df.drop([0,], axis = 0, inplace = True)
-    cli_df.reset_index(inplace = True)
-    cli_df['Month'] = cli_df['mo'].astype(int)
-    cli_df['cli_pr'] = cli_df['prcp'].astype(float)
-    cli_sub = cli_df[cli_df['year'].astype(int).isin(mod_yrs)].reset_index()
+    cli_df = read_cli_df(str(cli_dir + '/{}.cli'.format(hillID)))
+    cli_df['Month'] = cli_df['mo']
+    cli_df['cli_pr'] = cli_df['prcp']
+    cli_sub = cli_df[cli_df['year'].isin(mod_yrs)].reset_index()
 
     #concatenate cligen precip column to DF df and return new df
     comb_df = pd.concat([DF_df, cli_sub['cli_pr']], axis=1)
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+'''
+Stand-in for the WEPP hillslope executable, used to benchmark and test the
+runner and analysis scripts on machines without the WEPP binary.
+
+Like WEPP, the stub reads a hillslope .run file from stdin (with the runs
+directory as its working directory) and writes the requested outputs. The
+.ebe.dat and .loss.dat files use the WEPP layout read by the analysis
+scripts. Event values are deterministic: runoff and sediment delivery are
+derived from the .cli precipitation depth, duration and peak intensity and a
+hillslope factor taken from the hash of the .man/.slp/.sol inputs.
+
+Simulated runtime is set with environment variables:
+
+STUB_WEPP_SECONDS = seconds per simulated year per OFE (default 0)
+
+STUB_WEPP_BUSY = 1 to spin the CPU for the simulated runtime instead of sleeping
+
+STUB_WEPP_HANG = hillslope ID (e.g. H2) whose run truncates its .ebe.dat file
+after writing its outputs and then hangs, to test sweeps that are killed
+partway through a run
+
+On Windows, run the stub through a .bat wrapper (python stub_wepp.py) and
+point WEPP_EXE at the wrapper.
+'''
+
+#columns of the .ebe.dat event table
+EBE_HEADER = [' EVENT OUTPUT',\
+              ' day mo  year Precp  Runoff  IR-det Av-det Mx-det  Point  Av-dep Max-dep  Point Sed.Del    ER',\
+              ' --- --  ---- (mm)   (mm)   kg/m^2 kg/m^2 kg/m^2    (m) kg/m^2  kg/m^2   (m)  (kg/m)   ----']
+
+
+def read_run_answers(run_text):
+    '''
+    Gets the output and input file names from the answers in a .run file
+
+    run_text = contents of the .run file
+
+    Returns a dictionary of output file names keyed by output type (ebe,
+    loss, ...) and a dictionary of input file names keyed by extension
+    '''
+
+    import os
+
+    outputs = {}
+    inputs = {}
+
+    for line in run_text.splitlines():
+        line = line.strip()
+
+        if line.endswith('.dat'):
+            outputs[os.path.basename(line).split('.')[-2]] = line
+
+        elif os.path.splitext(line)[1] in ['.man', '.slp', '.cli', '.sol']:
+            inputs[os.path.splitext(line)[1]] = line
+
+    return outputs, inputs
+
+
+def read_cli_days(cli_file):
+    '''
+    Reads the daily table of a cligen .cli file
+
+    cli_file = path to .cli file
+
+    Returns a list of (day, month, year, prcp, dur, ip) tuples
+    '''
+
+    days = []
+
+    with open(cli_file, 'r') as cli_data:
+        lines = cli_data.readlines()
+
+    #daily table starts after the column names and units rows
+    for line in lines[15:]:
+        vals = line.split()
+
+        try:
+            days.append((int(vals[0]), int(vals[1]), int(vals[2]), float(vals[3]),\
+                         float(vals[4]), float(vals[6])))
+        except (IndexError, ValueError):
+            break
+
+    return days
+
+
+def read_slope(slp_file):
+    '''
+    Reads the number of OFEs, profile width (m) and total length (m) of a
+    hillslope from its .slp file. Returns 1 OFE, 100 m and 100 m if the file
+    can not be read.
+
+    slp_file = path to .slp file
+    '''
+
+    with open(slp_file, 'r') as slp_data:
+        lines = [line.split() for line in slp_data if line.strip() != '' and not line.startswith('#')]
+
+    try:
+        ofes = int(float(lines[1][0]))
+        width = float(lines[2][1])
+        length = sum([float(lines[3 + 2 * n][1]) for n in range(ofes)])
+
+    except (IndexError, ValueError):
+        return 1, 100.0, 100.0
+
+    return ofes, width, length
+
+
+def hillslope_factor(files):
+    '''
+    Returns a number between 0.5 and 1.5 that is fixed for a given set of
+    input file contents
+
+    files = list of input file paths
+    '''
+
+    import hashlib
+
+    sha = hashlib.sha256()
+
+    for file in files:
+        with open(file, 'rb') as data:
+            sha.update(data.read())
+
+    return 0.5 + int(sha.hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+def simulate_events(days, factor):
+    '''
+    Creates runoff events from daily cligen precipitation. Runoff follows the
+    SCS curve number equation with a curve number set by factor, and
+    sediment delivery grows with runoff depth and peak intensity.
+
+    days = daily table from read_cli_days
+
+    factor = hillslope factor from hillslope_factor
+
+    Returns a list of ebe rows
+    '''
+
+    #curve number between 65 and 85
+    cn = 65 + 20 * (factor - 0.5)
+    s = 25400 / cn - 254
+    ia = 0.2 * s
+
+    rows = []
+
+    for day, month, year, prcp, dur, ip in days:
+        if prcp <= ia:
+            continue
+
+        runoff = (prcp - ia) ** 2 / (prcp - ia + s)
+
+        if runoff < 0.01:
+            continue
+
+        sed_del = 0.05 * factor * runoff ** 1.2 * (1 + ip / 50)
+        av_det = sed_del / 60
+        er = 1 + 2 / (1 + runoff)
+
+        rows.append((day, month, year, prcp, runoff, av_det * 0.3, av_det, av_det * 2.5,\
+                     100.0, av_det * 0.1, av_det * 0.4, 60.0, sed_del, er))
+
+    return rows
+
+
+def write_ebe(ebe_file, rows):
+    '''
+    Writes event rows to an .ebe.dat file in the WEPP layout
+
+    ebe_file = path to output file
+
+    rows = list of ebe rows from simulate_events
+    '''
+
+    with open(ebe_file, 'w') as out:
+        out.write('\n'.join(EBE_HEADER) + '\n')
+
+        for row in rows:
+            out.write('{:4d}{:3d}{:6d}{:7.1f}{:8.2f}{:8.3f}{:7.3f}{:7.3f}{:7.1f}{:8.3f}{:8.3f}{:7.1f}{:8.3f}{:6.2f}\n'.format(*row))
+
+
+def write_loss(loss_file, rows, years, ofes, width, length):
+    '''
+    Writes a .loss.dat summary with the profile width and area lines read by
+    the analysis scripts
+
+    loss_file = path to output file
+
+    rows = list of ebe rows from simulate_events
+
+    years = number of simulated years
+
+    ofes = number of OFEs
+
+    width = profile width (m)
+
+    length = profile length (m)
+    '''
+
+    area = width * length / 10000
+
+    #average annual sediment leaving profile
+    sed_kg_m = sum([row[12] for row in rows]) / years
+    runoff = sum([row[4] for row in rows]) / years
+    precip = sum([row[3] for row in rows]) / years
+
+    lines = ['  ANNUAL AVERAGE SUMMARIES (STUB WEPP)',\
+             '',\
+             '  {} OFE(s), {} years simulated'.format(ofes, years),\
+             '',\
+             '       {:10.2f} mm of precipitation in runoff events'.format(precip),\
+             '       {:10.2f} mm of runoff'.format(runoff),\
+             '',\
+             '     AVERAGE ANNUAL SEDIMENT LEAVING PROFILE',\
+             '       {:10.3f} kg/m of width'.format(sed_kg_m),\
+             '       {:10.3f} kg (based on profile width of {:10.3f} m)'.format(sed_kg_m * width, width),\
+             '       {:10.3f} t/ha (assuming contributions from {:10.3f} ha)'.format(sed_kg_m * width / 1000 / area, area),\
+             '']
+
+    with open(loss_file, 'w') as out:
+        out.write('\n'.join(lines))
+
+
+def write_other(out_file, out_type, years):
+    '''
+    Writes a placeholder for an output type the stub does not simulate
+    (plant, soil, element, yield), with one line per simulated year
+
+    out_file = path to output file
+
+    out_type = output type
+
+    years = number of simulated years
+    '''
+
+    with open(out_file, 'w') as out:
+        out.write(' {} OUTPUT (STUB WEPP)\n'.format(out_type.upper()))
+
+        for year in range(1, years + 1):
+            out.write(' {:4d} {:10.3f}\n'.format(year, 0.0))
+
+
+def simulate_runtime(seconds, busy):
+    '''
+    Waits for the simulated runtime
+
+    seconds = runtime in seconds
+
+    busy = spin the CPU instead of sleeping
+    '''
+
+    import time
+
+    if not busy:
+        time.sleep(seconds)
+        return
+
+    end = time.perf_counter() + seconds
+
+    while time.perf_counter() < end:
+        pass
+
+
+def run_stub(run_text):
+    '''
+    Simulates one hillslope from the contents of its .run file. Paths in the
+    .run file are relative to the current working directory.
+
+    run_text = contents of the .run file
+    '''
+
+    import os
+
+    outputs, inputs = read_run_answers(run_text)
+
+    days = read_cli_days(inputs['.cli'])
+    years = len(set([day[2] for day in days]))
+    ofes, width, length = read_slope(inputs['.slp'])
+
+    factor = hillslope_factor([inputs[ext] for ext in ['.man', '.slp', '.sol'] if ext in inputs])
+    rows = simulate_events(days, factor)
+
+    simulate_runtime(float(os.environ.get('STUB_WEPP_SECONDS', 0)) * years * ofes,\
+                     os.environ.get('STUB_WEPP_BUSY', '0') == '1')
+
+    for out_type, out_file in outputs.items():
+        if out_type == 'ebe':
+            write_ebe(out_file, rows)
+
+        elif out_type == 'loss':
+            write_loss(out_file, rows, max(years, 1), ofes, width, length)
+
+        else:
+            write_other(out_file, out_type, years)
+
+    if 'ebe' in outputs and os.path.basename(outputs['ebe']).split('.')[0] == os.environ.get('STUB_WEPP_HANG'):
+        import time
+
+        #leave a half written .ebe.dat file behind, like a run killed mid write
+        with open(outputs['ebe'], 'r+') as ebe:
+            ebe.truncate(len(ebe.read()) // 2)
+
+        time.sleep(3600)
+
+
+def write_stub_cli(cli_file, years, seed):
+    '''
+    Writes a synthetic cligen 5.3 style .cli file with the same layout as
+    the cligen outputs (13 header lines, column names, units, daily table).
+    Values are random but fixed by seed.
+
+    cli_file = path to output file
+
+    years = number of years to write
+
+    seed = random seed
+    '''
+
+    import calendar
+    import math
+    import random
+
+    rand = random.Random(seed)
+
+    header = ['5.300000',\
+              '   1   0   0',\
+              '   Station:  STUB WEPP TEST STATION                       CLIGEN VER. 5.30300 -r:    0 -I: 0',\
+              ' Latitude Longitude Elevation (m) Obs. Years   Beginning year  Years simulated Command Line:',\
+              '    44.20   -92.78         327          {:d}           1              {:d}   -b1 -y{:d} -t5'.format(years, years, years),\
+              ' Observed monthly ave max temperature (C)',\
+              '   -6.0  -3.0   4.0  13.0  20.0  25.0  27.0  26.0  21.0  14.0   5.0  -3.0',\
+              ' Observed monthly ave min temperature (C)',\
+              '  -16.0 -13.0  -6.0   1.0   8.0  13.0  16.0  14.0   9.0   3.0  -4.0 -12.0',\
+              ' Observed monthly ave solar radiation (Langleys/day)',\
+              '  180.0 260.0 350.0 430.0 510.0 560.0 570.0 500.0 390.0 280.0 180.0 150.0',\
+              ' Observed monthly ave precipitation (mm)',\
+              '   22.0  20.0  45.0  80.0 100.0 120.0 110.0 115.0  90.0  60.0  45.0  28.0',\
+              ' da mo year  prcp  dur   tp     ip  tmax  tmin  rad  w-vl w-dir  tdew',\
+              '             (mm)  (h)               (C)   (C) (l/d) (m/s)(Deg)   (C)']
+
+    lines = list(header)
+
+    for year in range(1, years + 1):
+        for month in range(1, 13):
+            for day in range(1, calendar.monthrange(1999, month)[1] + 1):
+
+                #wetter summers
+                wet_chance = 0.2 + 0.1 * math.sin((month - 3) / 12 * 2 * math.pi)
+
+                if rand.random() < wet_chance:
+                    prcp = round(rand.expovariate(1 / 9), 1)
+                    dur = round(min(24.0, 0.5 + rand.expovariate(1 / 3)), 2)
+                    tp = round(rand.random(), 2)
+                    ip = round(1 + rand.expovariate(1 / 3), 2)
+
+                else:
+                    prcp, dur, tp, ip = 0.0, 0.0, 0.0, 0.0
+
+                tmax = 10 + 16 * math.sin((month - 4) / 12 * 2 * math.pi) + rand.gauss(0, 4)
+                tmin = tmax - 10 - rand.random() * 4
+
+                lines.append('{:3d}{:3d}{:5d}{:6.1f}{:6.2f}{:5.2f}{:7.2f}{:6.1f}{:6.1f}{:5.0f}.{:5.1f}{:5.0f}.{:6.1f}'.format(\
+                             day, month, year, prcp, dur, tp, ip, tmax, tmin, 300 + rand.random() * 200,\
+                             rand.random() * 8, rand.random() * 360, tmin - 2))
+
+    with open(cli_file, 'w') as out:
+        out.write('\n'.join(lines) + '\n')
+
+
+def build_stub_sweep(prw_dir, wshed_lst, mod_lst, scen_lst, n_hills, seed = 0):
+    '''
+    Builds a synthetic {wshed}/New_Runs/{mod}/{scen}/wepp/runs/ directory
+    tree with .run/.man/.slp/.sol/.cli inputs for n_hills hillslopes per
+    scenario, for load testing the runner and analysis scripts with the stub.
+
+    Hillslopes share one .cli per watershed/climate model (55 years for Obs,
+    40 otherwise). Every scenario after the first gets different .man files
+    for a quarter of its hillslopes, so the other hillslopes are identical
+    across scenarios (like the perennial scenarios).
+
+    prw_dir = directory that will hold the watershed project directories
+
+    wshed_lst = list of watershed IDs
+
+    mod_lst = list of climate model IDs
+
+    scen_lst = list of management scenario IDs
+
+    n_hills = number of hillslopes per scenario
+
+    seed = random seed
+    '''
+
+    import os
+    import random
+    import shutil
+
+    rand = random.Random(seed)
+
+    for w_num, wshed in enumerate(wshed_lst):
+
+        #hillslope geometry is shared by all climates and scenarios of a watershed
+        geometry = [(rand.randint(1, 3), rand.uniform(20, 200), rand.uniform(50, 400)) for n in range(n_hills)]
+
+        for m_num, mod in enumerate(mod_lst):
+
+            if mod == 'Obs':
+                years = 55
+
+            else:
+                years = 40
+
+            cli_source = str(prw_dir + '{}/New_Runs/{}/stub.cli'.format(wshed, mod))
+            os.makedirs(os.path.dirname(cli_source), exist_ok = True)
+            write_stub_cli(cli_source, years, seed * 1000 + w_num * 100 + m_num)
+
+            for s_num, scen in enumerate(scen_lst):
+
+                runs_dir = str(prw_dir + '{}/New_Runs/{}/{}/wepp/runs/'.format(wshed, mod, scen))
+                os.makedirs(runs_dir, exist_ok = True)
+                os.makedirs(str(prw_dir + '{}/New_Runs/{}/{}/wepp/output/'.format(wshed, mod, scen)), exist_ok = True)
+
+                for n in range(1, n_hills + 1):
+                    p_hill = 'p{}'.format(n)
+                    hill = 'H{}'.format(n)
+                    ofes, width, length = geometry[n - 1]
+
+                    run_lst = ['m','Yes','1','1','No','2','No',\
+                               '../output/{}.loss.dat'.format(hill), 'No',\
+                               'Yes','../output/{}.plant.dat'.format(hill),\
+                               'Yes','../output/{}.soil.dat'.format(hill), 'No', 'No',\
+                               'Yes', '../output/{}.ebe.dat'.format(hill),\
+                               'Yes', '../output/{}.element.dat'.format(hill),'No', 'No',\
+                               'Yes', '../output/{}.yield.dat'.format(hill),\
+                               '{}.man'.format(p_hill), '{}.slp'.format(p_hill),\
+                               '{}.cli'.format(p_hill), '{}.sol'.format(p_hill),\
+                               '0', 60, '0']
+
+                    with open(str(runs_dir + p_hill + '.run'), 'w') as out:
+                        out.write('\n'.join([str(line) for line in run_lst]) + '\n')
+
+                    #a quarter of the hillslopes change management in each scenario
+                    if s_num > 0 and n % 4 == s_num % 4:
+                        man_tag = scen
+                    else:
+                        man_tag = 'base'
+
+                    with open(str(runs_dir + p_hill + '.man'), 'w') as out:
+                        out.write('98.4\n#\n# stub management ({})\n#\n#\n\n{} # number of OFEs\n'.format(man_tag, ofes))
+
+                    with open(str(runs_dir + p_hill + '.slp'), 'w') as out:
+                        out.write('97.3\n{}\n180.0 {:.3f}\n'.format(ofes, width))
+                        for ofe in range(ofes):
+                            out.write('2 {:.3f}\n0.0, 0.05 1.0, 0.08\n'.format(length / ofes))
+
+                    with open(str(runs_dir + p_hill + '.sol'), 'w') as out:
+                        out.write('2006.2\n# stub soil {}\n'.format(n % 7))
+
+                    shutil.copy(cli_source, str(runs_dir + p_hill + '.cli'))
+
+
+if __name__ == '__main__':
+
+    import sys
+
+    run_stub(sys.stdin.read())
+
+    print('WEPP COMPLETED HILLSLOPE SIMULATION SUCCESSFULLY')
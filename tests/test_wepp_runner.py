@@ -0,0 +1,84 @@
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+import pytest
+from stub_wepp import build_stub_sweep
+from wepp_runner import find_run_tasks, predict_runtimes, run_wepp_parallel
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STUB_EXE = os.path.join(REPO_DIR, 'stub_wepp.py')
+
+#runs the stub sweep of the tests in a separate process that can be killed
+SWEEP_SCRIPT = '''
+import sys
+sys.path.insert(0, {repo_dir!r})
+from wepp_runner import find_run_tasks, predict_runtimes, run_wepp_parallel
+
+if __name__ == '__main__':
+    tasks = predict_runtimes(find_run_tasks({prw_dir!r}, ['ST1'], ['Obs'], ['Per_0']), [])
+    run_wepp_parallel({stub_exe!r}, tasks, {ledger_file!r}, max_workers = 1, force = {force!r})
+'''
+
+
+def sweep_tasks(prw_dir):
+    return predict_runtimes(find_run_tasks(prw_dir, ['ST1'], ['Obs'], ['Per_0']), [])
+
+
+def ledger_states(ledger_file):
+    con = sqlite3.connect(ledger_file)
+    states = dict(con.execute('SELECT hill, state FROM runs'))
+    con.close()
+    return states
+
+
+@pytest.mark.skipif(os.name != 'posix', reason = 'kills the sweep process group')
+def test_restart_reruns_hillslope_killed_mid_run(tmp_path, monkeypatch):
+    '''
+    A forced rerun is killed while WEPP is writing a hillslope's outputs.
+    The scenario manifest still lists the hillslope with unchanged inputs,
+    so the restart must go by the ledger and run it again
+    '''
+
+    monkeypatch.delenv('STUB_WEPP_HANG', raising = False)
+
+    prw_dir = str(tmp_path) + '/'
+    ledger_file = str(tmp_path / 'ledger.sqlite')
+    ebe_file = str(prw_dir + 'ST1/New_Runs/Obs/Per_0/wepp/output/H2.ebe.dat')
+
+    build_stub_sweep(prw_dir, ['ST1'], ['Obs'], ['Per_0'], 4)
+    run_wepp_parallel(STUB_EXE, sweep_tasks(prw_dir), ledger_file, max_workers = 1)
+
+    with open(ebe_file, 'r') as ebe:
+        complete = ebe.read()
+
+    script = SWEEP_SCRIPT.format(repo_dir = REPO_DIR, prw_dir = prw_dir, stub_exe = STUB_EXE,\
+                                 ledger_file = ledger_file, force = True)
+
+    proc = subprocess.Popen([sys.executable, '-c', script], env = dict(os.environ, STUB_WEPP_HANG = 'H2'),\
+                            stdout = subprocess.DEVNULL, start_new_session = True)
+
+    try:
+        #wait until the stub has left a truncated .ebe.dat file and hangs
+        deadline = time.time() + 120
+
+        while not (os.path.exists(ebe_file) and 0 < os.path.getsize(ebe_file) < len(complete)):
+            assert time.time() < deadline and proc.poll() is None
+            time.sleep(0.1)
+
+    finally:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+
+    assert ledger_states(ledger_file)['p2'] == 'running'
+
+    results = run_wepp_parallel(STUB_EXE, sweep_tasks(prw_dir), ledger_file, max_workers = 1)
+
+    assert [result['skipped'] for result in results if result['hill'] == 'p2'] == [False]
+    assert set(ledger_states(ledger_file).values()) == {'done'}
+
+    with open(ebe_file, 'r') as ebe:
+        assert ebe.read() == complete
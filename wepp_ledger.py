@@ -0,0 +1,227 @@
+#columns of the run_stats table that hold resource use of a single run
+STAT_FIELDS = ['wall_time', 'cpu_time', 'peak_rss_kb', 'bytes_ebe', 'bytes_loss',\
+               'bytes_plant', 'bytes_soil', 'bytes_element', 'bytes_yield']
+
+
+def open_ledger(ledger_file):
+    '''
+    Opens (or creates) the SQLite run ledger of a WEPP sweep. The ledger
+    holds one row per hillslope .run file with its state (queued, running,
+    done or failed), number of failed attempts, and the exit status and wall
+    time of its latest run.
+
+    Every WEPP execution is also added to the run_stats table with its wall
+    time, CPU time, peak RSS and bytes written per output file type.
+
+    ledger_file = path to .sqlite ledger file
+
+    Returns an open sqlite3 connection
+    '''
+
+    import sqlite3
+
+    con = sqlite3.connect(ledger_file)
+
+    con.execute('''CREATE TABLE IF NOT EXISTS runs (
+                       run_file TEXT PRIMARY KEY,
+                       wshed TEXT,
+                       mod TEXT,
+                       scen TEXT,
+                       hill TEXT,
+                       years INTEGER,
+                       ofes INTEGER,
+                       state TEXT,
+                       attempts INTEGER DEFAULT 0,
+                       exit_status INTEGER,
+                       wall_time REAL,
+                       updated TEXT)''')
+
+    con.execute('''CREATE TABLE IF NOT EXISTS run_stats (
+                       run_file TEXT,
+                       wshed TEXT,
+                       mod TEXT,
+                       scen TEXT,
+                       hill TEXT,
+                       exit_status INTEGER,
+                       {},
+                       finished TEXT)'''.format(',\n'.join([field + ' REAL' for field in STAT_FIELDS])))
+    con.commit()
+
+    return con
+
+
+def add_tasks(con, tasks):
+    '''
+    Adds hillslope tasks that are not in the ledger yet as queued. Tasks
+    already in the ledger keep their state.
+
+    con = open ledger connection
+
+    tasks = list of task dictionaries from find_run_tasks
+    '''
+
+    con.executemany('''INSERT OR IGNORE INTO runs (run_file, wshed, mod, scen, hill, years, ofes, state)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, 'queued')''',\
+                    [(task['run_file'], task['wshed'], task['mod'], task['scen'],\
+                      task['hill'], task['years'], task['ofes']) for task in tasks])
+    con.commit()
+
+
+def reset_ledger(con, tasks):
+    '''
+    Starts a new campaign for the hillslopes of a sweep by setting them back
+    to queued with zero failed attempts. Rows of other sweeps in the ledger
+    are left alone. Wall times are kept for runtime predictions.
+
+    con = open ledger connection
+
+    tasks = list of task dictionaries from find_run_tasks
+    '''
+
+    con.executemany("UPDATE runs SET state = 'queued', attempts = 0 WHERE run_file = ?",\
+                    [(task['run_file'],) for task in tasks])
+    con.commit()
+
+
+def mark_queued(con, tasks):
+    '''
+    Sets hillslopes back to queued (e.g. done hillslopes whose inputs have
+    changed since they were run). Failed attempts are kept.
+
+    con = open ledger connection
+
+    tasks = list of task dictionaries from find_run_tasks
+    '''
+
+    con.executemany("UPDATE runs SET state = 'queued', updated = datetime('now') WHERE run_file = ?",\
+                    [(task['run_file'],) for task in tasks])
+    con.commit()
+
+
+def get_states(con):
+    '''
+    Returns a dictionary of (state, attempts) keyed by .run file path
+
+    con = open ledger connection
+    '''
+
+    return {run_file:(state, attempts) for run_file, state, attempts in\
+            con.execute('SELECT run_file, state, attempts FROM runs')}
+
+
+def mark_running(con, task):
+    '''
+    Sets a hillslope's state to running
+
+    con = open ledger connection
+
+    task = task dictionary from find_run_tasks
+    '''
+
+    con.execute("UPDATE runs SET state = 'running', updated = datetime('now') WHERE run_file = ?",\
+                (task['run_file'],))
+    con.commit()
+
+
+def mark_finished(con, result):
+    '''
+    Records the outcome of a hillslope run. Successful runs are set to done,
+    failed runs are set to failed and their attempt count is increased.
+    Runs that executed WEPP are added to the run_stats table. Hillslopes
+    skipped as up to date are not.
+
+    con = open ledger connection
+
+    result = output dictionary from run_hillslope
+
+    Returns the number of failed attempts of the hillslope
+    '''
+
+    if result['exit_status'] == 0 and result['skipped']:
+        con.execute('''UPDATE runs SET state = 'done', updated = datetime('now')
+                       WHERE run_file = ?''', (result['run_file'],))
+
+    elif result['exit_status'] == 0:
+        con.execute('''UPDATE runs SET state = 'done', exit_status = 0, wall_time = ?,
+                       updated = datetime('now') WHERE run_file = ?''',\
+                    (result['wall_time'], result['run_file']))
+
+    else:
+        con.execute('''UPDATE runs SET state = 'failed', attempts = attempts + 1, exit_status = ?,
+                       updated = datetime('now') WHERE run_file = ?''',\
+                    (result['exit_status'], result['run_file']))
+
+    if not result['skipped']:
+        con.execute('''INSERT INTO run_stats (run_file, wshed, mod, scen, hill, exit_status, {}, finished)
+                       VALUES (?, ?, ?, ?, ?, ?, {}, datetime('now'))'''.format(', '.join(STAT_FIELDS),\
+                                                                               ', '.join(['?'] * len(STAT_FIELDS))),\
+                    [result['run_file'], result['wshed'], result['mod'], result['scen'], result['hill'],\
+                     result['exit_status']] + [result.get(field) for field in STAT_FIELDS])
+
+    con.commit()
+
+    return con.execute('SELECT attempts FROM runs WHERE run_file = ?', (result['run_file'],)).fetchone()[0]
+
+
+def load_run_history(con):
+    '''
+    Reads wall times of past successful hillslope runs from the ledger for
+    runtime predictions (see predict_runtimes).
+
+    con = open ledger connection
+
+    Returns a list of dictionaries
+    '''
+
+    fields = ['run_file', 'wshed', 'mod', 'scen', 'hill', 'years', 'ofes', 'wall_time']
+
+    rows = con.execute('''SELECT {} FROM runs WHERE exit_status = 0
+                          AND wall_time IS NOT NULL'''.format(', '.join(fields)))
+
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def resource_report(con, n_slowest = 25):
+    '''
+    Summarizes resource use of the latest run of every hillslope in the
+    run_stats table.
+
+    con = open ledger connection
+
+    n_slowest = number of slowest hillslopes to list
+
+    Returns two dataframes:
+    1.) totals, means and maximums aggregated by wshed/mod/scen
+    2.) the n_slowest hillslopes by wall time, with their wall time relative
+        to the median of their scenario
+    '''
+
+    import pandas as pd
+
+    #latest run of each .run file
+    stats = pd.read_sql('''SELECT * FROM run_stats WHERE rowid IN
+                            (SELECT MAX(rowid) FROM run_stats GROUP BY run_file)''', con)
+
+    byte_cols = [field for field in STAT_FIELDS if field.startswith('bytes_')]
+    stats['bytes_total'] = stats[byte_cols].sum(axis = 1)
+
+    summary = stats.groupby(['wshed', 'mod', 'scen']).agg(hillslopes = ('hill', 'count'),\
+                                                          failed = ('exit_status', lambda x: (x != 0).sum()),\
+                                                          wall_time_total = ('wall_time', 'sum'),\
+                                                          wall_time_mean = ('wall_time', 'mean'),\
+                                                          wall_time_max = ('wall_time', 'max'),\
+                                                          cpu_time_total = ('cpu_time', 'sum'),\
+                                                          peak_rss_kb_max = ('peak_rss_kb', 'max'),\
+                                                          bytes_total = ('bytes_total', 'sum'))
+
+    summary = summary.join(stats.groupby(['wshed', 'mod', 'scen'])[byte_cols].sum())
+
+    #compare each hillslope to the median wall time of its scenario
+    stats['scen_median'] = stats.groupby(['wshed', 'mod', 'scen'])['wall_time'].transform('median')
+    stats['x_median'] = stats['wall_time'] / stats['scen_median']
+
+    slowest = stats.sort_values('wall_time', ascending = False).head(n_slowest)
+    slowest = slowest[['wshed', 'mod', 'scen', 'hill', 'wall_time', 'x_median', 'cpu_time',\
+                       'peak_rss_kb', 'bytes_total']]
+
+    return summary, slowest
@@ -0,0 +1,980 @@
+#WEPP output file types that can be requested in a .run file
+OUTPUT_TYPES = ['ebe', 'loss', 'plant', 'soil', 'element', 'yield']
+
+#line WEPP writes to stdout at the end of a successful hillslope run
+WEPP_SUCCESS = 'WEPP COMPLETED HILLSLOPE SIMULATION SUCCESSFULLY'
+
+
+def find_wepp_exe(wepp_exe = None):
+    '''
+    Finds the WEPP executable to run hillslopes with. Uses wepp_exe if given,
+    then the WEPP_EXE environment variable, then a 'wepp' executable on the
+    PATH (e.g. a Linux build on the compute nodes).
+
+    wepp_exe = path to WEPP executable (optional)
+
+    Returns the full path to the executable
+    '''
+
+    import os
+    import shutil
+
+    if wepp_exe is None:
+        wepp_exe = os.environ.get('WEPP_EXE', 'wepp')
+
+    found = shutil.which(wepp_exe)
+
+    if found is None:
+        raise FileNotFoundError('WEPP executable {} not found or not executable. Set WEPP_EXE '\
+                                'to the path of the WEPP binary'.format(wepp_exe))
+
+    return os.path.abspath(found)
+
+
+def read_run_inputs(run_file):
+    '''
+    Reads the names of the input files listed in a WEPP .run file.
+
+    run_file = path to hillslope .run file
+
+    Returns a dictionary of input file names (relative to the runs directory)
+    keyed by file extension (.man, .slp, .cli, .sol)
+    '''
+
+    import os
+
+    inputs = {}
+
+    with open(run_file, 'r') as run_data:
+        for line in run_data:
+            line = line.strip()
+            ext = os.path.splitext(line)[1]
+
+            if ext in ['.man', '.slp', '.cli', '.sol']:
+                inputs[ext] = line
+
+    return inputs
+
+
+def read_run_outputs(run_file):
+    '''
+    Reads the names of the output files listed in a WEPP .run file.
+
+    run_file = path to hillslope .run file
+
+    Returns a list of output file names (relative to the runs directory)
+    '''
+
+    outputs = []
+
+    with open(run_file, 'r') as run_data:
+        for line in run_data:
+            line = line.strip()
+
+            if line.endswith('.dat'):
+                outputs.append(line)
+
+    return outputs
+
+
+def count_ofes(man_file):
+    '''
+    Gets the number of overland flow elements (OFEs) in a hillslope from
+    line 7 of its .man file. Returns 1 if the line can not be read.
+
+    man_file = path to hillslope .man file
+    '''
+
+    with open(man_file, 'r') as man_data:
+        lines = man_data.readlines()
+
+    try:
+        return int(lines[6].split()[0])
+    except (IndexError, ValueError):
+        return 1
+
+
+def find_run_tasks(prw_dir, wshed_lst, mod_lst, scen_lst):
+    '''
+    Creates one task for every p*.run file in every
+    {wshed}/New_Runs/{mod}/{scen}/wepp/runs/ directory of the sweep.
+
+    prw_dir = directory holding all watershed project directories
+
+    wshed_lst = list of watershed IDs
+
+    mod_lst = list of climate model IDs
+
+    scen_lst = list of management scenario IDs
+
+    Returns a list of task dictionaries
+    '''
+
+    import os
+
+    tasks = []
+
+    for wshed in wshed_lst:
+        for mod in mod_lst:
+            for scen in scen_lst:
+
+                runs_dir = str(prw_dir + '{}/New_Runs/{}/{}/wepp/runs/'.format(wshed,mod,scen))
+                output_dir = str(prw_dir + '{}/New_Runs/{}/{}/wepp/output/'.format(wshed,mod,scen))
+
+                #obs and future periods have different year lengths
+                if mod == 'Obs':
+                    years = 55
+
+                else:
+                    years = 40
+
+                for file in sorted(os.listdir(runs_dir)):
+                    if file.startswith('p') and file.endswith('.run'):
+
+                        run_file = str(runs_dir + file)
+                        inputs = read_run_inputs(run_file)
+
+                        tasks.append({'wshed':wshed, 'mod':mod, 'scen':scen,\
+                                      'hill':file[:-4], 'runs_dir':runs_dir,\
+                                      'output_dir':output_dir,\
+                                      'run_file':run_file, 'years':years,\
+                                      'ofes':count_ofes(str(runs_dir + inputs['.man']))})
+
+    return tasks
+
+
+def hash_file(path):
+    '''
+    Returns the sha256 hex digest of a file's contents
+
+    path = path to file
+    '''
+
+    import hashlib
+
+    sha = hashlib.sha256()
+
+    with open(path, 'rb') as data:
+        for block in iter(lambda: data.read(1024 * 1024), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def hash_run_inputs(task):
+    '''
+    Hashes the .run file of a hillslope task and the .man, .slp, .sol and
+    .cli files it lists.
+
+    task = task dictionary from find_run_tasks
+
+    Returns a dictionary of sha256 digests keyed by file extension
+    '''
+
+    hashes = {'.run':hash_file(task['run_file'])}
+
+    for ext, file in read_run_inputs(task['run_file']).items():
+        hashes[ext] = hash_file(str(task['runs_dir'] + file))
+
+    return hashes
+
+
+def load_manifest(output_dir):
+    '''
+    Reads the input manifest stored in a scenario's wepp/output/ directory.
+    The manifest holds the input and WEPP executable hashes of the last
+    successful run of each hillslope, keyed by hillslope ID.
+
+    output_dir = WEPP watershed/clim model/scenario output directory
+
+    Returns an empty dictionary if there is no manifest yet
+    '''
+
+    import json
+    import os
+
+    manifest_file = str(output_dir + 'wepp_manifest.json')
+
+    if not os.path.exists(manifest_file):
+        return {}
+
+    with open(manifest_file, 'r') as manifest:
+        return json.load(manifest)
+
+
+def save_manifest(output_dir, manifest):
+    '''
+    Writes the input manifest to a scenario's wepp/output/ directory. The
+    manifest is written to a temporary file first so that an interrupted
+    write never leaves a broken manifest behind.
+
+    output_dir = WEPP watershed/clim model/scenario output directory
+
+    manifest = dictionary of hashes keyed by hillslope ID (see load_manifest)
+    '''
+
+    import json
+    import os
+
+    manifest_file = str(output_dir + 'wepp_manifest.json')
+
+    with open(manifest_file + '.tmp', 'w') as out:
+        json.dump(manifest, out, indent = 1, sort_keys = True)
+
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def is_up_to_date(task, hashes):
+    '''
+    Checks if a hillslope needs to be rerun. A hillslope is up to date when
+    its input and WEPP executable hashes match its manifest entry and every
+    output file that is wanted (task['keep_outputs'], or all outputs listed in
+    its .run file when None) was kept by its last run and exists.
+
+    task = task dictionary (with 'manifest_entry', 'wepp_hash' and
+    'keep_outputs' set)
+
+    hashes = current input hashes from hash_run_inputs
+    '''
+
+    import os
+
+    entry = task.get('manifest_entry')
+
+    if entry is None:
+        return False
+
+    if entry['inputs'] != hashes or entry['wepp'] != task['wepp_hash']:
+        return False
+
+    paths = output_paths(task)
+    wanted = [out_type for out_type in paths if task.get('keep_outputs') is None or\
+              out_type in task['keep_outputs']]
+
+    #outputs kept by the last run (None = all outputs)
+    kept = entry.get('outputs')
+
+    for out_type in wanted:
+        if kept is not None and out_type not in kept:
+            return False
+
+        if not os.path.exists(paths[out_type]):
+            return False
+
+    return True
+
+
+def dedup_key(task):
+    '''
+    Builds a key that is the same for hillslopes that would produce identical
+    WEPP outputs: same .man/.slp/.sol/.cli contents, same .run options and
+    same WEPP executable. File names are left out of the key, so identical
+    hillslopes match across scenario directories and hillslope IDs.
+
+    task = task dictionary (with 'hashes' and 'wepp_hash' set)
+    '''
+
+    import hashlib
+    import os
+
+    options = []
+
+    with open(task['run_file'], 'r') as run_data:
+        for line in run_data:
+            line = line.strip()
+
+            #replace output file names with their type (H1.ebe.dat -> ebe)
+            if line.endswith('.dat'):
+                line = os.path.basename(line).split('.')[-2]
+
+            #replace input file names with their extension (p1.man -> .man)
+            elif os.path.splitext(line)[1] in ['.man', '.slp', '.cli', '.sol']:
+                line = os.path.splitext(line)[1]
+
+            options.append(line)
+
+    key = [task['wepp_hash']] + options
+    key += ['{}={}'.format(ext, task['hashes'][ext]) for ext in ['.man', '.slp', '.sol', '.cli']]
+
+    return hashlib.sha256('\n'.join(key).encode()).hexdigest()
+
+
+def output_paths(task):
+    '''
+    Returns a dictionary of output file paths listed in a hillslope's .run
+    file keyed by output type (ebe, loss, ...)
+
+    task = task dictionary from find_run_tasks
+    '''
+
+    import os
+
+    return {os.path.basename(file).split('.')[-2]:str(task['runs_dir'] + file)\
+            for file in read_run_outputs(task['run_file'])}
+
+
+def remove_outputs(task):
+    '''
+    Deletes the existing output files of a hillslope before it is rerun.
+    Outputs may be hard links shared with identical hillslopes in other
+    scenarios, so they must be unlinked rather than overwritten in place.
+
+    task = task dictionary from find_run_tasks
+    '''
+
+    import os
+
+    for path in output_paths(task).values():
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def link_outputs(source_task, dest_task):
+    '''
+    Hard-links the outputs of source_task to the output file names of
+    dest_task. Outputs are copied instead when a hard link can not be made
+    (e.g. directories on different drives). Output types that source_task
+    did not keep are not linked.
+
+    source_task = task dictionary of the hillslope that was run
+
+    dest_task = task dictionary of an identical hillslope
+    '''
+
+    import os
+    import shutil
+
+    source_paths = output_paths(source_task)
+
+    for out_type, dest_path in output_paths(dest_task).items():
+
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+
+        if not os.path.exists(source_paths.get(out_type, '')):
+            continue
+
+        try:
+            os.link(source_paths[out_type], dest_path)
+        except OSError:
+            shutil.copy2(source_paths[out_type], dest_path)
+
+
+def stage_scratch(task, scratch_dir, copy_inputs = True):
+    '''
+    Sets up a private runs/ and output/ directory for a hillslope inside
+    scratch_dir (e.g. a tmpfs or RAM disk) and copies its .run file (and
+    input files when copy_inputs is True) into it.
+
+    task = task dictionary from find_run_tasks
+
+    scratch_dir = directory on a RAM-backed file system
+
+    copy_inputs = copy .man/.slp/.sol/.cli files as well as the .run file
+
+    Returns a copy of task that points to the scratch runs directory
+    '''
+
+    import os
+    import shutil
+    import tempfile
+
+    scratch_root = tempfile.mkdtemp(prefix = '{}_{}_{}_{}_'.format(task['wshed'], task['mod'],\
+                                    task['scen'], task['hill']), dir = scratch_dir)
+
+    runs_dir = str(scratch_root + '/runs/')
+    os.makedirs(runs_dir)
+    os.makedirs(str(scratch_root + '/output/'))
+
+    files = [os.path.basename(task['run_file'])]
+
+    if copy_inputs:
+        files += list(read_run_inputs(task['run_file']).values())
+
+    for file in files:
+        shutil.copy(str(task['runs_dir'] + file), str(runs_dir + file))
+
+    return dict(task, runs_dir = runs_dir, run_file = str(runs_dir + files[0]),\
+                output_dir = str(scratch_root + '/output/'), scratch_root = scratch_root)
+
+
+def move_logs(work_task, task):
+    '''
+    Moves the stdout/stderr logs of a hillslope run in a scratch directory
+    (see execute_wepp) to the hillslope's wepp/runs/ directory
+
+    work_task = scratch copy of task from stage_scratch
+
+    task = task dictionary from find_run_tasks
+    '''
+
+    import os
+    import shutil
+
+    for ext in ['.out', '.err']:
+        log_file = str(work_task['runs_dir'] + task['hill'] + ext)
+
+        if os.path.exists(log_file):
+            shutil.move(log_file, str(task['runs_dir'] + task['hill'] + ext))
+
+
+def move_scratch_outputs(moves):
+    '''
+    Moves the outputs of finished hillslopes from the scratch directory into
+    their wepp/output/ directory and deletes the scratch directories. Called
+    once per scenario with all of its hillslopes.
+
+    Old outputs are deleted first (they may be hard links shared with other
+    scenarios). Output types that were not kept are not replaced. WEPP
+    stdout/stderr logs are moved to the hillslope's wepp/runs/ directory.
+
+    moves = list of (task, result) pairs, where result['scratch_task'] is the
+    scratch copy of task from stage_scratch
+    '''
+
+    import os
+    import shutil
+
+    for task, result in moves:
+
+        remove_outputs(task)
+        dest_paths = output_paths(task)
+
+        for out_type, source_path in output_paths(result['scratch_task']).items():
+            if os.path.exists(source_path):
+                shutil.move(source_path, dest_paths[out_type])
+
+        move_logs(result['scratch_task'], task)
+
+        shutil.rmtree(result['scratch_task']['scratch_root'], ignore_errors = True)
+
+
+def predict_runtimes(tasks, history, default_rate = 0.01):
+    '''
+    Adds a predicted runtime (seconds) to each task.
+
+    1.) If the same .run file has been run before, its latest wall time is used
+    2.) If the same hillslope has been run in another climate or scenario, its
+        mean wall time per simulated year is scaled by the task's years
+    3.) Otherwise the median wall time per OFE-year of all past runs is scaled by
+        the task's OFEs and years (default_rate is used when there is no history)
+
+    tasks = list of task dictionaries from find_run_tasks
+
+    history = list of past runs from wepp_ledger.load_run_history
+    '''
+
+    from statistics import mean, median
+
+    last_time = {}
+    hill_rates = {}
+    ofe_rates = []
+
+    for row in history:
+        last_time[row['run_file']] = row['wall_time']
+        hill_rates.setdefault((row['wshed'], row['hill']), []).append(row['wall_time'] / row['years'])
+        ofe_rates.append(row['wall_time'] / (row['years'] * row['ofes']))
+
+    if len(ofe_rates) > 0:
+        rate = median(ofe_rates)
+
+    else:
+        rate = default_rate
+
+    for task in tasks:
+        key = (task['wshed'], task['hill'])
+
+        if task['run_file'] in last_time:
+            task['predicted'] = last_time[task['run_file']]
+
+        elif key in hill_rates:
+            task['predicted'] = mean(hill_rates[key]) * task['years']
+
+        else:
+            task['predicted'] = rate * task['years'] * task['ofes']
+
+    return tasks
+
+
+def wait_with_usage(proc):
+    '''
+    Waits for a subprocess to finish and gets the CPU time (user + system,
+    seconds) and peak resident set size (kB) of that process alone.
+
+    os.wait4 is not available on Windows, so CPU time and peak RSS are None there.
+
+    proc = subprocess.Popen object
+
+    Returns exit status, CPU time and peak RSS
+    '''
+
+    import os
+    import sys
+
+    if not hasattr(os, 'wait4'):
+        return proc.wait(), None, None
+
+    pid, status, usage = os.wait4(proc.pid, 0)
+
+    #let Popen know the process has already been waited on
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    #ru_maxrss is in bytes on macOS and kB on Linux
+    peak_rss = usage.ru_maxrss
+
+    if sys.platform == 'darwin':
+        peak_rss = peak_rss / 1024
+
+    return proc.returncode, round(usage.ru_utime + usage.ru_stime, 3), peak_rss
+
+
+def output_bytes(task):
+    '''
+    Gets the size in bytes of each output file listed in a hillslope's .run
+    file, keyed by output type (bytes_ebe, bytes_loss, ...). Output types that
+    were not requested or not written are None.
+
+    task = task dictionary from find_run_tasks
+    '''
+
+    import os
+
+    sizes = {'bytes_{}'.format(out_type):None for out_type in OUTPUT_TYPES}
+
+    for file in read_run_outputs(task['run_file']):
+
+        #H1.ebe.dat -> ebe
+        out_type = os.path.basename(file).split('.')[-2]
+        path = str(task['runs_dir'] + file)
+
+        if out_type in OUTPUT_TYPES and os.path.exists(path):
+            sizes['bytes_{}'.format(out_type)] = os.path.getsize(path)
+
+    return sizes
+
+
+def execute_wepp(wepp_exe, task):
+    '''
+    Feeds a hillslope's .run file to the WEPP executable over stdin with the
+    runs directory as WEPP's working directory. Windows line endings in the
+    .run file are converted so that Linux builds of WEPP read the file names
+    correctly.
+
+    WEPP's stdout and stderr are written to {hill}.out and {hill}.err in the
+    runs directory. WEPP can exit with status 0 after an error, so a run only
+    counts as successful if stdout ends with the WEPP_SUCCESS line.
+
+    wepp_exe = path to WEPP executable
+
+    task = task dictionary (or scratch copy from stage_scratch)
+
+    Returns exit status (1 if WEPP exited with 0 but did not finish), CPU
+    time, peak RSS and the last line of stderr (or stdout) as a message
+    '''
+
+    import subprocess
+
+    with open(task['run_file'], 'r', newline = '') as run_data:
+        run_text = run_data.read().replace('\r\n', '\n')
+
+    out_file = str(task['runs_dir'] + task['hill'] + '.out')
+    err_file = str(task['runs_dir'] + task['hill'] + '.err')
+
+    with open(out_file, 'wb') as out, open(err_file, 'wb') as err:
+        proc = subprocess.Popen([wepp_exe], stdin = subprocess.PIPE, stdout = out,\
+                                stderr = err, cwd = task['runs_dir'])
+
+        try:
+            proc.stdin.write(run_text.encode())
+            proc.stdin.close()
+        except BrokenPipeError:
+            #WEPP exited before reading the whole .run file
+            pass
+
+        exit_status, cpu_time, peak_rss = wait_with_usage(proc)
+
+    message = ''
+
+    for log_file in [err_file, out_file]:
+        with open(log_file, 'r', errors = 'replace') as log:
+            lines = [line.strip() for line in log if line.strip() != '']
+
+        if exit_status == 0 and log_file == out_file and WEPP_SUCCESS not in ' '.join(lines[-5:]):
+            exit_status = 1
+
+        if message == '' and len(lines) > 0:
+            message = lines[-1]
+
+    return exit_status, cpu_time, peak_rss, message
+
+
+def run_hillslope(wepp_exe, task, scratch_dir = None, keep_outputs = None):
+    '''
+    Runs a single hillslope by feeding its .run file to the WEPP executable
+    (see execute_wepp). WEPP is started with the runs directory as its
+    working directory (the .run file lists inputs and outputs relative to
+    it), so the working directory of the calling process is never changed.
+
+    After a successful run, the outputs are hard-linked into every identical
+    hillslope listed in task['duplicates'].
+
+    When scratch_dir is given, the hillslope is run in a private directory
+    inside scratch_dir (see stage_scratch) and only the output types in
+    keep_outputs are kept there. The outputs are left in scratch_dir to be
+    moved with the rest of the scenario (see move_scratch_outputs).
+
+    wepp_exe = path to WEPP executable
+
+    task = task dictionary from find_run_tasks
+
+    scratch_dir = directory on a RAM-backed file system (None = run in place)
+
+    keep_outputs = list of output types to keep in scratch mode (None = all)
+
+    Returns a dictionary with the task's IDs, exit status, wall time and CPU
+    time (seconds), peak RSS (kB), bytes written per output type and the
+    last line WEPP printed
+    '''
+
+    import os
+    import shutil
+    import time
+
+    result = {'wshed':task['wshed'], 'mod':task['mod'], 'scen':task['scen'],\
+              'hill':task['hill'], 'run_file':task['run_file'], 'years':task['years'],\
+              'ofes':task['ofes']}
+
+    dup_tasks = task.get('duplicates', [])
+
+    if scratch_dir is None:
+        work_task = task
+        remove_outputs(task)
+
+    else:
+        work_task = stage_scratch(task, scratch_dir)
+
+    start = time.perf_counter()
+
+    exit_status, cpu_time, peak_rss, message = execute_wepp(wepp_exe, work_task)
+
+    wall_time = time.perf_counter() - start
+
+    result.update({'exit_status':exit_status, 'wall_time':round(wall_time, 3),\
+                   'cpu_time':cpu_time, 'peak_rss_kb':peak_rss, 'message':message,\
+                   'skipped':False})
+
+    result.update(output_bytes(work_task))
+
+    if scratch_dir is None:
+        if exit_status == 0:
+            for dup_task in dup_tasks:
+                link_outputs(task, dup_task)
+
+        return result
+
+    if exit_status != 0:
+        #keep logs of failed runs for inspection
+        move_logs(work_task, task)
+        shutil.rmtree(work_task['scratch_root'], ignore_errors = True)
+        return result
+
+    #free scratch space used by outputs that are not needed
+    for out_type, path in output_paths(work_task).items():
+        if keep_outputs is not None and out_type not in keep_outputs and os.path.exists(path):
+            os.remove(path)
+
+    #identical hillslopes are linked inside the scratch directory
+    result['scratch_task'] = work_task
+    result['dup_scratch_tasks'] = []
+
+    for dup_task in dup_tasks:
+        dup_work_task = stage_scratch(dup_task, scratch_dir, copy_inputs = False)
+        link_outputs(work_task, dup_work_task)
+        result['dup_scratch_tasks'].append(dup_work_task)
+
+    return result
+
+
+def skipped_result(task, exit_status = 0, up_to_date = False):
+    '''
+    Creates a run_hillslope style output for a hillslope that was not run
+    itself (up to date, or linked to an identical hillslope)
+
+    task = task dictionary from find_run_tasks
+
+    exit_status = exit status to record (the exit status of the identical
+    hillslope for linked hillslopes)
+
+    up_to_date = True if the hillslope's outputs were already up to date
+    '''
+
+    return {'wshed':task['wshed'], 'mod':task['mod'], 'scen':task['scen'],\
+            'hill':task['hill'], 'run_file':task['run_file'], 'years':task['years'],\
+            'ofes':task['ofes'], 'exit_status':exit_status, 'wall_time':0.0, 'skipped':True,\
+            'up_to_date':up_to_date}
+
+
+def run_wepp_parallel(wepp_exe, tasks, ledger_file, max_workers = None, force = False, max_attempts = 3,\
+                      scratch_dir = None, keep_outputs = None):
+    '''
+    Runs every hillslope task across a pool of worker processes. Tasks are
+    started longest predicted runtime first so that the slowest hillslopes
+    do not hold up the end of the sweep.
+
+    The state of every hillslope (queued, running, done, failed) is kept in a
+    SQLite ledger (see wepp_ledger.py) so that an interrupted sweep can be
+    restarted: hillslopes that were running are started again and failed
+    hillslopes are retried until they have failed max_attempts times.
+
+    Hillslopes whose inputs and WEPP executable match the manifest in their
+    output directory are skipped, unless the ledger shows them running or
+    failed (a killed or failed run can leave partial outputs behind a
+    manifest entry that is only cleared once its scenario finishes). Done
+    hillslopes whose inputs changed are set back to queued and run again.
+    The manifest of each scenario is updated once all of its hillslopes have
+    finished.
+
+    Hillslopes with identical inputs in different scenario directories (see
+    dedup_key) are only run once. Their outputs are hard-linked into every
+    other directory that shares the inputs.
+
+    When scratch_dir is given, every hillslope runs in a RAM-backed scratch
+    directory and only the output types in keep_outputs are moved to the
+    scenario's wepp/output/ directory, in one batch once the whole scenario
+    has finished. Hillslopes are only marked done in the ledger after the
+    move, so a crash never leaves done hillslopes without outputs.
+
+    wepp_exe = path to WEPP executable
+
+    tasks = list of task dictionaries with predicted runtimes (see predict_runtimes)
+
+    ledger_file = path to .sqlite run ledger
+
+    max_workers = maximum number of worker processes. Uses all cores when None
+
+    force = rerun every hillslope even if it is done or up to date
+
+    max_attempts = number of times a hillslope may fail before it is given up on
+
+    scratch_dir = directory on a RAM-backed file system (None = run in place)
+
+    keep_outputs = list of output types to move back in scratch mode (None = all)
+
+    Returns a list of run_hillslope outputs in the order runs finished
+    '''
+
+    import os
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from wepp_ledger import open_ledger, add_tasks, reset_ledger, get_states,\
+                            mark_queued, mark_running, mark_finished
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    wepp_hash = hash_file(wepp_exe)
+
+    con = open_ledger(ledger_file)
+    add_tasks(con, tasks)
+
+    if force:
+        reset_ledger(con, tasks)
+
+    states = get_states(con)
+
+    #select hillslopes that may need to run. Done hillslopes are checked
+    #against their manifest like every other hillslope
+    pending = []
+    given_up = 0
+    n_done = 0
+
+    for task in tasks:
+        state, attempts = states[task['run_file']]
+
+        if state == 'failed' and attempts >= max_attempts:
+            given_up += 1
+            continue
+
+        if state == 'done':
+            n_done += 1
+
+        task['ledger_state'] = state
+        pending.append(task)
+
+    print('{} of {} hillslopes left to run, {} done hillslopes are checked for changed inputs '\
+          '({} failed {} times and are not retried)'.format(len(pending) - n_done, len(tasks), n_done,\
+                                                           given_up, max_attempts))
+
+    #load manifests and count remaining hillslopes for each scenario
+    manifests = {}
+    remaining = {}
+
+    for task in pending:
+        if task['output_dir'] not in manifests:
+            manifests[task['output_dir']] = load_manifest(task['output_dir'])
+            remaining[task['output_dir']] = 0
+
+        remaining[task['output_dir']] += 1
+        task['wepp_hash'] = wepp_hash
+
+        if scratch_dir is None:
+            task['keep_outputs'] = None
+
+        else:
+            task['keep_outputs'] = keep_outputs
+
+    results = []
+    skipped = 0
+    linked = 0
+    scratch_moves = {}
+
+    def finish(task, result, retry = True):
+        '''
+        Records a hillslope result in the ledger and manifest and saves the
+        scenario's manifest after its last hillslope. A failed hillslope is
+        only counted as finished when it will not be retried. Returns the
+        number of failed attempts of the hillslope.
+        '''
+
+        nonlocal skipped
+
+        output_dir = task['output_dir']
+
+        #outputs in scratch are moved once the whole scenario has finished,
+        #so these hillslopes are marked done after the move
+        if result['exit_status'] == 0 and 'scratch_task' in result:
+            attempts = 0
+            scratch_moves.setdefault(output_dir, []).append((task, result))
+
+        else:
+            attempts = mark_finished(con, result)
+
+        if result['exit_status'] != 0:
+            #failed runs must not be skipped next time
+            manifests[output_dir].pop(task['hill'], None)
+
+            if retry and attempts < max_attempts:
+                return attempts
+
+        #up to date hillslopes keep their manifest entry
+        elif not result.get('up_to_date', False):
+            manifests[output_dir][task['hill']] = {'inputs':task['hashes'], 'wepp':wepp_hash,\
+                                                   'outputs':task['keep_outputs']}
+
+        if result['skipped']:
+            skipped += 1
+
+        results.append(result)
+        remaining[output_dir] -= 1
+
+        if remaining[output_dir] == 0:
+            moves = scratch_moves.pop(output_dir, [])
+
+            if len(moves) > 0:
+                move_scratch_outputs(moves)
+
+                for moved_task, moved_result in moves:
+                    mark_finished(con, moved_result)
+
+            save_manifest(output_dir, manifests[output_dir])
+
+        if len(results) % 500 == 0 or len(results) == len(pending):
+            print('{} of {} hillslopes finished ({} up to date or linked)'.format(len(results),\
+                  len(pending), skipped))
+
+        return attempts
+
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+
+        #hash inputs of all hillslopes across the pool
+        for task, hashes in zip(pending, pool.map(hash_run_inputs, pending, chunksize = 64)):
+            task['hashes'] = hashes
+
+        #group hillslopes with identical inputs
+        groups = {}
+
+        for task in pending:
+            groups.setdefault(dedup_key(task), []).append(task)
+
+        queue = []
+
+        for group in groups.values():
+
+            #hillslopes left running or failed by an earlier sweep may have
+            #partial outputs under a manifest entry that was never cleared
+            fresh = [task for task in group if not force and task['ledger_state'] not in ['running', 'failed'] and\
+                     is_up_to_date(dict(task, manifest_entry = manifests[task['output_dir']].get(task['hill'])),\
+                                   task['hashes'])]
+
+            stale = [task for task in group if task not in fresh]
+
+            #done hillslopes with changed inputs are back in the queue
+            mark_queued(con, [task for task in stale if task['ledger_state'] == 'done'])
+
+            for task in fresh:
+                finish(task, skipped_result(task, up_to_date = True))
+
+            if len(stale) == 0:
+                continue
+
+            #link from an up to date copy when there is one
+            if len(fresh) > 0:
+                for task in stale:
+                    link_outputs(fresh[0], task)
+                    linked += 1
+                    finish(task, skipped_result(task))
+                continue
+
+            #otherwise run the slowest copy and link the others to it
+            stale.sort(key = lambda task: task['predicted'], reverse = True)
+            stale[0]['duplicates'] = stale[1:]
+            linked += len(stale) - 1
+            queue.append(stale[0])
+
+        print('{} hillslopes to run, {} identical hillslopes will be linked'.format(len(queue), linked))
+
+        #longest job first
+        queue.sort(key = lambda task: task['predicted'], reverse = True)
+
+        running = {}
+
+        while len(queue) > 0 or len(running) > 0:
+
+            #keep one task per worker in flight so the ledger shows what is running
+            while len(queue) > 0 and len(running) < max_workers:
+                task = queue.pop(0)
+
+                for run_task in [task] + task.get('duplicates', []):
+                    mark_running(con, run_task)
+
+                running[pool.submit(run_hillslope, wepp_exe, task, scratch_dir, keep_outputs)] = task
+
+            done, not_done = wait(running, return_when = FIRST_COMPLETED)
+
+            for future in done:
+                task = running.pop(future)
+                result = future.result()
+
+                attempts = finish(task, result)
+                retry = result['exit_status'] != 0 and attempts < max_attempts
+
+                #identical hillslopes share the outcome (and any retry) of the run
+                for num, dup_task in enumerate(task.get('duplicates', [])):
+                    dup_result = skipped_result(dup_task, result['exit_status'])
+
+                    if 'scratch_task' in result:
+                        dup_result['scratch_task'] = result['dup_scratch_tasks'][num]
+
+                    finish(dup_task, dup_result, retry)
+
+                if result['exit_status'] != 0:
+                    print('{}/{}/{}/{} failed with exit status {} (attempt {} of {}): {}'.format(result['wshed'],\
+                          result['mod'], result['scen'], result['hill'], result['exit_status'],\
+                          attempts, max_attempts, result['message']))
+
+                    #retry straight away until max_attempts is reached
+                    if retry:
+                        queue.insert(0, task)
+
+    con.close()
+
+    return results